@@ -0,0 +1,412 @@
+"""
+Price-change alerts.
+
+After each scrape the new products are diffed against the scrape before it
+for the same search: both are keyed by product (ASIN, or the normalized
+title) and hash joined on that key. Only the rows that are new or whose
+price or availability changed go on to the rules, so rule evaluation grows
+with the number of changes rather than with the size of the snapshot.
+
+Rules are declarative specs, built with build_rules():
+
+    {"name": "npl-over-threshold", "type": "threshold", "brand": "Nestlé Pure Life",
+     "limits": {"1.5L": 100, ...}}
+    {"name": "price-drop", "type": "drop", "percent": 10}
+    {"name": "npl-undercut", "type": "undercut", "brand": "Nestlé Pure Life", "value": "Price per Litre"}
+
+Alerts are plain dicts, kept in memory for /api/alerts and handed to sinks:
+a JSON lines file, a webhook on a local endpoint and e-mail through a local
+SMTP server. A failing sink is counted and skipped; it never fails a scrape.
+"""
+import json
+import smtplib
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from email.message import EmailMessage
+
+import numpy as np
+import pandas as pd
+import requests
+
+from columnar import exact_prices
+
+# Columns carried from a snapshot into the diff; the last two are optional
+DIFF_COLUMNS = ["Product Title", "Brand", "Size", "Numeric Price", "Availability Status", "Price per Litre",
+                "Source"]
+# Columns whose change makes a row reach the rules
+WATCHED_COLUMNS = ["Numeric Price", "Availability Status"]
+
+
+def keyed_frame(df, product_key):
+    """
+    The diff columns of a products DataFrame with plain dtypes (object text,
+    float64 prices), indexed by product key; the first row wins when a key
+    repeats
+    """
+    asins = df['ASIN'] if 'ASIN' in df.columns else [None] * len(df)
+    keys = pd.Index([product_key(title, asin) for title, asin in zip(df['Product Title'], asins)],
+                    dtype=object, name='Product Key')
+    columns = {}
+    for column in DIFF_COLUMNS:
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            columns[column] = pd.Series(exact_prices(values).to_numpy(dtype='float64'), index=keys)
+        else:
+            columns[column] = pd.Series(values.to_numpy(dtype=object), index=keys, dtype=object)
+    frame = pd.DataFrame(columns, index=keys)
+    return frame[~frame.index.duplicated()]
+
+
+def snapshot_diff(previous, current):
+    """
+    Rows of current that are new or whose price or availability changed,
+    with the previous values as "<column> Before" columns and a Change
+    column of "new" or "changed"
+    """
+    # Hash join on the product key: the position of every current product in previous
+    positions = previous.index.get_indexer(current.index)
+    new = positions < 0
+    changed = new.copy()
+    before = {}
+    for column in WATCHED_COLUMNS + ["Price per Litre"]:
+        if column not in current.columns:
+            continue
+        if column in previous.columns:
+            # New products have no previous row, and previous may have no rows at all
+            previous_values = previous[column].to_numpy()
+            values = np.full(len(current), None if previous_values.dtype == object else float('nan'),
+                             dtype=previous_values.dtype)
+            values[~new] = previous_values[positions[~new]]
+        else:
+            # Snapshots from before a column existed
+            values = np.full(len(current), float('nan'))
+        before[column + ' Before'] = values
+        if column in WATCHED_COLUMNS:
+            changed |= current[column].to_numpy() != values
+
+    changes = current[changed].assign(**{column: values[changed] for column, values in before.items()})
+    changes['Change'] = np.where(new[changed], 'new', 'changed')
+    return changes
+
+
+class AlertRule:
+    """
+    A named rule over the changed rows of a snapshot diff, optionally
+    limited to one brand. value is the price column it compares.
+    """
+    kind = None
+
+    def __init__(self, name, brand=None, value='Numeric Price'):
+        self.name = name
+        self.brand = brand
+        self.value = value
+        self.unit = 'EGP/L' if value == 'Price per Litre' else 'EGP'
+
+    def rows(self, changes):
+        if self.brand is None:
+            return changes
+        return changes[changes['Brand'] == self.brand]
+
+    def evaluate(self, changes, previous, current, state=None):
+        """
+        Alerts for the changed rows; previous and current are the full keyed
+        snapshots. state carries what a rule keeps between checks: its
+        "previous" entries from the check before, its "current" entries for
+        the next one, and how many products were "removed".
+        """
+        raise NotImplementedError
+
+    def alert(self, key, row, old_price, new_price, message):
+        return {
+            "rule": self.name,
+            "kind": self.kind,
+            "product_key": key,
+            "title": row['Product Title'],
+            "brand": row['Brand'],
+            "size": row['Size'],
+            "source": row.get('Source'),
+            "old_price": None if pd.isna(old_price) else float(old_price),
+            "new_price": None if pd.isna(new_price) else float(new_price),
+            "unit": self.unit,
+            "message": message,
+        }
+
+
+class ThresholdRule(AlertRule):
+    """
+    A product's price crossed the limit for its size, in either direction.
+    New products count as having been under the limit.
+    """
+    kind = "threshold"
+
+    def __init__(self, name, limits, brand=None, value='Numeric Price'):
+        super().__init__(name, brand, value)
+        self.limits = dict(limits)
+
+    def evaluate(self, changes, previous, current, state=None):
+        rows = self.rows(changes)
+        limits = rows['Size'].map(self.limits).astype('float64')
+        now = rows[self.value]
+        before = rows[self.value + ' Before'].where(rows[self.value + ' Before'] > 0)
+        crossed = (now > 0) & limits.notna() & ((now > limits) != (before > limits))
+        alerts = []
+        for key, row in rows[crossed].iterrows():
+            limit = limits[key]
+            old, new = row[self.value + ' Before'], row[self.value]
+            direction = "rose above" if new > limit else "is back within"
+            message = f"{row['Product Title']} {direction} the {limit:g} {self.unit} limit for {row['Size']}: {new:g}"
+            alerts.append(self.alert(key, row, old, new, message))
+        return alerts
+
+
+class PriceDropRule(AlertRule):
+    """
+    A product's price fell by at least percent since the previous scrape
+    """
+    kind = "drop"
+
+    def __init__(self, name, percent, brand=None, value='Numeric Price'):
+        super().__init__(name, brand, value)
+        self.percent = percent
+
+    def evaluate(self, changes, previous, current, state=None):
+        rows = self.rows(changes)
+        now = rows[self.value]
+        before = rows[self.value + ' Before']
+        drop = (before - now) / before * 100
+        fired = (before > 0) & (now > 0) & (drop >= self.percent)
+        return [
+            self.alert(key, row, row[self.value + ' Before'], row[self.value],
+                       f"{row['Product Title']} dropped {drop[key]:.1f}% "
+                       f"from {row[self.value + ' Before']:g} to {row[self.value]:g} {self.unit}")
+            for key, row in rows[fired].iterrows()
+        ]
+
+
+class UndercutRule(AlertRule):
+    """
+    A competitor's cheapest offer for a size went below the brand's cheapest
+    offer for that size.
+
+    The cheapest own and rival offer per size are kept between checks and
+    updated from the changed rows: a changed row can only become the new
+    cheapest. A size is looked at again in full only when its cheapest offer
+    itself changed, and the whole snapshot only when products disappeared or
+    there are no standings from the check before.
+    """
+    kind = "undercut"
+
+    def __init__(self, name, brand, value='Numeric Price'):
+        super().__init__(name, brand, value)
+
+    def best(self, rows):
+        """{size: {"own": (key, price), "rival": (key, price)}} of the cheapest offers in rows"""
+        if self.value not in rows.columns:
+            return {}
+        rows = rows[(rows['Brand'] != 'Other') & (rows['Size'] != 'Unknown Size') & (rows[self.value] > 0)]
+        rows = rows.sort_values(self.value, kind='stable')
+        own = (rows['Brand'] == self.brand).to_numpy()
+        standings = {}
+        for side, part in (("own", rows[own]), ("rival", rows[~own])):
+            firsts = part[~part['Size'].duplicated()]
+            for key, size, price in zip(firsts.index, firsts['Size'], firsts[self.value]):
+                standings.setdefault(size, {})[side] = (key, price)
+        return standings
+
+    def standings(self, before, changes, current, removed):
+        """The cheapest offers of current, updated from before where possible"""
+        if before is None or removed:
+            return self.best(current)
+        standings = dict(before)
+        changed = self.best(changes)
+        for size in set(changes['Size']) - {'Unknown Size'}:
+            previous = before.get(size, {})
+            if any(offer[0] in changes.index for offer in previous.values()):
+                # The cheapest offer itself changed and may no longer be the cheapest
+                standings[size] = self.best(current[current['Size'] == size]).get(size, {})
+                continue
+            merged = dict(previous)
+            for side, offer in changed.get(size, {}).items():
+                if side not in merged or offer[1] < merged[side][1]:
+                    merged[side] = offer
+            standings[size] = merged
+        return standings
+
+    def evaluate(self, changes, previous, current, state=None):
+        state = {} if state is None else state
+        before = state.get("previous", {}).get(self.name)
+        if before is None:
+            before = self.best(previous)
+        now = self.standings(before, changes, current, state.get("removed", 1))
+        state.setdefault("current", {})[self.name] = now
+
+        alerts = []
+        for size in sorted(set(changes['Size']) - {'Unknown Size'}):
+            offers = now.get(size, {})
+            if "own" not in offers or "rival" not in offers or not offers["rival"][1] < offers["own"][1]:
+                continue
+            earlier = before.get(size, {})
+            if "own" in earlier and "rival" in earlier and earlier["rival"][1] < earlier["own"][1]:
+                continue  # Already undercut in the previous scrape
+            own_price = offers["own"][1]
+            key, price = offers["rival"]
+            rival = current.loc[key]
+            alerts.append(self.alert(
+                key, rival, own_price, price,
+                f"{rival['Brand']} undercuts {self.brand} at {size}: {price:g} "
+                f"vs {own_price:g} {self.unit} ({rival['Product Title']})"))
+        return alerts
+
+
+RULE_TYPES = {
+    "threshold": ThresholdRule,
+    "drop": PriceDropRule,
+    "undercut": UndercutRule,
+}
+
+
+def build_rules(specs):
+    """Rule objects from declarative specs with a "type" and the rule's arguments"""
+    rules = []
+    for spec in specs:
+        spec = dict(spec)
+        rule_type = spec.pop("type")
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"Unknown alert rule type: {rule_type}")
+        rules.append(RULE_TYPES[rule_type](**spec))
+    return rules
+
+
+class FileSink:
+    """
+    Append alerts to a JSON lines file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def send(self, alerts):
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """
+    POST alerts as {"alerts": [...]} to a local HTTP endpoint
+    """
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        response = requests.post(self.url, json={"alerts": alerts}, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class SmtpSink:
+    """
+    Mail one message per batch of alerts through an SMTP server, such as a
+    local debugging server
+    """
+    def __init__(self, host='localhost', port=1025, recipients=(), sender='price-tracker@localhost', timeout=10):
+        self.host = host
+        self.port = port
+        self.recipients = list(recipients)
+        self.sender = sender
+        self.timeout = timeout
+
+    def send(self, alerts):
+        message = EmailMessage()
+        message['Subject'] = f"{len(alerts)} price alert{'s' if len(alerts) != 1 else ''}"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content('\n'.join(f"[{alert['rule']}] {alert['message']}" for alert in alerts))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+class AlertEngine:
+    """
+    Diff each scrape against the one before it, evaluate the rules on the
+    changed rows and deliver the alerts to the sinks
+    """
+    def __init__(self, rules, sinks, product_key, keep=200, scopes=32):
+        self.rules = list(rules)
+        self.sinks = list(sinks)
+        self.product_key = product_key
+        self.scopes = scopes
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=keep)
+        # scope -> (version, keyed frame, rule state) of the last scrape checked for it
+        self.baselines = OrderedDict()
+        self.counters = {"checks": 0, "changed_rows": 0, "alerts": 0, "sink_errors": 0}
+        self.rule_counts = {rule.name: 0 for rule in self.rules}
+
+    def check(self, scope, current, previous=None):
+        """
+        Compare the scrape result current (with version and df_products)
+        against previous, the result before it, or without one against the
+        last result checked for scope. Returns the alerts raised; the first
+        scrape of a scope only sets the baseline.
+        """
+        with self.lock:
+            baseline = self.baselines.get(scope)
+        if previous is not None and (baseline is None or baseline[0] != previous.get('version')):
+            # Another worker may have scraped this scope since; the stored result wins
+            baseline = (previous.get('version'), keyed_frame(previous['df_products'], self.product_key), {})
+        keyed = keyed_frame(current['df_products'], self.product_key)
+        state = {"previous": baseline[2] if baseline else {}, "current": {}}
+        with self.lock:
+            self.baselines[scope] = (current.get('version'), keyed, state["current"])
+            self.baselines.move_to_end(scope)
+            while len(self.baselines) > self.scopes:
+                self.baselines.popitem(last=False)
+        if baseline is None:
+            return []
+
+        changes = snapshot_diff(baseline[1], keyed)
+        state["removed"] = len(baseline[1]) - (len(keyed) - int((changes['Change'] == 'new').sum()))
+        alerts = []
+        if changes.empty:
+            if not state["removed"]:
+                state["current"].update(state["previous"])
+        else:
+            for rule in self.rules:
+                alerts.extend(rule.evaluate(changes, baseline[1], keyed, state))
+        observed_at = datetime.now().isoformat(timespec='seconds')
+        keyword, brand_filter = scope if isinstance(scope, tuple) else (scope, '')
+        for alert in alerts:
+            alert.update(observed_at=observed_at, keyword=keyword, brand_filter=brand_filter or None)
+
+        with self.lock:
+            self.counters["checks"] += 1
+            self.counters["changed_rows"] += len(changes)
+            self.counters["alerts"] += len(alerts)
+            for alert in alerts:
+                self.rule_counts[alert["rule"]] = self.rule_counts.get(alert["rule"], 0) + 1
+            self.recent.extend(alerts)
+        if alerts:
+            self.deliver(alerts)
+        return alerts
+
+    def deliver(self, alerts):
+        for sink in self.sinks:
+            try:
+                sink.send(alerts)
+            except Exception as e:
+                with self.lock:
+                    self.counters["sink_errors"] += 1
+                print(f"Alert sink {type(sink).__name__} failed: {e}")
+
+    def recent_alerts(self, limit=50):
+        """The newest alerts first"""
+        with self.lock:
+            return list(self.recent)[::-1][:limit]
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, rules=dict(self.rule_counts))
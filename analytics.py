@@ -0,0 +1,152 @@
+"""
+Vectorized price analytics.
+
+The price table, best offers and availability figures are computed with
+groupby reductions over whole columns instead of per-group or per-cell
+Python callbacks. Prices stay numeric until render time: the price table
+holds whole-number Int64 values with <NA> for empty cells, and the view
+model and CSV writer turn those into text. Both can also pivot on the price
+per litre instead of the shelf price, so packs of different counts compare
+fairly within a size.
+
+Trends are computed from daily (brand, size) rollups of the price history:
+rolling minimum and median prices, price-change events and the availability
+percentage of every brand.
+"""
+import pandas as pd
+
+from columnar import exact_prices
+
+
+def valid_products(df, priced=False, value='Numeric Price'):
+    """Rows with a known brand and size, and optionally a price in the value column"""
+    mask = (df['Brand'] != 'Other') & (df['Size'] != 'Unknown Size')
+    if priced:
+        mask &= df[value] > 0
+    return df[mask]
+
+
+def price_table(df, sizes=(), empty_brands=(), value='Numeric Price', decimals=0):
+    """
+    Size x Brand table of the lowest value per cell, rounded to whole numbers
+    (Int64) or to decimals places (Float64). Rows follow the order of sizes
+    for the sizes it lists.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    df_valid = valid_products(df)
+    if df_valid.empty:
+        empty_df = pd.DataFrame(columns=list(empty_brands))
+        empty_df.index.name = 'Size'
+        return empty_df
+
+    table = df_valid.groupby(['Size', 'Brand'], sort=True, observed=True)[value].min().unstack('Brand')
+    table = table.dropna(axis=1, how='all').astype('float64').round(decimals)
+    table = table.astype('Int64' if decimals == 0 else 'Float64')
+    # Categorical brand and size columns give categorical axes in category order;
+    # the table uses plain labels in name order
+    if isinstance(table.index, pd.CategoricalIndex) or isinstance(table.columns, pd.CategoricalIndex):
+        table.index = pd.Index(table.index.tolist(), name='Size', dtype=object)
+        table.columns = pd.Index(table.columns.tolist(), name='Brand', dtype=object)
+        table = table.sort_index().sort_index(axis=1)
+
+    valid_sizes = [size for size in sizes if size in table.index]
+    if valid_sizes:
+        table = table.reindex(valid_sizes)
+    return table
+
+
+def best_offers(df, value='Numeric Price'):
+    """Cheapest priced product per size by the value column, as Size, Brand and Best Price"""
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    df_valid = valid_products(df, priced=True, value=value)
+    if df_valid.empty:
+        return pd.DataFrame()
+
+    # idxmin keeps the first row among equal prices, like the old per-group lookup
+    best_rows = df_valid.groupby('Size', sort=True, observed=True)[value].idxmin()
+    offers = df_valid.loc[best_rows.values, ['Size', 'Brand', value]]
+    offers.index = pd.Index(best_rows.index, name='Size')
+    if isinstance(offers.index, pd.CategoricalIndex):
+        # Compact tables: plain labels in name order and prices back to the piastre
+        offers = offers.astype({'Size': object, 'Brand': object})
+        offers[value] = exact_prices(offers[value])
+        offers.index = pd.Index(offers['Size'], name='Size')
+        offers = offers.sort_index()
+    return offers.rename(columns={value: 'Best Price'})
+
+
+def availability_percentage(df, brand):
+    """Share of a brand's products marked Available, in percent"""
+    if df is None or df.empty:
+        return 0
+    brand_mask = df['Brand'] == brand
+    brand_count = int(brand_mask.sum())
+    if brand_count == 0:
+        return 0
+    available_count = int((brand_mask & (df['Availability Status'] == 'Available')).sum())
+    return round(available_count / brand_count * 100, 2)
+
+
+def daily_rollup(df):
+    """
+    Reduce one snapshot to a row per (brand, size): lowest and median price
+    of the priced products, product count and available product count
+    """
+    df_valid = valid_products(df)
+    if df_valid.empty:
+        return pd.DataFrame(columns=['Brand', 'Size', 'min_price', 'median_price', 'products', 'available'])
+    prices = exact_prices(df_valid['Numeric Price'])
+    priced = prices.where(prices > 0)
+    grouped = df_valid.assign(**{
+        'Priced': priced,
+        'Is Available': df_valid['Availability Status'] == 'Available',
+    }).groupby(['Brand', 'Size'], sort=True, observed=True)
+    rollup = pd.DataFrame({
+        'min_price': grouped['Priced'].min(),
+        'median_price': grouped['Priced'].median(),
+        'products': grouped.size(),
+        'available': grouped['Is Available'].sum(),
+    })
+    return rollup.reset_index()
+
+
+def price_trends(rollups, window=7):
+    """
+    Rolling min and median prices per (brand, size) from daily rollups with
+    columns day, brand, size, min_price and median_price. The window is in
+    days and counts calendar days, so gaps in the history shorten it.
+    """
+    if rollups.empty:
+        return rollups.assign(day=pd.to_datetime(rollups['day']),
+                              rolling_min=pd.Series(dtype='float64'),
+                              rolling_median=pd.Series(dtype='float64'))
+    rollups = rollups.assign(day=pd.to_datetime(rollups['day'])).sort_values(['brand', 'size', 'day'])
+    rolling = rollups.set_index('day').groupby(['brand', 'size'], sort=False).rolling(f'{window}D')
+    rollups['rolling_min'] = rolling['min_price'].min().to_numpy()
+    rollups['rolling_median'] = rolling['median_price'].median().to_numpy()
+    return rollups.reset_index(drop=True)
+
+
+def price_change_events(rollups):
+    """Days on which the lowest price of a (brand, size) differs from its previous day"""
+    priced = rollups.dropna(subset=['min_price']).sort_values(['brand', 'size', 'day'])
+    previous = priced.groupby(['brand', 'size'], sort=False)['min_price'].shift()
+    changed = previous.notna() & (priced['min_price'] != previous)
+    events = priced.loc[changed, ['day', 'brand', 'size', 'min_price']].rename(columns={'min_price': 'new_price'})
+    events.insert(3, 'old_price', previous[changed])
+    events['change_pct'] = ((events['new_price'] - events['old_price']) / events['old_price'] * 100).round(2)
+    return events.sort_values(['day', 'brand', 'size']).reset_index(drop=True)
+
+
+def availability_trend(rollups, brands):
+    """Daily availability percentage of each brand across its sizes"""
+    daily = rollups.groupby(['brand', 'day'], sort=True)[['available', 'products']].sum()
+    daily['percentage'] = (daily['available'] / daily['products'] * 100).round(2)
+    trend = {brand: [] for brand in brands}
+    for (brand, day), percentage in daily['percentage'].items():
+        trend.setdefault(brand, []).append({"day": str(day)[:10], "percentage": float(percentage)})
+    return trend
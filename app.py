@@ -1,16 +1,31 @@
-from flask import Flask, render_template, request, Response, redirect, url_for
+from flask import Flask, render_template, request, Response, redirect, url_for, jsonify, make_response
 from bs4 import BeautifulSoup
-import requests
+import click
 import pandas as pd
-import time
-import random
 import re
-import io
-import csv
 import os
-import unicodedata
+import uuid
 from datetime import datetime
-from urllib.parse import quote_plus
+from fetcher import FetchEngine
+from http_cache import HttpCache
+from size_extractor import SizeExtractor
+from text_normalizer import TextNormalizer
+from brand_matcher import BrandMatcher
+from dedup import DedupIndex, drop_duplicate_products
+from catalogue import OfferTables, ProductCatalogue
+from columnar import ProductEncoding
+import analytics
+from instrumentation import metrics, profiled, span
+from enrichment import ProductEnricher
+from unit_prices import PackParser
+from detail_pages import DetailEnricher
+from sites import AmazonEgAdapter
+from jobs import JobManager, JobStore
+from history import PriceHistoryStore, SweepScheduler
+from snapshots import SnapshotStore
+from alerts import AlertEngine, FileSink, SmtpSink, WebhookSink, build_rules
+from exports import EXPORT_FORMATS, filter_products, iter_csv, iter_frame_chunks, parquet_available, stream_export
+from view_models import TABLE_STATS, build_dashboard_view, dashboard_etag, RenderCache
 
 app = Flask(__name__)
 
@@ -19,12 +34,6 @@ os.makedirs('static', exist_ok=True)
 os.makedirs('static/data', exist_ok=True)
 os.makedirs('templates', exist_ok=True)
 
-# Global variables to store scraped data
-df_products = None
-price_stats = None
-last_scrape_time = None
-filtered_brand = None
-
 # Water brands and their price thresholds for NPL
 # Added Arabic brand names to improve detection
 WATER_BRANDS = [
@@ -88,6 +97,114 @@ STANDARD_SIZES = [
     "0.33L", "0.6L", "1L", "1.5L", "6L", "0.24L Sparkling", "5 Gallons"
 ]
 
+# Volume of one bottle of each standard size, in litres (a 5 gallon bottle holds 18.9L)
+SIZE_LITRES = {
+    "0.33L": 0.33,
+    "0.6L": 0.6,
+    "1L": 1.0,
+    "1.5L": 1.5,
+    "6L": 6.0,
+    "0.24L Sparkling": 0.24,
+    "5 Gallons": 18.9
+}
+
+# Headers for request to mimic a browser visit
+HEADERS = ({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36',
+    'Accept-Language': 'en-US, en;q=0.5'
+})
+
+# Fetch engine settings: parallel requests per host and polite request rate
+FETCH_MAX_PER_HOST = 3
+FETCH_RATE_PER_HOST = 1.5  # requests per second
+FETCH_BURST = 3
+
+# Per-request limits and retries; throttling (503/429, captcha, timeouts) halves the per-host limits
+FETCH_TIMEOUT = (5, 15)  # connect and read timeouts, in seconds
+FETCH_DEADLINE = 30  # hard cap on a whole response, in seconds
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 1.0  # base of the jittered exponential backoff, in seconds
+
+# On-disk cache of search pages so repeated scrapes skip the network
+HTTP_CACHE_PATH = 'static/data/http_cache.sqlite'
+HTTP_CACHE_TTL = 15 * 60  # seconds
+HTTP_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+http_cache = HttpCache(HTTP_CACHE_PATH, ttl=HTTP_CACHE_TTL, max_bytes=HTTP_CACHE_MAX_BYTES)
+
+# Shared fetch engine so keep-alive connections are reused between scrapes
+fetch_engine = FetchEngine(
+    headers=HEADERS,
+    max_per_host=FETCH_MAX_PER_HOST,
+    rate_per_host=FETCH_RATE_PER_HOST,
+    burst=FETCH_BURST,
+    timeout=FETCH_TIMEOUT,
+    deadline=FETCH_DEADLINE,
+    retries=FETCH_RETRIES,
+    backoff=FETCH_BACKOFF,
+    cache=http_cache
+)
+
+# Normalized strings kept in the normalize_text memo
+NORMALIZE_CACHE_SIZE = 100000
+
+# Duplicate detection: optionally also merge near-identical titles of the same SKU
+DEDUP_FUZZY = False
+DEDUP_FUZZY_THRESHOLD = 0.8
+
+# Number of scrapes that can run at the same time in the background
+SCRAPE_WORKERS = 2
+
+# Result pages followed per search term (1 = first page only)
+SCRAPE_MAX_PAGES = 1
+MAX_PAGES_LIMIT = 20
+
+# Price history store and the scheduled sweep over all brands
+HISTORY_DB_PATH = 'static/data/price_history.sqlite'
+SWEEP_INTERVAL_MINUTES = int(os.environ.get('SWEEP_INTERVAL_MINUTES', 0))  # 0 disables the sweep
+SWEEP_KEYWORD = 'water'
+# Only the server process holding this lock runs the scheduled sweep
+SWEEP_LOCK_PATH = 'static/data/sweep.lock'
+
+# Finished scrape results shared by all web workers; older snapshots are pruned
+SNAPSHOT_DB_PATH = 'static/data/snapshots.sqlite'
+SNAPSHOT_KEEP = 20
+
+# Alerts raised after each scrape by diffing it against the previous one for the same search
+ALERT_RULES = [
+    {"name": "npl-over-threshold", "type": "threshold", "brand": "Nestlé Pure Life", "limits": NPL_PRICE_THRESHOLDS},
+    {"name": "price-drop", "type": "drop", "percent": 10},
+    {"name": "npl-undercut", "type": "undercut", "brand": "Nestlé Pure Life", "value": "Price per Litre"},
+]
+ALERT_LOG_PATH = 'static/data/alerts.jsonl'
+# Optional local sinks, e.g. ALERT_WEBHOOK_URL=http://localhost:8085/alerts, or ALERT_SMTP_HOST=localhost
+# with a debugging server: python -m smtpd -n -c DebuggingServer localhost:1025
+ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL')
+ALERT_SMTP_HOST = os.environ.get('ALERT_SMTP_HOST')
+ALERT_SMTP_PORT = int(os.environ.get('ALERT_SMTP_PORT', 1025))
+ALERT_EMAIL_TO = os.environ.get('ALERT_EMAIL_TO', 'pricing@localhost')
+
+# HTML parser for search pages: "lxml" (fast path) or "soup" (BeautifulSoup)
+SEARCH_PARSER_BACKEND = 'lxml'
+
+# Marketplaces searched by every scrape, fetched concurrently. Other e-grocers
+# are sites.SelectorSiteAdapter entries with their own fetch limits, for example:
+#   SelectorSiteAdapter("grocer.example", "https://grocer.example", "/search?q={query}&page={page}",
+#                       card="li.product", title=".name", price=".price", max_concurrency=2, rate=0.5)
+amazon_site = AmazonEgAdapter(parser_backend=SEARCH_PARSER_BACKEND)
+SITES = [amazon_site]
+
+for site in SITES:
+    if site.max_concurrency or site.rate or site.burst:
+        fetch_engine.limit_host(site.host, site.max_concurrency, site.rate, site.burst)
+
+# Rows serialized per chunk when streaming exports
+EXPORT_CHUNK_ROWS = 5000
+
+# Rolling window of /api/trends, in days
+TRENDS_DEFAULT_WINDOW = 7
+TRENDS_MAX_WINDOW = 365
+
 # Add Arabic size mappings
 ARABIC_SIZE_MAPPINGS = {
     "0.33 لتر": "0.33L",
@@ -99,6 +216,18 @@ ARABIC_SIZE_MAPPINGS = {
     "5 جالون": "5 Gallons"
 }
 
+# Column order of the raw rows read from search result cards. ASIN holds the
+# product id of the card's site (prefixed with the site name off Amazon).
+SEARCH_ROW_COLUMNS = ["Product Title", "Price", "ASIN", "Product URL", "Source"]
+
+# Optional detail page stage: real stock availability per product, cached per ASIN
+DETAIL_ENRICHMENT = False
+DETAIL_BATCH_SIZE = 10
+DETAIL_CACHE_PATH = 'static/data/detail_cache.sqlite'
+DETAIL_CACHE_TTL = 6 * 60 * 60  # seconds
+
+detail_cache = HttpCache(DETAIL_CACHE_PATH, ttl=DETAIL_CACHE_TTL, max_bytes=HTTP_CACHE_MAX_BYTES)
+
 # Function to extract Product Title
 def get_title(soup):
     try:
@@ -153,235 +282,146 @@ def get_availability(soup):
     except AttributeError:
         return "Error extracting availability"
 
-def normalize_text(text):
-    """Normalize text to make it easier to compare"""
-    # Remove diacritics
-    text = ''.join(c for c in unicodedata.normalize('NFD', text)
-                  if unicodedata.category(c) != 'Mn')
-    # Convert to lowercase
-    text = text.lower()
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+def parse_detail_page(content):
+    """Read title, price and availability from a product detail page"""
+    soup = BeautifulSoup(content, "html.parser")
+    return {
+        "title": get_title(soup),
+        "price": get_price(soup),
+        "availability": get_availability(soup)
+    }
+
+# Detail pages are fetched through the shared engine in batches
+detail_enricher = DetailEnricher(fetch_engine, parse_detail_page, cache=detail_cache, batch_size=DETAIL_BATCH_SIZE)
+
+# Text normalization is memoized: the same titles and dictionary terms come back constantly
+text_normalizer = TextNormalizer(NORMALIZE_CACHE_SIZE)
+
+# Normalize text to make it easier to compare (diacritics, case, whitespace, Arabic forms)
+normalize_text = text_normalizer.normalize
+
+# Product tables are kept compact: categorical brand, size and status, float32 prices, interned text
+product_encoding = ProductEncoding(WATER_BRANDS, STANDARD_SIZES)
+
+# Every scrape is appended to the history; only changed rows are written
+history_store = PriceHistoryStore(HISTORY_DB_PATH, normalize_text, encoding=product_encoding)
+
+# Last known state of every product, stored next to the history under the same product key
+product_catalogue = ProductCatalogue(HISTORY_DB_PATH, history_store.product_key)
+
+# Price table and best offers per (keyword, brand filter), updated from the cells a scrape changed
+offer_tables = OfferTables(sizes=STANDARD_SIZES, empty_brands=WATER_BRANDS)
+
+# Size patterns and brand dictionaries are compiled once at import
+size_extractor = SizeExtractor(ARABIC_SIZE_MAPPINGS, normalize_text)
+brand_matcher = BrandMatcher(ARABIC_BRAND_MAPPINGS, BRAND_SEARCH_TERMS, WATER_BRANDS, normalize_text)
+
+# Pack count and unit volume of titles like "12 زجاجة × 1.5 لتر", for prices per litre
+pack_parser = PackParser(SIZE_LITRES)
+
+# Batch stage that fills in the derived product columns
+product_enricher = ProductEnricher(brand_matcher, size_extractor, NPL_PRICE_THRESHOLDS, pack_parser)
 
 def extract_brand_from_title(title):
     """Extract the water brand from the product title"""
-    normalized_title = normalize_text(title)
-    
-    # First check if any Arabic brand names are in the title
-    for arabic_name, english_brand in ARABIC_BRAND_MAPPINGS.items():
-        if normalize_text(arabic_name) in normalized_title:
-            return english_brand
-    
-    # Then check for English brand patterns
-    for brand, search_terms in BRAND_SEARCH_TERMS.items():
-        for term in search_terms:
-            if normalize_text(term) in normalized_title:
-                return brand
-    
-    # If no match found, try a simple approach for each brand
-    for brand in WATER_BRANDS:
-        if normalize_text(brand) in normalized_title:
-            return brand
-    
-    return "Other"
+    return brand_matcher.match(title)
 
 def extract_size_from_title(title):
     """Extract the water size from the product title"""
-    normalized_title = normalize_text(title)
-    
-    # First check Arabic size mappings
-    for arabic_size, english_size in ARABIC_SIZE_MAPPINGS.items():
-        if normalize_text(arabic_size) in normalized_title:
-            return english_size
-    
-    # Specific size detection patterns
-    size_patterns = [
-        # Standard sizes
-        (r'(?:^|\s)0\.33\s*l(?:iter)?(?:\s|$)', "0.33L"),
-        (r'(?:^|\s)330\s*ml(?:\s|$)', "0.33L"),
-        (r'(?:^|\s)0\.6\s*l(?:iter)?(?:\s|$)', "0.6L"),
-        (r'(?:^|\s)600\s*ml(?:\s|$)', "0.6L"),
-        (r'(?:^|\s)1\s*l(?:iter)?(?:\s|$)', "1L"),
-        (r'(?:^|\s)1000\s*ml(?:\s|$)', "1L"),
-        (r'(?:^|\s)1\.5\s*l(?:iter)?(?:\s|$)', "1.5L"),
-        (r'(?:^|\s)1500\s*ml(?:\s|$)', "1.5L"),
-        (r'(?:^|\s)6\s*l(?:iter)?(?:\s|$)', "6L"),
-        (r'(?:^|\s)6000\s*ml(?:\s|$)', "6L"),
-        (r'(?:^|\s)0\.24\s*l(?:iter)?(?:\s|sparkling)', "0.24L Sparkling"),
-        (r'(?:^|\s)240\s*ml(?:\s|sparkling)', "0.24L Sparkling"),
-        (r'(?:^|\s)5\s*gallon(?:s)?(?:\s|$)', "5 Gallons"),
-        
-        # Alternative formats
-        (r'(?:^|\s)1\s*-\s*liter(?:\s|$)', "1L"),
-        (r'(?:^|\s)1\.5\s*-\s*liter(?:\s|$)', "1.5L"),
-        (r'(?:^|\s)6\s*-\s*liter(?:\s|$)', "6L"),
-        
-        # Arabic numbers with L
-        (r'(?:^|\s)0[,.]33\s*l(?:iter)?(?:\s|$)', "0.33L"),
-        (r'(?:^|\s)0[,.]6\s*l(?:iter)?(?:\s|$)', "0.6L"),
-        (r'(?:^|\s)1[,.]5\s*l(?:iter)?(?:\s|$)', "1.5L"),
-        
-        # Common Arabic patterns (using English numbers)
-        (r'(?:^|\s)0\.33\s*لتر(?:\s|$)', "0.33L"),
-        (r'(?:^|\s)0\.6\s*لتر(?:\s|$)', "0.6L"),
-        (r'(?:^|\s)1\s*لتر(?:\s|$)', "1L"),
-        (r'(?:^|\s)1\.5\s*لتر(?:\s|$)', "1.5L"),
-        (r'(?:^|\s)6\s*لتر(?:\s|$)', "6L"),
-        (r'(?:^|\s)5\s*جالون(?:\s|$)', "5 Gallons"),
-        
-        # Specific packs that indicate size
-        (r'(?:^|\s)pack\s*of\s*6\s*[xX]\s*1\.5\s*l(?:iter)?(?:\s|$)', "1.5L"),
-        (r'(?:^|\s)pack\s*of\s*12\s*[xX]\s*0\.33\s*l(?:iter)?(?:\s|$)', "0.33L"),
-        (r'(?:^|\s)pack\s*of\s*6\s*[xX]\s*1\s*l(?:iter)?(?:\s|$)', "1L"),
-        
-        # More general patterns for bottle sizes
-        (r'(?:^|\s)(\d+(?:\.\d+)?)\s*l(?:iter)?(?:\s|$)', lambda m: f"{m.group(1)}L"),
-        (r'(?:^|\s)(\d+)\s*ml(?:\s|$)', lambda m: f"{float(m.group(1))/1000:.2f}L".replace(".00", "")),
-        (r'(?:^|\s)(\d+)\s*gallon(?:s)?(?:\s|$)', lambda m: f"{m.group(1)} Gallons"),
-    ]
-    
-    # Check all patterns
-    for pattern, size in size_patterns:
-        match = re.search(pattern, normalized_title)
-        if match:
-            if callable(size):
-                return size(match)
-            else:
-                return size
-    
-    # Additional check for sparkling water
-    if "sparkling" in normalized_title or "فوار" in normalized_title:
-        return "0.24L Sparkling"
-    
-    return "Unknown Size"
+    return size_extractor.extract(title)
 
-def check_availability(price_text, size):
+def create_price_table(df, per_litre=False):
     """
-    Check if a product is available based on NPL price thresholds
+    Create a table with SKUs and prices for each brand; each cell is the
+    lowest price across all sources, or the lowest price per litre
     """
-    if price_text == "Price not found":
-        return "Unknown"
-    
-    # Extract numeric price value
-    price_match = re.search(r'([\d,.]+)', price_text)
-    if not price_match:
-        return "Unknown"
-    
-    # Clean and convert price to float
-    price_str = price_match.group(1).replace(',', '')
-    try:
-        price = float(price_str)
-    except ValueError:
-        return "Unknown"
-    
-    # Check against threshold for NPL
-    threshold = NPL_PRICE_THRESHOLDS.get(size)
-    if threshold and price > threshold:
-        return "Not Available"
-    
-    return "Available"
+    if per_litre:
+        return analytics.price_table(df, STANDARD_SIZES, WATER_BRANDS, value='Price per Litre', decimals=2)
+    return analytics.price_table(df, STANDARD_SIZES, WATER_BRANDS)
 
-def create_price_table(df):
+def calculate_availability_percentage(df, brand='Nestlé Pure Life'):
     """
-    Create a table with SKUs and prices for each brand
+    Calculate the availability percentage for a given brand
     """
-    if df is None or df.empty:
-        return pd.DataFrame()
-    
-    # Filter out products without brand or size info
-    df_valid = df[(df['Brand'] != 'Other') & (df['Size'] != 'Unknown Size')]
-    
-    if df_valid.empty:
-        # Create an empty DataFrame with the expected structure
-        empty_df = pd.DataFrame(columns=WATER_BRANDS)
-        empty_df.index.name = 'Size'
-        return empty_df
-    
-    # Create pivot table: Size x Brand with Price values
-    pivot_df = df_valid.pivot_table(
-        index='Size', 
-        columns='Brand', 
-        values='Numeric Price',
-        aggfunc='min'  # Min price for each size-brand combination
-    )
-    
-    # Fill NaN with empty string for better display
-    pivot_df = pivot_df.fillna('')
-    
-    # Round numeric values to whole numbers
-    for col in pivot_df.columns:
-        pivot_df[col] = pivot_df[col].apply(lambda x: round(x) if isinstance(x, (int, float)) else x)
-    
-    # Reindex to ensure standard size order
-    if not pivot_df.empty:
-        # Filter sizes to only those that exist in the pivot table
-        valid_sizes = [size for size in STANDARD_SIZES if size in pivot_df.index]
-        if valid_sizes:
-            pivot_df = pivot_df.reindex(valid_sizes)
-    
-    return pivot_df
+    return analytics.availability_percentage(df, brand)
 
-def calculate_availability_percentage(df, brand='Nestlé Pure Life'):
+def find_best_offers(df, per_litre=False):
     """
-    Calculate the availability percentage for a given brand
+    Find the best price offers for each size, by shelf price or by price per litre
     """
-    if df is None or df.empty:
-        return 0
-    
-    # Filter for the specified brand
-    brand_df = df[df['Brand'] == brand]
-    
-    if len(brand_df) == 0:
-        return 0
-    
-    # Count available products
-    available_count = len(brand_df[brand_df['Availability Status'] == 'Available'])
-    
-    # Calculate percentage
-    percentage = (available_count / len(brand_df)) * 100
-    
-    return round(percentage, 2)
+    return analytics.best_offers(df, value='Price per Litre' if per_litre else 'Numeric Price')
+
+def find_canonical_brand(brand_filter):
+    """Return the known brand name a (possibly partial) brand filter refers to"""
+    for brand_name in WATER_BRANDS:
+        if normalize_text(brand_filter) in normalize_text(brand_name):
+            return brand_name
+    return None
 
-def find_best_offers(df):
+def search_page_url(search_term, page=1):
+    """Build the amazon.eg search URL for one results page"""
+    return amazon_site.search_url(search_term, page)
+
+def read_search_page(site, search_term, webpage, max_products):
     """
-    Find the best price offers for each size
+    Return the (title, price, id, URL, source) rows of a results page fetched
+    from site, or None if the page failed or had no result cards
     """
-    if df is None or df.empty:
-        return pd.DataFrame()
-    
-    # Filter for valid products
-    df_valid = df[(df['Brand'] != 'Other') & 
-                 (df['Size'] != 'Unknown Size') & 
-                 (df['Numeric Price'] > 0)]
-    
-    if df_valid.empty:
-        return pd.DataFrame()
+    if webpage.error is not None:
+        print(f"Error scraping {search_term}: {str(webpage.error)}")
+        return None
     
-    # Group by size and find minimum price
-    best_offers = df_valid.groupby('Size').apply(
-        lambda x: x.loc[x['Numeric Price'].idxmin()]
-    )[['Size', 'Brand', 'Numeric Price']]
-    
-    # Rename columns for clarity
-    best_offers = best_offers.rename(columns={'Numeric Price': 'Best Price'})
+    try:
+        # Check if request was successful
+        if webpage.status_code != 200:
+            return None
+        
+        # Extract title, price, id and link of the result cards
+        rows = site.read_rows(webpage.content, max_products)
+    except Exception as e:
+        print(f"Error scraping {search_term} on {site.name}: {str(e)}")
+        return None
     
-    return best_offers
+    return rows or None
 
-def scrape_amazon(keyword="water", brand_filter=None, max_products=48):
+def scrape_amazon(keyword="water", brand_filter=None, max_products=48, progress=None, max_pages=None,
+                  fetch_details=None, profile=False):
     """
-    Scrape Amazon products based on keyword search
+    Scrape Amazon products and attach the scrape's per-stage timings to the
+    result. With profile, the scrape also runs under cProfile and the report
+    is returned as result["profile"]. See scrape_pipeline for the arguments.
     """
-    global df_products, price_stats, last_scrape_time, filtered_brand
-    
-    # Track the filtered brand
-    filtered_brand = brand_filter
+    with metrics.trace() as trace, profiled(profile) as profile_report:
+        result = scrape_pipeline(keyword, brand_filter, max_products, progress, max_pages, fetch_details)
     
-    # Headers for request to mimic a browser visit
-    HEADERS = ({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36',
-        'Accept-Language': 'en-US, en;q=0.5'
-    })
+    result["timings"] = trace.breakdown()
+    result["elapsed"] = round(trace.elapsed, 3)
+    result["profile"] = profile_report["text"]
+    if result["status"] == "success":
+        result["dashboard_view"]["timings"] = result["timings"]
+        result["dashboard_view"]["elapsed"] = result["elapsed"]
+    return result
+
+def scrape_pipeline(keyword="water", brand_filter=None, max_products=48, progress=None, max_pages=None,
+                    fetch_details=None):
+    """
+    Scrape products of every site in SITES based on keyword search.
+    progress, if given, is called as progress(search_term, status, products)
+    whenever a search term changes state; with several sites each term is
+    reported per site.
+    With max_pages > 1 each search term follows its result pages until a page
+    adds no new products for the target brand, the page budget is spent, or
+    max_products valid rows (known brand and size) have been collected on
+    that site.
+    With fetch_details, the detail page of every kept product is fetched to
+    add its real stock availability.
+    """
+    if max_pages is None:
+        max_pages = SCRAPE_MAX_PAGES
+    if fetch_details is None:
+        fetch_details = DETAIL_ENRICHMENT
+    if progress is None:
+        progress = lambda search_term, status, products=0: None
     
     # If brand filter is specified, use more specific search terms
     search_terms = []
@@ -399,309 +439,564 @@ def scrape_amazon(keyword="water", brand_filter=None, max_products=48):
     else:
         search_terms = [keyword]
     
-    # Initialize empty lists for data collection
-    all_titles = []
-    all_prices = []
-    all_brands = []
-    all_sizes = []
-    all_numeric_prices = []
-    all_availability_statuses = []
-    
-    # Scrape for each search term
-    for search_term in search_terms:
-        # URL encode the search term
-        encoded_search = quote_plus(search_term)
-        URL = f"https://www.amazon.eg/s?k={encoded_search}&ref=nb_sb_noss_1"
+    # Brand whose new products decide whether the next page is worth fetching
+    canonical_brand = find_canonical_brand(brand_filter) if brand_filter else None
+    
+    # Every search term is crawled on every site; a crawl is a (site, search term) pair
+    crawls = [(site, search_term) for site in SITES for search_term in search_terms]
+    labels = {crawl: crawl[1] if len(SITES) == 1 else f"{crawl[1]} @ {crawl[0].name}" for crawl in crawls}
+    
+    # Enriched rows per crawl, in page order; new products are counted per site
+    crawl_pages = {crawl: [] for crawl in crawls}
+    crawl_counts = {crawl: 0 for crawl in crawls}
+    next_page = {crawl: 1 for crawl in crawls}
+    seen_titles = {site.name: DedupIndex(normalize_text, fuzzy=DEDUP_FUZZY, threshold=DEDUP_FUZZY_THRESHOLD)
+                   for site in SITES}
+    seen_asins = set()
+    seen_count = 0
+    valid_rows = {site.name: 0 for site in SITES}
+    
+    # Pages are fetched in waves; each wave asks every active crawl for its next few
+    # pages, so all sites are fetched together, each under its own host limits
+    wave_pages = {site.name: max(1, site.max_concurrency or FETCH_MAX_PER_HOST) for site in SITES}
+    active_crawls = list(crawls)
+    while active_crawls:
+        wave = [(crawl, page)
+                for crawl in active_crawls
+                for page in range(next_page[crawl],
+                                  min(next_page[crawl] + wave_pages[crawl[0].name], max_pages + 1))]
         
-        try:
-            # HTTP Request with a random delay to avoid being blocked
-            time.sleep(random.uniform(1, 2))
-            webpage = requests.get(URL, headers=HEADERS)
-            
-            # Check if request was successful
-            if webpage.status_code != 200:
-                continue  # Skip this search term and try the next one
-            
-            # Soup Object containing all data
-            soup = BeautifulSoup(webpage.content, "html.parser")
+        # Fetch the wave in parallel; results come back in request order
+        for crawl in active_crawls:
+            progress(labels[crawl], "fetching", crawl_counts[crawl])
+        with span("fetch"):
+            webpages = fetch_engine.fetch_all([site.search_url(search_term, page)
+                                               for (site, search_term), page in wave])
+        
+        finished = {}
+        for (crawl, page), webpage in zip(wave, webpages):
+            if crawl in finished:
+                continue  # An earlier page of this crawl already ended it
+            site, search_term = crawl
             
-            # Fetch product cards
-            products = soup.select("div.s-result-item[data-component-type='s-search-result']")
+            with span("parse"):
+                rows = read_search_page(site, search_term, webpage, max_products)
+            if not rows:
+                if page == 1:
+                    finished[crawl] = "failed" if webpage.error is not None or webpage.status_code != 200 else "empty"
+                else:
+                    finished[crawl] = "done"
+                continue
             
-            if not products:
-                continue  # Skip this search term and try the next one
+            # Derive brand, size, numeric price and availability for the page at once;
+            # prices per litre are added once the pages are deduplicated
+            with span("enrich"):
+                page_products = product_enricher.enrich(pd.DataFrame(rows, columns=SEARCH_ROW_COLUMNS),
+                                                        units=False)
+            crawl_pages[crawl].append(page_products)
+            crawl_counts[crawl] += len(page_products)
             
-            # Extract data from search results page
-            product_count = min(len(products), max_products)
+            with span("dedup"):
+                new_titles = 0
+                site_titles = seen_titles[site.name]
+                for title, brand, size, asin in zip(page_products['Product Title'], page_products['Brand'],
+                                                    page_products['Size'], page_products['ASIN']):
+                    if asin in seen_asins or site_titles.find(title) is not None:
+                        continue
+                    if asin:
+                        seen_asins.add(asin)
+                    site_titles.add(title, seen_count)
+                    seen_count += 1
+                    if canonical_brand is None or brand == canonical_brand:
+                        new_titles += 1
+                        if brand != 'Other' and size != 'Unknown Size':
+                            valid_rows[site.name] += 1
             
-            for product in products[:product_count]:
-                # Extract product URL - try multiple possible selectors
-                a_tag = None
-                
-                # Try different possible a tag classes
-                possible_a_classes = [
-                    "a-link-normal s-no-outline",
-                    "a-link-normal s-underline-text s-underline-link-text s-link-style a-text-normal",
-                    "a-link-normal s-link-style a-text-normal", 
-                    "a-link-normal a-text-normal"
-                ]
-                
-                for class_name in possible_a_classes:
-                    a_tag = product.find("a", class_=class_name)
-                    if a_tag:
-                        break
-                        
-                # If still not found, try just finding any a tag with title in h2
-                if not a_tag:
-                    h2 = product.find("h2")
-                    if h2:
-                        a_tag = h2.find("a")
-                
-                # Extract title - try multiple possible selectors
-                title_element = None
-                # Try h2 first as it often contains the product title
-                h2 = product.find("h2")
-                if h2:
-                    title_element = h2
-                
-                # If not in h2, try common span classes
-                if not title_element:
-                    possible_title_classes = [
-                        "a-size-base-plus a-color-base a-text-normal",
-                        "a-size-medium a-color-base a-text-normal",
-                        "a-size-base a-color-base"
-                    ]
-                    
-                    for class_name in possible_title_classes:
-                        title_element = product.find("span", class_=class_name)
-                        if title_element:
-                            break
-                
-                # Extract price
-                price_element = product.find("span", class_="a-offscreen")
-                if not price_element:
-                    price_element = product.find("span", class_="a-price-whole")
-                
-                title = title_element.text.strip() if title_element else "Title not found"
-                price = price_element.text.strip() if price_element else "Price not found"
-                
-                # Extract brand and size from title
-                brand = extract_brand_from_title(title)
-                size = extract_size_from_title(title)
-                
-                # Extract numeric price for calculations
-                numeric_price = 0
-                if price != "Price not found":
-                    price_match = re.search(r'([\d,.]+)', price)
-                    if price_match:
-                        try:
-                            numeric_price = float(price_match.group(1).replace(',', ''))
-                        except ValueError:
-                            numeric_price = 0
-                
-                # Check availability based on NPL price thresholds
-                availability_status = check_availability(price, size)
-                
-                # Add data - check if this product is already in our list
-                duplicate = False
-                for i, existing_title in enumerate(all_titles):
-                    if normalize_text(title) == normalize_text(existing_title):
-                        duplicate = True
-                        # If this price is better, update the existing record
-                        if numeric_price > 0 and numeric_price < all_numeric_prices[i]:
-                            all_prices[i] = price
-                            all_numeric_prices[i] = numeric_price
-                        break
-                
-                if not duplicate:
-                    all_titles.append(title)
-                    all_prices.append(price)
-                    all_brands.append(brand)
-                    all_sizes.append(size)
-                    all_numeric_prices.append(numeric_price)
-                    all_availability_statuses.append(availability_status)
-                
-        except Exception as e:
-            print(f"Error scraping {search_term}: {str(e)}")
-            continue  # Skip this search term and try the next one
+            # Stop following this crawl once a page brings nothing new
+            if new_titles == 0:
+                finished[crawl] = "done"
+        
+        for crawl in active_crawls:
+            next_page[crawl] += wave_pages[crawl[0].name]
+            if next_page[crawl] > max_pages or valid_rows[crawl[0].name] >= max_products:
+                finished.setdefault(crawl, "done")
+        
+        for crawl, status in finished.items():
+            progress(labels[crawl], status, crawl_counts[crawl])
+        active_crawls = [crawl for crawl in active_crawls if crawl not in finished]
+    
+    # Rows in site order, then search term and page order, so dedup keeps the same rows as before
+    frames = [page_products for crawl in crawls for page_products in crawl_pages[crawl]]
     
     # Create DataFrame with all collected data
-    if all_titles:
-        data = {
-            "Product Title": all_titles,
-            "Price": all_prices,
-            "Brand": all_brands,
-            "Size": all_sizes,
-            "Numeric Price": all_numeric_prices,
-            "Availability Status": all_availability_statuses
-        }
+    if frames:
+        df_products = pd.concat(frames, ignore_index=True)
         
-        df_products = pd.DataFrame(data)
+        # Collapse duplicate titles across search terms, keeping the better price. Sites are
+        # deduplicated separately so each source keeps its own offer for the same product.
+        with span("dedup"):
+            df_products = pd.concat([
+                drop_duplicate_products(site_products, DedupIndex(normalize_text, fuzzy=DEDUP_FUZZY,
+                                                                  threshold=DEDUP_FUZZY_THRESHOLD))
+                for _, site_products in df_products.groupby('Source', sort=False)
+            ], ignore_index=True)
+        all_numeric_prices = df_products['Numeric Price'].tolist()
         
         # Filter by brand if specified
-        if brand_filter:
-            # Try to find the canonical brand name if using a partial name
-            canonical_brand = None
-            for brand_name in WATER_BRANDS:
-                if normalize_text(brand_filter) in normalize_text(brand_name):
-                    canonical_brand = brand_name
-                    break
-            
-            if canonical_brand:
-                df_products = df_products[df_products['Brand'] == canonical_brand]
-            else:
-                # Use fuzzy matching for brand filtering
-                normalized_filter = normalize_text(brand_filter)
-                brand_mask = df_products['Brand'].apply(
-                    lambda x: normalized_filter in normalize_text(x)
-                )
-                title_mask = df_products['Product Title'].apply(
-                    lambda x: normalized_filter in normalize_text(x)
-                )
-                df_products = df_products[brand_mask | title_mask]
+        with span("filter"):
+            if brand_filter:
+                # canonical_brand is the full brand name if using a partial name
+                if canonical_brand:
+                    df_products = df_products[df_products['Brand'] == canonical_brand]
+                else:
+                    # Use fuzzy matching for brand filtering
+                    normalized_filter = normalize_text(brand_filter)
+                    brand_mask = df_products['Brand'].apply(
+                        lambda x: normalized_filter in normalize_text(x)
+                    )
+                    title_mask = df_products['Product Title'].apply(
+                        lambda x: normalized_filter in normalize_text(x)
+                    )
+                    df_products = df_products[brand_mask | title_mask]
+        
+        # Read real stock availability (and missing prices) from the detail pages
+        if fetch_details:
+            with span("details"):
+                df_products, filled_prices = detail_enricher.enrich(df_products)
+                if filled_prices:
+                    df_products = product_enricher.enrich(df_products, units=False)
+        
+        # Pack count, unit volume and price per litre of the kept offers
+        with span("enrich"):
+            df_products = product_enricher.unit_prices(df_products)
         
-        # Create price table
-        price_table = create_price_table(df_products)
+        # The kept rows are stored, snapshotted and rendered in the compact encoding
+        with span("compact"):
+            df_products = product_encoding.encode(df_products)
         
-        # Find best offers
-        best_offers = find_best_offers(df_products)
+        # Update the last known state and price series of every product
+        with span("catalogue"):
+            product_catalogue.upsert(df_products)
         
-        # Calculate availability percentages
-        npl_availability = calculate_availability_percentage(df_products, "Nestlé Pure Life")
-        baraka_availability = calculate_availability_percentage(df_products, "Baraka")
+        with span("analytics"):
+            # Price table and best offers; only the (brand, size) cells this scrape changed
+            # since the previous scrape of the same search are recomputed
+            price_table, best_offers = offer_tables.update((keyword, brand_filter or ''), df_products)
         
-        # Price analysis statistics
-        valid_prices = [p for p in all_numeric_prices if p > 0]
-        if valid_prices:
-            avg_price = sum(valid_prices) / len(valid_prices)
-            min_price = min(valid_prices)
-            max_price = max(valid_prices)
+            # The same comparisons per litre, so packs of different counts line up
+            unit_price_table = create_price_table(df_products, per_litre=True)
+            unit_best_offers = find_best_offers(df_products, per_litre=True)
+        
+            # Calculate availability percentages
+            npl_availability = calculate_availability_percentage(df_products, "Nestlé Pure Life")
+            baraka_availability = calculate_availability_percentage(df_products, "Baraka")
+        
+            # Price analysis statistics
+            valid_prices = [p for p in all_numeric_prices if p > 0]
+            if valid_prices:
+                avg_price = sum(valid_prices) / len(valid_prices)
+                min_price = min(valid_prices)
+                max_price = max(valid_prices)
             
-            price_stats = {
-                "Average Price": f"{avg_price:.2f} EGP",
-                "Minimum Price": f"{min_price:.2f} EGP",
-                "Maximum Price": f"{max_price:.2f} EGP",
-                "Number of Products": len(valid_prices),
-                "NPL Availability": f"{npl_availability}%",
-                "Baraka Availability": f"{baraka_availability}%",
-                "Price Table": price_table,
-                "Best Offers": best_offers
-            }
-        else:
-            price_stats = {"message": "No valid prices found for analysis"}
+                price_stats = {
+                    "Average Price": f"{avg_price:.2f} EGP",
+                    "Minimum Price": f"{min_price:.2f} EGP",
+                    "Maximum Price": f"{max_price:.2f} EGP",
+                    "Number of Products": len(valid_prices),
+                    "NPL Availability": f"{npl_availability}%",
+                    "Baraka Availability": f"{baraka_availability}%",
+                    "Price Table": price_table,
+                    "Best Offers": best_offers,
+                    "Unit Price Table": unit_price_table,
+                    "Unit Best Offers": unit_best_offers
+                }
+            else:
+                price_stats = {"message": "No valid prices found for analysis"}
         
         last_scrape_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Save to CSV
-        df_products.to_csv('static/data/products.csv', index=False, encoding='utf-8-sig')
+        with span("csv_write"):
+            # Save to CSV
+            df_products.to_csv('static/data/products.csv', index=False, encoding='utf-8-sig')
+        
+            # Save price table to CSV
+            price_table.to_csv('static/data/price_table.csv', encoding='utf-8-sig')
+        
+        # Record changed prices in the history store
+        with span("history"):
+            history_store.append_snapshot(df_products)
         
-        # Save price table to CSV
-        price_table.to_csv('static/data/price_table.csv', encoding='utf-8-sig')
+        with span("view_model"):
+            dashboard_view = build_dashboard_view(df_products, price_stats)
         
-        return {"status": "success", "products": len(all_titles)}
+        return {
+            "status": "success",
+            "version": uuid.uuid4().hex,
+            "products": len(all_numeric_prices),
+            "df_products": df_products,
+            "price_stats": price_stats,
+            "dashboard_view": dashboard_view,
+            "last_scrape_time": last_scrape_time,
+            "filtered_brand": brand_filter
+        }
     else:
         return {"status": "error", "message": "No products found or all searches failed"}
 
+# Scrapes run in the background; successful results become shared snapshots
+snapshot_store = SnapshotStore(SNAPSHOT_DB_PATH, keep=SNAPSHOT_KEEP)
+
+# Price alerts go to a JSON lines file, plus a local webhook and mail server when configured
+alert_sinks = [FileSink(ALERT_LOG_PATH)]
+if ALERT_WEBHOOK_URL:
+    alert_sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+if ALERT_SMTP_HOST:
+    alert_sinks.append(SmtpSink(ALERT_SMTP_HOST, ALERT_SMTP_PORT, recipients=[ALERT_EMAIL_TO]))
+alert_engine = AlertEngine(build_rules(ALERT_RULES), alert_sinks, history_store.product_key)
+
+def check_alerts(keyword, result, previous=None):
+    """Raise alerts for what changed since the previous scrape of the same search"""
+    try:
+        with span("alerts"):
+            alert_engine.check((keyword, result.get("filtered_brand") or ''), result, previous)
+    except Exception as e:
+        print(f"Alert check failed for {keyword}: {e}")
+
+def publish_result(keyword, result):
+    """Save a finished scrape as a shared snapshot and check it against the snapshot before it"""
+    previous = snapshot_store.latest(keyword, result.get("filtered_brand") or '')
+    snapshot_store.save(keyword, result)
+    check_alerts(keyword, result, previous)
+
+# Job progress and status live next to the snapshots, so any worker can answer a poll
+job_store = JobStore(SNAPSHOT_DB_PATH)
+job_manager = JobManager(scrape_amazon, job_store, max_workers=SCRAPE_WORKERS, publish=publish_result)
+
+def sweep_all_brands():
+    """
+    Scrape every water brand once; results are appended to the price history
+    and checked for alerts against the previous sweep
+    """
+    for brand in WATER_BRANDS:
+        result = scrape_amazon(SWEEP_KEYWORD, brand)
+        if result["status"] != "success":
+            print(f"Sweep found no products for {brand}: {result['message']}")
+        else:
+            check_alerts(SWEEP_KEYWORD, result)
+
+sweep_scheduler = SweepScheduler(sweep_all_brands, SWEEP_INTERVAL_MINUTES * 60, lock_path=SWEEP_LOCK_PATH)
+
+@app.before_request
+def start_sweep_scheduler():
+    """
+    Start the scheduled sweep with the first request a server process
+    handles, under python app.py, flask run or gunicorn alike. CLI commands
+    and scripts that import the app never start it.
+    """
+    if SWEEP_INTERVAL_MINUTES:
+        sweep_scheduler.start()
+
+@app.cli.command('sweep')
+def sweep_command():
+    """Scrape all brands once into the price history"""
+    sweep_all_brands()
+
+@app.cli.command('reenrich')
+@click.argument('path', default='static/data/products.csv')
+def reenrich_command(path):
+    """Recompute brand, size and availability of a stored products CSV"""
+    df = product_enricher.reenrich_csv(path)
+    print(f"Re-enriched {len(df)} rows in {path}")
+
+@app.cli.command('rollups')
+def rollups_command():
+    """Rebuild the daily trend rollups from the stored price history"""
+    days = history_store.rebuild_rollups()
+    print(f"Rebuilt rollups for {days} days")
+
+@app.cli.command('rekey')
+def rekey_command():
+    """Move history and catalogue rows keyed by an older title normalization to the current keys"""
+    observations = history_store.rekey_titles()
+    products = product_catalogue.rekey_titles()
+    print(f"Re-keyed {observations} history keys and {products} catalogue products")
+
+# Rendered dashboard fragments, keyed by scrape version
+dashboard_cache = RenderCache()
+
+def current_result():
+    """
+    Return the snapshot pinned with ?snapshot=<version>, else the latest
+    one, or an empty dict
+    """
+    version = request.args.get('snapshot')
+    if version:
+        return snapshot_store.get(version) or {}
+    return snapshot_store.latest() or {}
+
 @app.route('/')
 def index():
-    price_table = None
-    best_offers = None
-    
-    if price_stats and 'Price Table' in price_stats:
-        price_table = price_stats['Price Table']
-    
-    if price_stats and 'Best Offers' in price_stats:
-        best_offers = price_stats['Best Offers']
-    
-    return render_template('index.html', 
-                           products=df_products, 
-                           stats=price_stats,
-                           last_scrape=last_scrape_time,
-                           filtered_brand=filtered_brand,
-                           price_table=price_table,
-                           best_offers=best_offers,
-                           brands=WATER_BRANDS)
+    result = current_result()
+    version = result.get('version')
+    
+    # A job started from the form is shown with its progress until it finishes
+    job = None
+    job_id = request.args.get('job')
+    if job_id:
+        job = job_manager.get(job_id)
+        # A finished job shows its own scrape, not whichever one finished last
+        if job and job.get('version') and request.args.get('snapshot') != job['version']:
+            return redirect(url_for('index', job=job_id, snapshot=job['version']))
+    cache_stats = http_cache.stats()
+    
+    # Repeat loads of an unchanged dashboard are answered with 304 Not Modified
+    etag = dashboard_etag(version, job, cache_stats)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    
+    # The data part of the page is rendered once per scrape
+    dashboard = dashboard_cache.get_or_render(version, lambda: render_template(
+        '_dashboard.html', view=result.get('dashboard_view') or build_dashboard_view(None, None),
+        snapshot=version))
+    
+    response = make_response(render_template('index.html', 
+                                             dashboard=dashboard,
+                                             last_scrape=result.get('last_scrape_time'),
+                                             filtered_brand=result.get('filtered_brand'),
+                                             cache_stats=cache_stats,
+                                             job=job,
+                                             brands=WATER_BRANDS))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/scrape', methods=['POST'])
 def scrape():
     keyword = request.form.get('keyword', 'water')
     brand_filter = request.form.get('brand_filter', None)
     max_products = int(request.form.get('max_products', 48))
+    max_pages = min(max(int(request.form.get('max_pages', SCRAPE_MAX_PAGES)), 1), MAX_PAGES_LIMIT)
+    fetch_details = request.form.get('fetch_details') == 'on'
+    # ?profile=1 (or the form checkbox) runs the scrape under cProfile
+    profile = request.values.get('profile') in ('on', '1', 'true')
     
     # If brand filter is empty string, set to None
     if brand_filter == "":
         brand_filter = None
     
-    result = scrape_amazon(keyword, brand_filter, max_products)
+    job, created = job_manager.submit(keyword, brand_filter, max_products, max_pages, fetch_details, profile)
     
-    if result["status"] == "success":
-        return redirect(url_for('index'))
-    else:
-        return render_template('error.html', error=result["message"])
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job.to_dict()), 202
+    return redirect(url_for('index', job=job.id))
+
+@app.route('/api/snapshots')
+def api_snapshots():
+    return jsonify(snapshot_store.list())
+
+@app.route('/api/alerts')
+def api_alerts():
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    return jsonify({"alerts": alert_engine.recent_alerts(limit), "stats": alert_engine.stats()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/profile')
+def job_profile(job_id):
+    profile = job_manager.profile(job_id)
+    if not profile:
+        return jsonify({"error": "No profile for this job"}), 404
+    return Response(profile, mimetype='text/plain')
+
+def collect_app_metrics():
+    """Fetch engine, page cache and job metrics for /metrics"""
+    fetch_stats = fetch_engine.stats()
+    cache_stats = http_cache.stats()
+    counters = [
+        ("fetch_requests_total", "Requests sent by the fetch engine", "requests"),
+        ("fetch_retries_total", "Requests retried after an error or throttling", "retries"),
+        ("fetch_throttled_total", "Responses that made the engine back off", "throttled"),
+        ("fetch_captchas_total", "Captcha pages received", "captchas"),
+        ("fetch_timeouts_total", "Requests that timed out", "timeouts"),
+        ("fetch_errors_total", "Requests that failed after all retries", "errors"),
+        ("fetch_bytes_total", "Response bytes received", "bytes"),
+    ]
+    collected = [(name, "counter", help_text, [({}, fetch_stats[key])]) for name, help_text, key in counters]
+    collected.append(("fetch_responses_total", "counter", "Responses by HTTP status",
+                      [({"status": status}, count) for status, count in sorted(fetch_stats["statuses"].items())]))
+    collected.append(("fetch_requests_per_second", "gauge", "Requests per second over the last minute",
+                      [({}, fetch_stats["requests_per_second"])]))
+    collected.append(("fetch_host_concurrency", "gauge", "Adaptive concurrency limit per host",
+                      [({"host": host}, state["concurrency"]) for host, state in fetch_stats["hosts"].items()]))
+    collected.append(("fetch_host_rate", "gauge", "Adaptive request rate per host",
+                      [({"host": host}, state["rate"]) for host, state in fetch_stats["hosts"].items()]))
+    collected.append(("http_cache_requests_total", "counter", "Page cache lookups by outcome",
+                      [({"outcome": outcome}, cache_stats[outcome]) for outcome in ("hits", "misses", "revalidated")]))
+    collected.append(("http_cache_size_bytes", "gauge", "Size of the page cache",
+                      [({}, cache_stats["size_bytes"])]))
+    normalize_stats = text_normalizer.stats()
+    collected.append(("normalize_cache_requests_total", "counter", "normalize_text memo lookups by outcome",
+                      [({"outcome": outcome}, normalize_stats[outcome]) for outcome in ("hits", "misses")]))
+    alert_stats = alert_engine.stats()
+    collected.append(("alerts_total", "counter", "Alerts raised by rule",
+                      [({"rule": rule}, count) for rule, count in sorted(alert_stats["rules"].items())]))
+    collected.append(("alert_changed_rows_total", "counter", "Changed rows passed to the alert rules",
+                      [({}, alert_stats["changed_rows"])]))
+    collected.append(("alert_sink_errors_total", "counter", "Alert deliveries that failed",
+                      [({}, alert_stats["sink_errors"])]))
+    return collected
+
+metrics.register(collect_app_metrics)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def export_response(body, export_format, name):
+    """Wrap a streaming export body in a download response"""
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(body,
+                    mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment;filename={name}_{timestamp}.{extension}"})
+
+@app.route('/api/fetch_metrics')
+def api_fetch_metrics():
+    return jsonify(fetch_engine.stats())
+
+@app.route('/api/trends')
+def api_trends():
+    brand_filter = request.args.get('brand') or None
+    brand = (find_canonical_brand(brand_filter) or brand_filter) if brand_filter else None
+    size = request.args.get('size') or None
+    try:
+        window = min(max(int(request.args.get('window', TRENDS_DEFAULT_WINDOW)), 1), TRENDS_MAX_WINDOW)
+    except ValueError:
+        return jsonify({"error": "window must be a number of days"}), 400
+    
+    # Daily rollups are a few rows per (brand, size) and day, so this stays small
+    rollups = history_store.load_rollups(brand, size, request.args.get('start') or None,
+                                         request.args.get('end') or None)
+    trends = analytics.price_trends(rollups, window)
+    events = analytics.price_change_events(rollups)
+    
+    # Build the points column-wise; JSON has no NaN, so missing prices become null
+    points = pd.DataFrame({
+        "day": trends['day'].dt.strftime('%Y-%m-%d'),
+        "min_price": trends['min_price'],
+        "median_price": trends['median_price'],
+        "rolling_min": trends['rolling_min'],
+        "rolling_median": trends['rolling_median'],
+    })
+    points = points.astype(object).where(points.notna(), None)
+    
+    # Trends come sorted by brand, size and day, so each series is one run of rows
+    series = []
+    for series_brand, series_size, point in zip(trends['brand'], trends['size'], points.to_dict(orient='records')):
+        if not series or series[-1]["brand"] != series_brand or series[-1]["size"] != series_size:
+            series.append({"brand": series_brand, "size": series_size, "points": []})
+        series[-1]["points"].append(point)
+    
+    return jsonify({
+        "brand": brand,
+        "size": size,
+        "window": window,
+        "series": series,
+        "events": events.to_dict(orient='records'),
+        "availability": analytics.availability_trend(rollups, [brand] if brand else WATER_BRANDS),
+    })
 
 @app.route('/download')
 def download():
-    if df_products is None:
-        return redirect(url_for('index'))
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    writer.writerow(df_products.columns.tolist())
-    
-    # Write data
-    for _, row in df_products.iterrows():
-        writer.writerow(row.tolist())
-    
-    output.seek(0)
-    
-    # Generate the response
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return Response(output.getvalue(),
-                    mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=amazon_products_{timestamp}.csv"})
+    export_format = request.args.get('format', 'csv')
+    source = request.args.get('source', 'latest')
+    filters = {
+        "brand": request.args.get('brand') or None,
+        "size": request.args.get('size') or None,
+        "start": request.args.get('start') or None,
+        "end": request.args.get('end') or None,
+    }
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown format: {export_format}"}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({"error": "Parquet export requires pyarrow"}), 400
+    
+    if source == 'history':
+        # The history can be large, so filters run in SQL and rows stream in chunks
+        chunks = history_store.iter_chunks(chunk_rows=EXPORT_CHUNK_ROWS, **filters)
+        columns = list(history_store.EXPORT_COLUMNS.values())
+        empty = history_store.empty_chunk()
+        name = "price_history"
+    else:
+        df_products = current_result().get('df_products')
+        if df_products is None:
+            return redirect(url_for('index'))
+        chunks = (filter_products(chunk, **filters)
+                  for chunk in iter_frame_chunks(df_products, EXPORT_CHUNK_ROWS))
+        columns = df_products.columns.tolist()
+        empty = df_products.iloc[:0]
+        name = "amazon_products"
+    
+    return export_response(stream_export(chunks, export_format, columns, empty), export_format, name)
 
 @app.route('/download_price_table')
 def download_price_table():
-    if price_stats is None or 'Price Table' not in price_stats:
+    # ?unit=litre pivots on the price per litre instead of the shelf price
+    per_litre = request.args.get('unit') == 'litre'
+    name = 'unit_price_table' if per_litre else 'price_table'
+    if request.args.get('source') == 'history':
+        # Lowest observed price per cell over the requested date range
+        observations = history_store.load(start=request.args.get('start') or None,
+                                          end=request.args.get('end') or None)
+        observations = observations.rename(columns=history_store.EXPORT_COLUMNS)
+        if per_litre:
+            observations = product_enricher.unit_prices(observations)
+        price_table = create_price_table(observations, per_litre)
+        return export_response(iter_csv([price_table], price_table.columns.tolist(), index=True),
+                               'csv', f'{name}_history')
+    
+    table_key = 'Unit Price Table' if per_litre else 'Price Table'
+    price_stats = current_result().get('price_stats')
+    if price_stats is None or table_key not in price_stats:
         return redirect(url_for('index'))
     
-    price_table = price_stats['Price Table']
-    
-    output = io.StringIO()
-    price_table.to_csv(output)
+    price_table = price_stats[table_key]
     
-    output.seek(0)
-    
-    # Generate the response
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return Response(output.getvalue(),
-                    mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=price_table_{timestamp}.csv"})
+    return export_response(iter_csv([price_table], price_table.columns.tolist(), index=True), 'csv', name)
 
 @app.route('/download_stats')
 def download_stats():
+    price_stats = current_result().get('price_stats')
     if price_stats is None:
         return redirect(url_for('index'))
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers and data
-    writer.writerow(["Statistic", "Value"])
-    
-    for key, value in price_stats.items():
-        # Skip dataframes in the stats
-        if key not in ['Price Table', 'Best Offers']:
-            writer.writerow([key, value])
-    
-    output.seek(0)
+    # Skip dataframes in the stats
+    stats = pd.DataFrame(
+        [[key, value] for key, value in price_stats.items() if key not in TABLE_STATS],
+        columns=["Statistic", "Value"]
+    )
     
-    # Generate the response
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return Response(output.getvalue(),
-                    mimetype="text/csv",
-                    headers={"Content-Disposition": f"attachment;filename=price_analysis_{timestamp}.csv"})
+    return export_response(iter_csv([stats]), 'csv', 'price_analysis')
+
+@app.route('/download_catalogue')
+def download_catalogue():
+    chunks = product_catalogue.iter_chunks(chunk_rows=EXPORT_CHUNK_ROWS)
+    return export_response(iter_csv(chunks, list(product_catalogue.EXPORT_COLUMNS.values())), 'csv', 'catalogue')
+
+@app.route('/catalogue/<product_key>/prices')
+def catalogue_prices(product_key):
+    series = product_catalogue.price_series(product_key)
+    return jsonify([
+        {"observed_at": observed_at.isoformat(), "price": price}
+        for observed_at, price in zip(series['Observed At'], series['Numeric Price'])
+    ])
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
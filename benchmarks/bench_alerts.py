@@ -0,0 +1,234 @@
+"""
+Check and benchmark for the price alert engine.
+
+A synthetic snapshot of many products is scraped "again" with a small share
+of rows changed, including three planted events: a Nestlé Pure Life SKU
+crossing its threshold, a 20% price drop and a competitor undercutting
+Nestlé Pure Life per litre at 1.5L. The script checks that each planted
+event raises its alert and that the alerts reach all three sinks: a JSON
+lines file, a webhook served by a local HTTP server and a local SMTP server.
+A scrape after one that found no products must count every row as new.
+
+Then the time of a check is reported for growing shares of changed rows,
+next to evaluating the rules on every row of the snapshot, to show that rule
+work follows the number of changes.
+
+Usage:
+    python benchmarks/bench_alerts.py --products 100000
+"""
+import argparse
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+from alerts import (AlertEngine, FileSink, SmtpSink, UndercutRule, WebhookSink, build_rules, keyed_frame,  # noqa: E402
+                    snapshot_diff)
+
+
+class WebhookCapture:
+    """Local HTTP endpoint that keeps the JSON bodies posted to it"""
+    def __init__(self):
+        self.bodies = []
+        capture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                capture.bodies.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/alerts"
+
+
+class SmtpCapture:
+    """Minimal local SMTP server that keeps the messages it receives"""
+    def __init__(self):
+        self.messages = []
+        capture = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                self.reply("220 localhost capture")
+                while True:
+                    line = self.rfile.readline().decode('utf-8').rstrip('\r\n')
+                    command = line[:4].upper()
+                    if command in ('HELO', 'EHLO'):
+                        self.reply("250 localhost")
+                    elif command == 'DATA':
+                        self.reply("354 end with .")
+                        data = []
+                        for data_line in iter(self.rfile.readline, b''):
+                            if data_line in (b'.\r\n', b'.\n'):
+                                break
+                            data.append(data_line.decode('utf-8'))
+                        capture.messages.append(''.join(data))
+                        self.reply("250 OK")
+                    elif command == 'QUIT' or not line:
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("250 OK")
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+
+
+def build_snapshot(products, seed=0):
+    """A products table with a Nestlé Pure Life row at 90 EGP for 12 x 1.5L first"""
+    rng = np.random.default_rng(seed)
+    brands = np.array(app.WATER_BRANDS)
+    sizes = np.array(app.STANDARD_SIZES[:5])
+    brand = brands[rng.integers(0, len(brands), products)]
+    size = sizes[rng.integers(0, len(sizes), products)]
+    prices = np.round(rng.uniform(60, 400, products), 2)
+    # Nestlé Pure Life 1.5L packs are the cheapest per litre until the planted undercut
+    brand[0], size[0], prices[0] = "Nestlé Pure Life", "1.5L", 90.0
+    prices[(size == "1.5L") & (brand != "Nestlé Pure Life")] = 150.0
+    df = pd.DataFrame({
+        'Product Title': [f"{b} water {s} pack {i}" for i, (b, s) in enumerate(zip(brand, size))],
+        'Price': [f"EGP {price:.2f}" for price in prices],
+        'Brand': brand,
+        'Size': size,
+        'Numeric Price': prices,
+        'Availability Status': "Available",
+        'Pack Count': 12,
+        'Unit Litres': pd.Series(size).map(app.SIZE_LITRES).to_numpy(),
+        'ASIN': [f"B0{i:08d}" for i in range(products)],
+    })
+    df['Price per Litre'] = (df['Numeric Price'] / (df['Pack Count'] * df['Unit Litres'])).round(2)
+    return df
+
+
+def rescrape(df, share, seed=1):
+    """A later scrape: share of the rows reprice by a few percent, plus three planted events"""
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    changed = rng.random(len(df)) < share
+    df.loc[changed, 'Numeric Price'] = (df.loc[changed, 'Numeric Price'] * rng.uniform(0.95, 1.05, changed.sum())).round(2)
+
+    limit = app.NPL_PRICE_THRESHOLDS["6L"]
+    npl_over = df.index[(df['Brand'] == "Nestlé Pure Life") & (df['Size'] == "6L") & (df['Numeric Price'] < limit)][0]
+    df.loc[npl_over, 'Numeric Price'] = limit + 50
+    drop = df.index[df['Brand'] == "Baraka"][0]
+    df.loc[drop, 'Numeric Price'] = round(df.loc[drop, 'Numeric Price'] * 0.8, 2)
+    undercut = df.index[(df['Brand'] == "Aquafina") & (df['Size'] == "1.5L")][0]
+    df.loc[undercut, 'Numeric Price'] = 60.0
+
+    df['Price per Litre'] = (df['Numeric Price'] / (df['Pack Count'] * df['Unit Litres'])).round(2)
+    planted = {"npl-over-threshold": df.loc[npl_over, 'ASIN'], "price-drop": df.loc[drop, 'ASIN'],
+               "npl-undercut": df.loc[undercut, 'ASIN']}
+    return df, planted
+
+
+def check_sinks(products):
+    webhook = WebhookCapture()
+    smtp = SmtpCapture()
+    log_path = os.path.join(tempfile.mkdtemp(prefix='bench_alerts_'), 'alerts.jsonl')
+    engine = AlertEngine(build_rules(app.ALERT_RULES),
+                         [FileSink(log_path), WebhookSink(webhook.url),
+                          SmtpSink('127.0.0.1', smtp.port, recipients=['pricing@localhost'])],
+                         app.history_store.product_key)
+
+    before = build_snapshot(products)
+    after, planted = rescrape(before, 0.001)
+    if engine.check(('water', ''), {"version": "v1", "df_products": app.product_encoding.encode(before)}):
+        sys.exit("the first scrape of a search raised alerts")
+    alerts = engine.check(('water', ''), {"version": "v2", "df_products": app.product_encoding.encode(after)})
+
+    for rule, key in planted.items():
+        if not any(alert["rule"] == rule and alert["product_key"] == key for alert in alerts):
+            sys.exit(f"{rule} did not fire for {key}: {[alert['message'] for alert in alerts]}")
+    with open(log_path, encoding='utf-8') as f:
+        logged = [json.loads(line) for line in f]
+    if len(logged) != len(alerts) or len(webhook.bodies) != 1 or len(webhook.bodies[0]["alerts"]) != len(alerts):
+        sys.exit(f"{len(alerts)} alerts, {len(logged)} logged, webhook bodies {len(webhook.bodies)}")
+    if len(smtp.messages) != 1 or f"{len(alerts)} price alert" not in smtp.messages[0]:
+        sys.exit(f"unexpected mail: {smtp.messages}")
+    if engine.stats()["sink_errors"]:
+        sys.exit(f"sink errors: {engine.stats()}")
+    for alert in alerts:
+        if alert["rule"] in planted and alert["product_key"] == planted[alert["rule"]]:
+            print(f"  {alert['rule']:<20} {alert['message']}")
+    print(f"{len(alerts)} alerts reached the file, webhook and SMTP sinks")
+
+
+def check_empty_previous(products):
+    """A scrape after an empty one: every product is new, and the check does not fail"""
+    snapshot = app.product_encoding.encode(build_snapshot(products))
+    empty = keyed_frame(snapshot.iloc[:0], app.history_store.product_key)
+    changes = snapshot_diff(empty, keyed_frame(snapshot, app.history_store.product_key))
+    if len(changes) != products or not (changes['Change'] == 'new').all():
+        sys.exit(f"after an empty snapshot {len(changes)} of {products} rows changed: {changes['Change'].unique()}")
+    engine = AlertEngine(build_rules(app.ALERT_RULES), [], app.history_store.product_key)
+    engine.check(('water', ''), {"version": "v1", "df_products": snapshot.iloc[:0]})
+    engine.check(('water', ''), {"version": "v2", "df_products": snapshot})
+    print(f"after an empty snapshot all {products} rows are new")
+
+
+def time_checks(products):
+    rules = build_rules(app.ALERT_RULES)
+    before = keyed_frame(app.product_encoding.encode(build_snapshot(products)), app.history_store.product_key)
+    # Undercut standings as the check of the previous scrape leaves them
+    standings = {rule.name: rule.best(before) for rule in rules if isinstance(rule, UndercutRule)}
+    print(f"{'changed':>8} {'rows':>9} {'diff':>9} {'rules':>9} {'all rows':>9}")
+    for share in (0.001, 0.01, 0.1):
+        after_df, _ = rescrape(build_snapshot(products), share)
+        after = keyed_frame(app.product_encoding.encode(after_df), app.history_store.product_key)
+
+        start = time.perf_counter()
+        changes = snapshot_diff(before, after)
+        diff_time = time.perf_counter() - start
+        state = {"previous": standings, "current": {}, "removed": 0}
+        start = time.perf_counter()
+        for rule in rules:
+            rule.evaluate(changes, before, after, state)
+        rules_time = time.perf_counter() - start
+
+        for rule in rules:
+            if isinstance(rule, UndercutRule) and state["current"][rule.name] != rule.best(after):
+                sys.exit(f"updated undercut standings differ from a full pass at {share:.1%} changed")
+
+        # Without the diff every row goes through the rules, and undercut ranks every size again
+        everything = after.join(before[['Numeric Price', 'Availability Status', 'Price per Litre']]
+                                .add_suffix(' Before'))
+        start = time.perf_counter()
+        for rule in rules:
+            rule.evaluate(everything, before, after)
+        full_time = time.perf_counter() - start
+        print(f"{share:>8.1%} {len(changes):>9,} {diff_time * 1000:>7.1f}ms {rules_time * 1000:>7.1f}ms "
+              f"{full_time * 1000:>7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=100000)
+    args = parser.parse_args()
+
+    check_sinks(min(args.products, 20000))
+    check_empty_previous(min(args.products, 20000))
+    time_checks(args.products)
+
+
+if __name__ == '__main__':
+    main()
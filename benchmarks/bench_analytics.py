@@ -0,0 +1,190 @@
+"""
+Parity check and benchmark for the vectorized price analytics.
+
+The original create_price_table and find_best_offers are kept here as the
+reference implementations. Synthetic product frames with every brand and
+size, unknown brands/sizes and missing prices are run through both; the
+script fails if the outputs differ, then reports the time of each.
+
+The per-scope offer tables are checked the same way: a snapshot is scraped
+again several times with a few rows repriced, moved to another brand or
+size, dropped or added, and after each scrape the incrementally updated
+tables must equal a full recompute.
+
+Usage:
+    python benchmarks/bench_analytics.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import analytics  # noqa: E402
+import app  # noqa: E402
+from catalogue import OfferTables  # noqa: E402
+
+
+def legacy_create_price_table(df):
+    """The original create_price_table, kept as the parity reference"""
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    df_valid = df[(df['Brand'] != 'Other') & (df['Size'] != 'Unknown Size')]
+
+    if df_valid.empty:
+        empty_df = pd.DataFrame(columns=app.WATER_BRANDS)
+        empty_df.index.name = 'Size'
+        return empty_df
+
+    pivot_df = df_valid.pivot_table(
+        index='Size',
+        columns='Brand',
+        values='Numeric Price',
+        aggfunc='min'
+    )
+
+    pivot_df = pivot_df.fillna('')
+
+    for col in pivot_df.columns:
+        pivot_df[col] = pivot_df[col].apply(lambda x: round(x) if isinstance(x, (int, float)) else x)
+
+    if not pivot_df.empty:
+        valid_sizes = [size for size in app.STANDARD_SIZES if size in pivot_df.index]
+        if valid_sizes:
+            pivot_df = pivot_df.reindex(valid_sizes)
+
+    return pivot_df
+
+
+def legacy_find_best_offers(df):
+    """
+    The original find_best_offers. Newer pandas leaves the grouping column
+    out of the groups, so it is selected explicitly here.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    df_valid = df[(df['Brand'] != 'Other') &
+                  (df['Size'] != 'Unknown Size') &
+                  (df['Numeric Price'] > 0)]
+
+    if df_valid.empty:
+        return pd.DataFrame()
+
+    best_offers = df_valid.groupby('Size')[['Size', 'Brand', 'Numeric Price']].apply(
+        lambda x: x.loc[x['Numeric Price'].idxmin()]
+    )[['Size', 'Brand', 'Numeric Price']]
+
+    return best_offers.rename(columns={'Numeric Price': 'Best Price'})
+
+
+def build_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    brands = np.array(app.WATER_BRANDS + ['Other'])
+    sizes = np.array(app.STANDARD_SIZES + ['Unknown Size', '2.25L', '19L'])
+    prices = np.round(rng.uniform(3, 400, rows), 2)
+    prices[rng.random(rows) < 0.1] = 0.0
+    return pd.DataFrame({
+        'Product Title': [f"product {i}" for i in range(rows)],
+        'Brand': brands[rng.integers(0, len(brands), rows)],
+        'Size': sizes[rng.integers(0, len(sizes), rows)],
+        'Numeric Price': prices,
+        'Availability Status': np.where(rng.random(rows) < 0.8, 'Available', 'Below Threshold'),
+    })
+
+
+def rescrape(df, share, seed):
+    """A later scrape of df: share of the rows repriced, and a few rows moved, dropped or added"""
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    rows = len(df)
+    repriced = rng.random(rows) < share
+    df.loc[repriced, 'Numeric Price'] = np.round(rng.uniform(3, 400, repriced.sum()), 2)
+    moved = rng.random(rows) < share / 10
+    df.loc[moved, 'Brand'] = rng.choice(app.WATER_BRANDS + ['Other'], moved.sum())
+    df.loc[moved, 'Size'] = rng.choice(app.STANDARD_SIZES + ['Unknown Size'], moved.sum())
+    df = df[rng.random(rows) >= share / 10]
+    added = build_frame(max(1, int(rows * share / 10)), seed + 1000)
+    added['Product Title'] = [f"new product {seed} {i}" for i in range(len(added))]
+    return pd.concat([df, added], ignore_index=True)
+
+
+def check_offer_tables(rows, scrapes=5, share=0.01):
+    """Exit when the incrementally updated tables differ from a full recompute"""
+    tables = OfferTables(sizes=app.STANDARD_SIZES, empty_brands=app.WATER_BRANDS)
+    df = build_frame(rows)
+    update_time = full_time = 0
+    for scrape in range(scrapes + 1):
+        if scrape:
+            df = rescrape(df, share, scrape)
+        products = app.product_encoding.encode(df)
+        (price_table, best_offers), seconds = timed(tables.update, ('water', ''), products)
+        if scrape:
+            update_time += seconds
+        start = time.perf_counter()
+        expected_table = app.create_price_table(products)
+        expected_offers = app.find_best_offers(products)
+        full_time += time.perf_counter() - start if scrape else 0
+        try:
+            pd.testing.assert_frame_equal(price_table, expected_table)
+            pd.testing.assert_frame_equal(best_offers, expected_offers)
+        except AssertionError as e:
+            sys.exit(f"offer tables differ from a full recompute after scrape {scrape} at {rows} rows: {e}")
+    return update_time / scrapes, full_time / scrapes
+
+
+def as_text(table):
+    """Render a price table cell by cell the way the CSV export does"""
+    return table.astype(object).where(table.notna(), '').astype(str)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'table legacy':>13} {'table new':>10} {'offers legacy':>14} {'offers new':>11}")
+    for rows in args.rows:
+        df = build_frame(rows)
+
+        expected_table, legacy_table_time = timed(legacy_create_price_table, df)
+        actual_table, table_time = timed(app.create_price_table, df)
+        if not as_text(expected_table).equals(as_text(actual_table)):
+            print(expected_table)
+            print(actual_table)
+            sys.exit(f"price table differs at {rows} rows")
+        if not all(str(dtype) == 'Int64' for dtype in actual_table.dtypes):
+            sys.exit(f"price table is not numeric: {actual_table.dtypes.tolist()}")
+
+        expected_offers, legacy_offers_time = timed(legacy_find_best_offers, df)
+        actual_offers, offers_time = timed(analytics.best_offers, df)
+        if not expected_offers.reset_index(drop=True).equals(actual_offers.reset_index(drop=True)) \
+                or not expected_offers.index.equals(actual_offers.index):
+            print(expected_offers)
+            print(actual_offers)
+            sys.exit(f"best offers differ at {rows} rows")
+
+        print(f"{rows:>9,} {legacy_table_time * 1000:>11.1f}ms {table_time * 1000:>8.1f}ms "
+              f"{legacy_offers_time * 1000:>12.1f}ms {offers_time * 1000:>9.1f}ms")
+    print("parity OK")
+
+    print(f"{'rows':>9} {'offer tables updated':>21} {'recomputed':>11}")
+    for rows in args.rows[:2]:
+        update_time, full_time = check_offer_tables(rows)
+        print(f"{rows:>9,} {update_time * 1000:>19.1f}ms {full_time * 1000:>9.1f}ms")
+    print("offer tables match a full recompute")
+
+
+if __name__ == '__main__':
+    main()
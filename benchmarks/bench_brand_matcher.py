@@ -0,0 +1,102 @@
+"""
+Parity check and microbenchmark for the Aho-Corasick brand matcher.
+
+The legacy dictionary loop is kept here as the reference implementation and
+compared with both the per-title and the pandas batch API.
+
+Usage:
+    python benchmarks/bench_brand_matcher.py --titles 50000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+
+
+def legacy_normalize_text(text):
+    """The original normalize_text, without the memo or the Arabic folding"""
+    text = ''.join(c for c in unicodedata.normalize('NFD', text)
+                   if unicodedata.category(c) != 'Mn')
+    text = text.lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def legacy_extract_brand_from_title(title):
+    """The original extract_brand_from_title, kept as the parity reference"""
+    normalized_title = legacy_normalize_text(title)
+
+    for arabic_name, english_brand in app.ARABIC_BRAND_MAPPINGS.items():
+        if legacy_normalize_text(arabic_name) in normalized_title:
+            return english_brand
+
+    for brand, search_terms in app.BRAND_SEARCH_TERMS.items():
+        for term in search_terms:
+            if legacy_normalize_text(term) in normalized_title:
+                return brand
+
+    for brand in app.WATER_BRANDS:
+        if legacy_normalize_text(brand) in normalized_title:
+            return brand
+
+    return "Other"
+
+
+def build_corpus(size, seed=0):
+    rng = random.Random(seed)
+    terms = list(app.ARABIC_BRAND_MAPPINGS) + app.WATER_BRANDS
+    for search_terms in app.BRAND_SEARCH_TERMS.values():
+        terms.extend(search_terms)
+    noise = ["مياه", "كرتونة", "زجاجة", "water", "Mineral", "Natural", "1.5 لتر", "12 x 330ml",
+             "NESTLE", "Pure", "Life", "Bar", "aka", "فلوريدا", "sparkling", "gallon", "من"]
+    titles = []
+    for _ in range(size):
+        words = rng.sample(noise, rng.randint(2, 6))
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randint(0, len(words)), rng.choice(terms))
+        titles.append(' '.join(words))
+    return titles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--titles', type=int, default=50000)
+    args = parser.parse_args()
+
+    titles = build_corpus(args.titles)
+
+    start = time.perf_counter()
+    expected = [legacy_extract_brand_from_title(t) for t in titles]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [app.brand_matcher.match(t) for t in titles]
+    matcher_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = app.brand_matcher.match_series(pd.Series(titles)).tolist()
+    batch_time = time.perf_counter() - start
+
+    mismatches = [(t, e, a) for t, e, a in zip(titles, expected, actual) if e != a]
+    for title, e, a in mismatches[:10]:
+        print(f"MISMATCH {title!r}: legacy={e!r} matcher={a!r}")
+    if mismatches or batch != expected:
+        sys.exit(f"{len(mismatches)} of {len(titles)} titles differ")
+
+    print(f"titles:    {len(titles)} (parity OK)")
+    print(f"legacy:    {len(titles) / legacy_time:,.0f} titles/s")
+    print(f"matcher:   {len(titles) / matcher_time:,.0f} titles/s")
+    print(f"batch:     {len(titles) / batch_time:,.0f} titles/s")
+
+
+if __name__ == '__main__':
+    main()
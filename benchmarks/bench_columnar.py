@@ -0,0 +1,147 @@
+"""
+Memory benchmark for the compact columnar product encoding.
+
+Builds a history-like products table the way loading it from SQLite does:
+every row holds its own string objects for the title, price text, ASIN,
+URL and timestamp, drawn from a few thousand products observed over many
+snapshots. The table is measured as plain object columns (pandas before
+3.0), with the pandas default string dtype, and in the compact encoding.
+Shared string objects are counted once, so interning shows up in the
+numbers. The script fails if the compact table does not hold the same
+values, if the price table computed from it differs, or if a CSV or
+parquet round trip loses the encoding.
+
+Usage:
+    python benchmarks/bench_columnar.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+from columnar import CATEGORICAL_COLUMNS, exact_prices  # noqa: E402
+from exports import parquet_available  # noqa: E402
+
+
+def fresh(text):
+    """A new string object equal to text, like a database cursor returns"""
+    return (text + ' ')[:-1]
+
+
+def build_rows(rows, products=5000, snapshots=365, seed=0):
+    """Columns of a history-like table as lists of per-row string objects"""
+    rng = np.random.default_rng(seed)
+    brands = app.WATER_BRANDS + ['Other']
+    sizes = app.STANDARD_SIZES + ['Unknown Size', '2.25L', '19L']
+    product_brand = rng.integers(0, len(brands), products)
+    product_size = rng.integers(0, len(sizes), products)
+    product_price = np.round(rng.uniform(3, 400, products), 2)
+
+    product = rng.integers(0, products, rows)
+    snapshot = np.sort(rng.integers(0, snapshots, rows))
+    prices = np.round(product_price[product] * rng.uniform(0.9, 1.1, rows), 2)
+    prices[rng.random(rows) < 0.05] = 0.0
+    statuses = np.array(["Available", "Not Available", "Unknown"])[rng.choice(3, rows, p=[0.8, 0.15, 0.05])]
+    return {
+        'Observed At': [fresh(f"2026-{1 + s // 31 % 12:02d}-{1 + s % 28:02d}T06:00:00") for s in snapshot],
+        'Product Title': [fresh(f"{brands[product_brand[p]]} مياه طبيعية {sizes[product_size[p]]} عبوة {p}")
+                          for p in product],
+        'Price': [fresh(f"EGP {price:,.2f}") if price else "Price not found" for price in prices],
+        'Brand': [fresh(brands[product_brand[p]]) for p in product],
+        'Size': [fresh(sizes[product_size[p]]) for p in product],
+        'Numeric Price': prices,
+        'Availability Status': [fresh(status) for status in statuses],
+        'ASIN': [fresh(f"B0{p:08d}") for p in product],
+        'Product URL': [fresh(f"https://www.amazon.eg/dp/B0{p:08d}") for p in product],
+    }
+
+
+def frame_bytes(df):
+    """Bytes held by df, counting each distinct Python object of object columns once"""
+    total = 0
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object:
+            seen = {}
+            for value in values.tolist():
+                seen.setdefault(id(value), value)
+            total += 8 * len(values) + sum(sys.getsizeof(value) for value in seen.values())
+        else:
+            total += values.memory_usage(index=False, deep=True)
+    return total
+
+
+def same_values(expected, actual):
+    """Compare two product tables value by value, prices to the piastre"""
+    for column in expected.columns:
+        left = expected[column]
+        right = actual[column]
+        if column == 'Numeric Price':
+            if not np.array_equal(exact_prices(left).to_numpy(), exact_prices(right).to_numpy()):
+                return column
+        elif left.astype(object).tolist() != right.astype(object).tolist():
+            return column
+    return None
+
+
+def check_encoding(df, where):
+    wrong = [column for column in CATEGORICAL_COLUMNS
+             if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if wrong or df['Numeric Price'].dtype != 'float32':
+        sys.exit(f"{where} lost the encoding: {wrong or df['Numeric Price'].dtype}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    columns = build_rows(args.rows)
+    plain = pd.DataFrame({name: pd.Series(values, dtype=object) if name != 'Numeric Price' else values
+                          for name, values in columns.items()})
+    default = pd.DataFrame(columns)
+
+    start = time.perf_counter()
+    compact = app.product_encoding.encode(plain)
+    encode_time = time.perf_counter() - start
+    check_encoding(compact, "encode")
+
+    differing = same_values(plain, compact)
+    if differing:
+        sys.exit(f"compact table differs in {differing}")
+    if not app.create_price_table(plain).equals(app.create_price_table(compact)):
+        sys.exit("price table differs on the compact table")
+
+    workdir = tempfile.mkdtemp(prefix='bench_columnar_')
+    csv_path = os.path.join(workdir, 'products.csv')
+    compact.head(100000).to_csv(csv_path, index=False, encoding='utf-8-sig')
+    loaded = app.product_encoding.read_csv(csv_path)
+    check_encoding(loaded, "CSV round trip")
+    if same_values(compact.head(100000), loaded):
+        sys.exit(f"CSV round trip changed {same_values(compact.head(100000), loaded)}")
+    if parquet_available():
+        parquet_path = os.path.join(workdir, 'products.parquet')
+        compact.to_parquet(parquet_path, index=False)
+        check_encoding(pd.read_parquet(parquet_path), "parquet round trip")
+
+    sizes = {"object columns": frame_bytes(plain), "pandas default": frame_bytes(default),
+             "compact": frame_bytes(compact)}
+    print(f"rows:            {args.rows:,} (values, price table and round trips OK)")
+    for name, size in sizes.items():
+        ratio = sizes["object columns"] / size
+        print(f"{name + ':':<16} {size / 2**20:>8.1f} MiB" + (f"  ({ratio:.1f}x smaller)" if ratio > 1 else ""))
+    print(f"encode time:     {encode_time:.2f}s")
+    for column in compact.columns:
+        print(f"  {column:<20} {frame_bytes(plain[[column]]) / 2**20:>7.1f} -> "
+              f"{frame_bytes(compact[[column]]) / 2**20:>6.1f} MiB  {compact[column].dtype}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark the concurrent fetch engine against the old sequential loop.
+
+The stub server from stub_server.py, with no faults, stands in for amazon.eg
+and answers every request after a fixed latency. The sequential baseline reproduces the old scrape loop
+(random sleep + blocking requests.get per term); the engine run uses the same
+politeness budget but overlaps the terms.
+
+Usage:
+    python benchmarks/bench_fetch.py --terms 5 --latency 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fetcher import FetchEngine  # noqa: E402
+from stub_server import FaultConfig, start_stub_server  # noqa: E402
+
+
+def run_sequential(urls, min_delay, max_delay):
+    bodies = []
+    for url in urls:
+        time.sleep(random.uniform(min_delay, max_delay))
+        bodies.append(requests.get(url).content)
+    return bodies
+
+
+def run_engine(urls, max_per_host, rate, burst):
+    engine = FetchEngine(max_per_host=max_per_host, rate_per_host=rate, burst=burst)
+    try:
+        return [result.content for result in engine.fetch_all(urls)]
+    finally:
+        engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--terms', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.3, help="stub server latency in seconds")
+    parser.add_argument('--min-delay', type=float, default=1.0, help="old loop minimum sleep")
+    parser.add_argument('--max-delay', type=float, default=2.0, help="old loop maximum sleep")
+    parser.add_argument('--max-per-host', type=int, default=3)
+    parser.add_argument('--rate', type=float, default=1.5, help="engine requests per second per host")
+    parser.add_argument('--burst', type=int, default=3)
+    args = parser.parse_args()
+
+    server = start_stub_server(FaultConfig(latency=args.latency))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/s?k=water+term{i}" for i in range(args.terms)]
+
+    start = time.perf_counter()
+    sequential = run_sequential(urls, args.min_delay, args.max_delay)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = run_engine(urls, args.max_per_host, args.rate, args.burst)
+    concurrent_time = time.perf_counter() - start
+
+    server.shutdown()
+
+    # Results must come back in term order so dedup behaves the same
+    assert sequential == concurrent, "engine returned results out of order"
+
+    print(f"terms:       {args.terms}")
+    print(f"sequential:  {sequential_time:.2f} s")
+    print(f"engine:      {concurrent_time:.2f} s")
+    print(f"speedup:     {sequential_time / concurrent_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Exercise the adaptive fetch layer against the fault-injecting stub server.
+
+Three scenarios run against a local stub:
+  healthy   - no faults; the limiter should ramp up the request rate
+  faults    - random 503s, captcha pages, slow trickled bodies and dropped
+              connections; retries should recover nearly every page
+  throttled - the host answers 503 above a concurrency/rate limit; the
+              limiter should back off to what the host accepts
+
+Every page that comes back without an error must be the real page (never a
+captcha or an error page). The script fails otherwise, or when the success
+rate of a scenario falls under --min-success, and prints the engine metrics.
+
+Usage:
+    python benchmarks/bench_fetch_faults.py --urls 60
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fetcher import FetchEngine  # noqa: E402
+from stub_server import FaultConfig, page_body, start_stub_server  # noqa: E402
+
+SCENARIOS = {
+    "healthy": dict(),
+    "faults": dict(p503=0.1, captcha=0.05, slow=0.03, drop=0.02),
+    "throttled": dict(capacity=2, max_rate=8),
+}
+
+
+def run_scenario(name, faults, urls_count, max_per_host, rate, deadline):
+    config = FaultConfig(latency=0.05, slow_seconds=deadline * 3, seed=1, **faults)
+    server = start_stub_server(config)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    paths = [f"/s?k=water+{name}+{i}" for i in range(urls_count)]
+
+    engine = FetchEngine(max_per_host=max_per_host, rate_per_host=rate, burst=max_per_host, jitter=0,
+                         timeout=(1, deadline), deadline=deadline, retries=5, backoff=0.05,
+                         max_backoff=1.0)
+    try:
+        start = time.perf_counter()
+        results = engine.fetch_all([base + path for path in paths])
+        elapsed = time.perf_counter() - start
+        stats = engine.stats()
+    finally:
+        engine.close()
+        server.shutdown()
+
+    succeeded = 0
+    for path, result in zip(paths, results):
+        if result.error is not None:
+            continue
+        if result.status_code != 200 or result.content != page_body(path):
+            sys.exit(f"{name}: {path} returned a wrong page without an error: {result.content[:80]!r}")
+        succeeded += 1
+
+    host = next(iter(stats["hosts"].values()))
+    print(f"{name:>10}: {succeeded}/{len(paths)} ok in {elapsed:.2f}s "
+          f"({len(paths) / elapsed:.1f} pages/s), requests={stats['requests']} "
+          f"retries={stats['retries']} throttled={stats['throttled']} captchas={stats['captchas']} "
+          f"timeouts={stats['timeouts']} final concurrency={host['concurrency']} rate={host['rate']}/s")
+    print(f"{'':>10}  server saw {config.served}")
+    return succeeded / len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--urls', type=int, default=60)
+    parser.add_argument('--max-per-host', type=int, default=6)
+    parser.add_argument('--rate', type=float, default=10.0, help="starting requests per second per host")
+    parser.add_argument('--deadline', type=float, default=1.0, help="hard response deadline in seconds")
+    parser.add_argument('--min-success', type=float, default=0.95)
+    args = parser.parse_args()
+
+    failed = []
+    for name, faults in SCENARIOS.items():
+        success = run_scenario(name, faults, args.urls, args.max_per_host, args.rate, args.deadline)
+        if success < args.min_success:
+            failed.append(f"{name} ({success:.0%})")
+    if failed:
+        sys.exit(f"success rate under {args.min_success:.0%}: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
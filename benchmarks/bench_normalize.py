@@ -0,0 +1,141 @@
+"""
+Parity check and microbenchmark for the memoized normalize_text.
+
+The original normalize_text is kept here as the reference. The new one must
+return exactly what the reference returns for the same text after the
+Arabic folding. Three cases are timed:
+  legacy  - the original function
+  cold    - TextNormalizer with an empty memo (every call computes)
+  warm    - TextNormalizer over a scrape-like workload, where each title is
+            normalized several times (dedup, brand, size, brand filter) and
+            titles repeat between scrapes
+
+The folding must not change anything for Latin-script titles, so their
+brands, sizes and kept duplicates are also compared between the reference
+and the new normalizer.
+
+Usage:
+    python benchmarks/bench_normalize.py --titles 50000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app  # noqa: E402
+from bench_brand_matcher import build_corpus  # noqa: E402
+from brand_matcher import BrandMatcher  # noqa: E402
+from dedup import DedupIndex, drop_duplicate_products  # noqa: E402
+from size_extractor import SizeExtractor  # noqa: E402
+from text_normalizer import ARABIC_FOLDING, TextNormalizer  # noqa: E402
+
+ARABIC_SCRIPT = re.compile(r'[\u0600-\u06ff]')
+
+ARABIC_VARIANTS = ["أكوا", "إيلانو", "آبار", "مياة", "مياه معدنية ١٫٥ لتر", "كرتونة ١٢ زجاجة",
+                   "حياة", "مصطفى", "نـسـتـله", "۶ لتر"]
+
+
+def legacy_normalize_text(text):
+    """The original normalize_text, kept as the parity reference"""
+    text = ''.join(c for c in unicodedata.normalize('NFD', text)
+                   if unicodedata.category(c) != 'Mn')
+    text = text.lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def build_titles(size, seed=0):
+    """Brand matcher corpus with Arabic spelling variants and odd whitespace mixed in"""
+    rng = random.Random(seed)
+    titles = build_corpus(size, seed)
+    for i in range(0, size, 3):
+        titles[i] = f" {rng.choice(ARABIC_VARIANTS)}\t{titles[i]}  "
+    return titles
+
+
+def latin_pipeline(titles, normalize, fuzzy):
+    """Brands, sizes and the rows kept by dedup of these titles under a normalize function"""
+    brand_matcher = BrandMatcher(app.ARABIC_BRAND_MAPPINGS, app.BRAND_SEARCH_TERMS, app.WATER_BRANDS, normalize)
+    size_extractor = SizeExtractor(app.ARABIC_SIZE_MAPPINGS, normalize)
+    rng = random.Random(2)
+    # Each title again in another case and spacing, so dedup has duplicates to collapse
+    products = pd.DataFrame({'Product Title': titles + [f"  {t.upper()} " for t in titles]})
+    products['Numeric Price'] = [rng.choice([0.0, 50.0, 60.0, 75.5]) for _ in range(len(products))]
+    products = products.sample(frac=1, random_state=3).reset_index(drop=True)
+    kept = drop_duplicate_products(products, DedupIndex(normalize, fuzzy=fuzzy))
+    return ([brand_matcher.match(t) for t in titles], [size_extractor.extract(t) for t in titles],
+            list(zip(kept['Product Title'], kept['Numeric Price'])))
+
+
+def check_latin_titles(titles):
+    """Exit when brand, size or dedup results of Latin-script titles differ from the reference"""
+    latin = [t for t in titles if not ARABIC_SCRIPT.search(t)]
+    for fuzzy, sample in ((False, latin), (True, latin[:3000])):
+        expected = latin_pipeline(sample, legacy_normalize_text, fuzzy)
+        actual = latin_pipeline(sample, TextNormalizer(), fuzzy)
+        for name, before, after in zip(("brands", "sizes", "dedup"), expected, actual):
+            if before != after:
+                sys.exit(f"Latin-script {name} differ (fuzzy={fuzzy}): "
+                         f"{sum(b != a for b, a in zip(before, after))} rows, {len(before)} vs {len(after)}")
+    return len(latin)
+
+
+def calls_per_second(function, texts):
+    start = time.perf_counter()
+    for text in texts:
+        function(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--titles', type=int, default=50000)
+    parser.add_argument('--calls-per-title', type=int, default=4,
+                        help="normalize_text calls per title in one scrape")
+    parser.add_argument('--scrapes', type=int, default=3, help="scrapes over the same titles")
+    args = parser.parse_args()
+
+    titles = build_titles(args.titles)
+    normalizer = TextNormalizer()
+    folding = str.maketrans(ARABIC_FOLDING)
+
+    mismatches = [(t, legacy_normalize_text(t.translate(folding)), normalizer(t)) for t in titles
+                  if normalizer(t) != legacy_normalize_text(t.translate(folding))]
+    for title, expected, actual in mismatches[:10]:
+        print(f"MISMATCH {title!r}: legacy={expected!r} new={actual!r}")
+    if mismatches:
+        sys.exit(f"{len(mismatches)} of {len(titles)} titles differ")
+    latin = check_latin_titles(titles)
+    folded = normalizer("مياة أكوا ١٫٥ لتر") == normalizer("مياه اكوا 1.5 لتر")
+
+    legacy = calls_per_second(legacy_normalize_text, titles)
+    normalizer.clear()
+    cold = calls_per_second(normalizer, titles)
+
+    workload = titles * args.calls_per_title * args.scrapes
+    random.Random(1).shuffle(workload)
+    legacy_workload = calls_per_second(legacy_normalize_text, workload)
+    normalizer.clear()
+    warm = calls_per_second(normalizer, workload)
+    stats = normalizer.stats()
+
+    print(f"titles:         {len(titles)} (parity OK, Arabic variants folded: {folded})")
+    print(f"latin titles:   {latin} (same brands, sizes and duplicates)")
+    print(f"legacy:         {legacy:,.0f} calls/s")
+    print(f"cold memo:      {cold:,.0f} calls/s ({cold / legacy:.1f}x)")
+    print(f"workload:       {len(workload)} calls ({args.calls_per_title} per title, {args.scrapes} scrapes)")
+    print(f"legacy:         {legacy_workload:,.0f} calls/s")
+    print(f"warm memo:      {warm:,.0f} calls/s ({warm / legacy_workload:.1f}x), "
+          f"hit rate {stats['hits'] / (stats['hits'] + stats['misses']):.0%}")
+
+
+if __name__ == '__main__':
+    main()
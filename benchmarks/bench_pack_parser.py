@@ -0,0 +1,123 @@
+"""
+Parity check and microbenchmark for the pack parser and the per-litre tables.
+
+Known titles, in Arabic and English, with Arabic-Indic digits and × / x / *
+separators, must parse to the expected pack count and unit volume. A small
+products table checks that the per-litre price table and best offers rank a
+cheap 12 pack above a smaller pack with a lower shelf price, and that a
+cheaper duplicate brings its price per litre to the kept row. A batch of
+distinct titles is then parsed at once and must agree with parsing a sample
+of them one at a time; the batch rate is reported.
+
+Usage:
+    python benchmarks/bench_pack_parser.py --titles 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+from dedup import DedupIndex, drop_duplicate_products  # noqa: E402
+
+# (title, pack count, unit litres or None)
+CASES = [
+    ("كرتونة ماء بيور لايف من نستله، 12 زجاجة × 1.5 لتر", 12, 1.5),
+    ("كرتونة زجاجات مياه نيست بيور لايف، 20 زجاجة × 0.330 لتر، من نستله", 20, 0.33),
+    ("زجاجة مياه من ايلانو، 12 قطعة - 1.50 لتر", 12, 1.5),
+    ("زجاجة ماء من ايلانو 600 ملليلتر 12 قطعة", 12, 0.6),
+    ("ايزيس 20زجاجة مياه 600 ملي - كرتونه", 20, 0.6),
+    ("زجاجة مياه بيور لايف من نستله ، 2 × 6 لتر", 2, 6.0),
+    ("كرتونه مياه فلو ٦٠٠ مل ١٢ قطعه", 12, 0.6),
+    ("كرتونة فلو مياه قلوية ٣٣٠مل 16قطعة", 16, 0.33),
+    ("رابيدو ماء مقطر كرتونة 12 عبوة * 1 لتر", 12, 1.0),
+    ("ماء معدني طبيعي نقي من ايفيان، 6 قطع× 500 مل", 6, 0.5),
+    ("مياه معدنية ٢٤ × ٠٫٥ لتر", 24, 0.5),
+    ("كرتونة مياه بيور لايف من نستله، مجموعة من 20 زجاجة", 20, None),
+    ("مياه بيور لايف من نستله، سعة (18.9 لتر)", 1, 18.9),
+    ("Nestle Pure Life Water 1.5L x 6", 6, 1.5),
+    ("Baraka Natural Water 6-Pack 1.5 Litre", 6, 1.5),
+    ("Aquafina Water, Pack of 12 x 330 ml", 12, 0.33),
+    ("Nestle Pure Life 5 Gallons", 1, 5 * 3.785),
+    ("Hayat Water Bottle", 1, None),
+]
+
+
+def check_cases():
+    titles = pd.Series([title for title, _, _ in CASES])
+    packs = app.pack_parser.parse(titles)
+    for (title, count, litres), parsed_count, parsed_litres in zip(
+            CASES, packs['Pack Count'], packs['Unit Litres']):
+        litres_ok = pd.isna(parsed_litres) if litres is None else abs(parsed_litres - litres) < 1e-9
+        if parsed_count != count or not litres_ok:
+            sys.exit(f"{title!r}: parsed {parsed_count} x {parsed_litres}, expected {count} x {litres}")
+
+
+def check_tables():
+    """A 12 x 1.5L pack at 90 EGP is better value than a 6 x 1.5L pack at 50 EGP"""
+    rows = pd.DataFrame({
+        'Product Title': ["Nestle Pure Life 12 x 1.5L", "Baraka 6 x 1.5L", "Baraka 20 زجاجة × 0.330 لتر"],
+        'Price': ["EGP 90.00", "EGP 50.00", "EGP 84.95"],
+    })
+    products = app.product_encoding.encode(app.product_enricher.enrich(rows))
+    if products['Size'].tolist() != ["1.5L", "1.5L", "0.33L"]:
+        sys.exit(f"pack sizes not recognised: {products['Size'].tolist()}")
+    shelf = app.find_best_offers(products)
+    per_litre = app.find_best_offers(products, per_litre=True)
+    table = app.create_price_table(products, per_litre=True)
+    if shelf.loc['1.5L', 'Brand'] != 'Baraka' or per_litre.loc['1.5L', 'Brand'] != 'Nestlé Pure Life':
+        sys.exit("per-litre best offers do not rank the 12 pack first")
+    if table.loc['1.5L', 'Nestlé Pure Life'] != 5.0 or table.loc['0.33L', 'Baraka'] != 12.87:
+        sys.exit(f"unexpected per-litre table:\n{table}")
+
+
+def check_dedup():
+    """A cheaper duplicate brings its price per litre and availability to the kept row"""
+    rows = pd.DataFrame({
+        'Product Title': ["Nestle Pure Life 12 x 1.5L", "Nestle Pure Life 12 x 1.5L"],
+        'Price': ["EGP 120.00", "EGP 60.00"],
+    })
+    products = drop_duplicate_products(app.product_enricher.enrich(rows), DedupIndex(app.normalize_text))
+    kept = products.iloc[0]
+    if len(products) != 1 or kept['Numeric Price'] != 60.0 or kept['Price per Litre'] != 3.33 or \
+            kept['Availability Status'] != "Available":
+        sys.exit(f"dedup kept a stale offer:\n{products}")
+
+
+def build_titles(size, seed=0):
+    """Case titles with a unique suffix, so every title is parsed"""
+    rng = random.Random(seed)
+    return [f"{rng.choice(CASES)[0]} #{i}" for i in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--titles', type=int, default=20000)
+    args = parser.parse_args()
+
+    check_cases()
+    check_tables()
+    check_dedup()
+    titles = build_titles(args.titles)
+
+    start = time.perf_counter()
+    batch = app.pack_parser.parse(pd.Series(titles))
+    batch_time = time.perf_counter() - start
+
+    sample = titles[:min(len(titles), 200)]
+    single = pd.concat([app.pack_parser.parse(pd.Series([title])) for title in sample], ignore_index=True)
+    if not single.equals(batch.head(len(sample)).reset_index(drop=True)):
+        sys.exit("batch and per-title parses differ")
+
+    print(f"{len(CASES)} known titles, per-litre tables, dedup and batch parity OK")
+    print(f"{len(titles):,} titles parsed in {batch_time * 1000:.0f}ms "
+          f"({len(titles) / batch_time:,.0f} titles/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare the search page parser backends: ms per page and peak memory.
+
+Pages are either saved amazon.eg search pages passed with --pages, or
+synthetic pages shaped like amazon.eg results (head scripts, navigation,
+sponsored blocks and N result cards). Each backend runs in its own process so
+the peak resident memory of one doesn't hide the other's. The script fails if
+the backends disagree on any card.
+
+Usage:
+    python benchmarks/bench_parsers.py --cards 48 --repeat 20
+    python benchmarks/bench_parsers.py --pages recorded/*.html
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from parsers import PARSERS  # noqa: E402
+
+TITLES = [
+    "كرتونة ماء بيور لايف من نستله، 12 زجاجة × 1.5 لتر",
+    "زجاجة مياه من ايلانو، 12 قطعة - 1.50 لتر",
+    "Baraka Natural Mineral Water 6L",
+    "Aquafina Water, 330 ml, pack of 24",
+    "مياه صافي 600 مل × 20",
+    "Nestlé Pure Life Water 5 Gallons",
+]
+
+
+def synthetic_page(cards, seed=0, titles=TITLES):
+    """Build an amazon.eg-like search results page with `cards` results"""
+    rng = random.Random(seed)
+    parts = ['<!DOCTYPE html><html lang="ar-AE"><head><meta charset="utf-8"><title>Amazon.eg</title>']
+    for i in range(20):
+        parts.append(f'<script>var config{i} = {{"a": "{"x" * 2000}"}};</script>')
+    parts.append('</head><body><div id="nav-belt">' + '<a href="/nav">nav</a>' * 200 + '</div>')
+    parts.append('<div class="s-main-slot s-result-list">')
+    for i in range(cards):
+        asin = f"B0{rng.randrange(10**8):08d}"
+        title = rng.choice(titles)
+        price = f"{rng.uniform(20, 400):.2f}"
+        link_class = rng.choice([
+            "a-link-normal s-no-outline",
+            "a-link-normal s-underline-text s-underline-link-text s-link-style a-text-normal",
+        ])
+        if i % 7 == 3:
+            parts.append('<div class="s-result-item s-widget" data-component-type="sp-sponsored-result">'
+                         '<span class="a-offscreen">1.00 جنيه</span></div>')
+        price_html = (f'<span class="a-price"><span class="a-offscreen">&rlm;{price} جنيه</span>'
+                      f'<span aria-hidden="true"><span class="a-price-whole">{price.split(".")[0]}</span>'
+                      f'</span></span>') if i % 11 else ''
+        parts.append(
+            f'<div data-asin="{asin}" data-component-type="s-search-result" '
+            f'class="sg-col-4-of-24 s-result-item s-asin sg-col-4-of-12">'
+            f'<div class="sg-col-inner"><div class="s-widget-container">'
+            f'<span class="a-declarative"><a class="{link_class}" href="/-/ar/dp/{asin}/ref=sr_1_{i}">'
+            f'<img class="s-image" src="https://m.media-amazon.com/images/I/{asin}.jpg"></a></span>'
+            f'<div class="a-section"><h2 class="a-size-mini a-spacing-none a-color-base">'
+            f'<a class="a-link-normal a-text-normal" href="/-/ar/dp/{asin}/ref=sr_1_{i}">'
+            f'<span class="a-size-base-plus a-color-base a-text-normal">{title}</span></a></h2></div>'
+            f'<div class="a-row a-size-small"><span aria-label="4.5 out of 5 stars">'
+            f'<i class="a-icon a-icon-star-small"></i></span></div>'
+            f'<div class="a-row">{price_html}</div>'
+            f'<div class="a-row a-size-base a-color-secondary"><span>التوصيل مجانًا</span></div>'
+            f'</div></div></div>'
+        )
+    parts.append('</div>' + '<div class="footer">' + '<a href="/f">footer</a>' * 300 + '</div></body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def measure(backend, pages, repeat, queue):
+    parser = PARSERS[backend]
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [parser.parse(page) for page in pages]
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        "ms_per_page": 1000 * elapsed / (repeat * len(pages)),
+        "peak_kb": peak_rss - baseline_rss,
+        "results": results,
+    })
+
+
+def run_isolated(backend, pages, repeat):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure, args=(backend, pages, repeat, queue))
+    process.start()
+    stats = queue.get()
+    process.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', nargs='*', help="saved search pages to parse")
+    parser.add_argument('--cards', type=int, default=48, help="cards per synthetic page")
+    parser.add_argument('--count', type=int, default=5, help="number of synthetic pages")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+    else:
+        pages = [synthetic_page(args.cards, seed) for seed in range(args.count)]
+
+    stats = {backend: run_isolated(backend, pages, args.repeat) for backend in sorted(PARSERS)}
+
+    if len(stats) > 1:
+        reference = stats['soup']['results']
+        for backend, result in stats.items():
+            if result['results'] != reference:
+                sys.exit(f"{backend} backend disagrees with the soup backend")
+
+    cards = sum(len(page_cards) for page_cards in stats['soup']['results'])
+    print(f"pages: {len(pages)}, cards: {cards} (backends agree)")
+    for backend, result in stats.items():
+        print(f"{backend:>5}: {result['ms_per_page']:8.2f} ms/page, peak +{result['peak_kb'] / 1024:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
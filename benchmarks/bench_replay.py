@@ -0,0 +1,208 @@
+"""
+Offline benchmark of the scrape pipeline on recorded search pages.
+
+record: fetch live search pages for a set of terms and save them:
+    python benchmarks/bench_replay.py record --terms water "مياه" --pages 2 --out recordings/water
+
+run: replay a recording through every stage (parse, enrich, dedup, price
+table, best offers, CSV write) and through scrape_pipeline end to end, with
+no network. The recording is also scaled synthetically to the --cards sizes.
+Each stage reports cards per second and its peak traced memory. With
+--baseline the run fails when a stage is slower, or peaks higher, than the
+stored numbers by more than --tolerance; --update-baseline stores this run.
+    python benchmarks/bench_replay.py run --recording recordings/water --cards 1000 5000
+    python benchmarks/bench_replay.py run --baseline benchmarks/replay_baseline.json
+
+Without --recording, a synthetic recording of generated pages stands in.
+Everything runs in a temporary directory, so the app's data files are untouched.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+import replay  # noqa: E402
+
+STAGES = ["parse", "enrich", "dedup", "price_table", "best_offers", "csv_write", "pipeline"]
+
+
+def load_app(workdir):
+    """Import the app with its data files (caches, history) inside workdir"""
+    os.chdir(workdir)
+    os.makedirs(os.path.join('static', 'data'), exist_ok=True)
+    sys.path.insert(0, replay.ROOT)
+    import app
+    return app
+
+
+def stage_functions(app, recording, workdir):
+    """The pipeline stages as zero-argument callables chained through `state`"""
+    import pandas as pd
+    from dedup import DedupIndex, drop_duplicate_products
+    from history import PriceHistoryStore
+
+    bodies = recording.bodies()
+    state = {}
+
+    def parse():
+        state["rows"] = [row for content in bodies for row in app.amazon_site.read_rows(content, 10 ** 9)]
+
+    def enrich():
+        state["df"] = app.product_enricher.enrich(pd.DataFrame(state["rows"], columns=app.SEARCH_ROW_COLUMNS))
+
+    def dedup():
+        index = DedupIndex(app.normalize_text, fuzzy=app.DEDUP_FUZZY, threshold=app.DEDUP_FUZZY_THRESHOLD)
+        state["products"] = drop_duplicate_products(state["df"], index)
+
+    def price_table():
+        state["price_table"] = app.create_price_table(state["products"])
+
+    def best_offers():
+        app.find_best_offers(state["products"])
+
+    def csv_write():
+        state["products"].to_csv(os.path.join(workdir, 'products.csv'), index=False, encoding='utf-8-sig')
+        state["price_table"].to_csv(os.path.join(workdir, 'price_table.csv'), encoding='utf-8-sig')
+
+    def pipeline():
+        # A fresh history per run so every run appends the same rows
+        history_path = os.path.join(workdir, f"history_{time.perf_counter_ns()}.sqlite")
+        app.history_store = PriceHistoryStore(history_path, app.normalize_text)
+        app.fetch_engine = replay.ReplayFetcher(recording)
+        results = [app.scrape_pipeline(term, None, max_products=10 ** 9, max_pages=pages)
+                   for term, pages in recording.terms.items()]
+        state["pipeline_products"] = sum(result.get("products", 0) for result in results)
+
+    return state, [("parse", parse), ("enrich", enrich), ("dedup", dedup), ("price_table", price_table),
+                   ("best_offers", best_offers), ("csv_write", csv_write), ("pipeline", pipeline)]
+
+
+def measure(app, recording, workdir, repeat):
+    """Best-of-repeat seconds per stage, then one traced pass for peak memory"""
+    state, stages = stage_functions(app, recording, workdir)
+    seconds = {name: float('inf') for name, _ in stages}
+    for _ in range(repeat):
+        for name, function in stages:
+            start = time.perf_counter()
+            function()
+            seconds[name] = min(seconds[name], time.perf_counter() - start)
+
+    peaks = {}
+    tracemalloc.start()
+    for name, function in stages:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        function()
+        peaks[name] = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    cards = len(state["rows"])
+    return {
+        name: {"cards_per_second": round(cards / seconds[name], 1) if seconds[name] else None,
+               "seconds": round(seconds[name], 5),
+               "peak_kb": round(peaks[name] / 1024, 1)}
+        for name, _ in stages
+    }, cards, state
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, as readable lines"""
+    regressions = []
+    for scale, stages in results.items():
+        for stage, numbers in stages.items():
+            reference = baseline.get(scale, {}).get(stage)
+            if not reference:
+                continue
+            if numbers["cards_per_second"] < reference["cards_per_second"] * (1 - tolerance):
+                regressions.append(f"{scale}/{stage}: {numbers['cards_per_second']:,.0f} cards/s, "
+                                   f"baseline {reference['cards_per_second']:,.0f}")
+            if numbers["peak_kb"] > max(reference["peak_kb"] * (1 + tolerance), reference["peak_kb"] + 256):
+                regressions.append(f"{scale}/{stage}: peak {numbers['peak_kb']:,.0f} KB, "
+                                   f"baseline {reference['peak_kb']:,.0f} KB")
+    return regressions
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='replay_bench_')
+    recording_dir = os.path.abspath(args.recording) if args.recording else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    app = load_app(workdir)
+
+    if recording_dir:
+        recording = replay.Recording.load(recording_dir)
+        titles = replay.recorded_titles(recording)
+        scales = {"recorded": recording}
+    else:
+        titles = replay.TITLES
+        scales = {}
+    term = next(iter(scales["recorded"].terms)) if scales else "water"
+    for cards in args.cards:
+        scales[f"{cards}_cards"] = replay.synthetic_recording(app.search_page_url, term, cards, titles)
+
+    results = {}
+    print(f"{'scale':>14} {'stage':>12} {'cards/s':>12} {'seconds':>9} {'peak KB':>10}")
+    for scale, recording in scales.items():
+        stages, cards, state = measure(app, recording, workdir, args.repeat)
+        results[scale] = stages
+        for stage, numbers in stages.items():
+            print(f"{scale:>14} {stage:>12} {numbers['cards_per_second']:>12,.0f} "
+                  f"{numbers['seconds']:>9.4f} {numbers['peak_kb']:>10,.1f}")
+        print(f"{scale:>14} {cards} cards, {len(state['products'])} after dedup, "
+              f"{state['pipeline_products']} from the pipeline")
+        if cards and not state['pipeline_products']:
+            print(f"{scale:>14} warning: the pipeline found nothing; were the pages recorded "
+                  f"with a different search URL format?")
+
+    if baseline_path and args.update_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"baseline written to {baseline_path}")
+    elif baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            sys.exit("regressions against the baseline:\n  " + "\n  ".join(regressions))
+        print(f"no regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+
+def record_pages(args):
+    out = os.path.abspath(args.out)
+    app = load_app(tempfile.mkdtemp(prefix='replay_record_'))
+    recording = replay.record(app.fetch_engine, app.search_page_url, args.terms, args.pages)
+    recording.save(out)
+    print(f"recorded {len(recording.pages)} pages for {len(recording.terms)} terms into {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="save live search pages")
+    record_parser.add_argument('--terms', nargs='+', default=['water'])
+    record_parser.add_argument('--pages', type=int, default=1)
+    record_parser.add_argument('--out', required=True)
+
+    run_parser = commands.add_parser('run', help="replay pages through the pipeline")
+    run_parser.add_argument('--recording', help="directory written by record")
+    run_parser.add_argument('--cards', type=int, nargs='*', default=[1000, 5000])
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--baseline', help="JSON file of stored results to compare against")
+    run_parser.add_argument('--update-baseline', action='store_true')
+    run_parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="allowed slowdown or memory growth, as a fraction")
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        record_pages(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Parity check and microbenchmark for the compiled size extractor.
+
+The legacy per-pattern loop is kept here as the reference implementation.
+A corpus is built from the titles in static/data/products.csv plus synthetic
+titles mixing English/Arabic sizes, packs, ml/gallon fallbacks and noise.
+The script fails if any label differs, then reports titles per second.
+
+Usage:
+    python benchmarks/bench_size_extractor.py --titles 50000
+"""
+import argparse
+import csv
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+
+
+def legacy_normalize_text(text):
+    """The original normalize_text, without the memo or the Arabic folding"""
+    text = ''.join(c for c in unicodedata.normalize('NFD', text)
+                   if unicodedata.category(c) != 'Mn')
+    text = text.lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def legacy_extract_size_from_title(title):
+    """The original extract_size_from_title, kept as the parity reference"""
+    normalized_title = legacy_normalize_text(title)
+
+    for arabic_size, english_size in app.ARABIC_SIZE_MAPPINGS.items():
+        if legacy_normalize_text(arabic_size) in normalized_title:
+            return english_size
+
+    size_patterns = [
+        (r'(?:^|\s)0\.33\s*l(?:iter)?(?:\s|$)', "0.33L"),
+        (r'(?:^|\s)330\s*ml(?:\s|$)', "0.33L"),
+        (r'(?:^|\s)0\.6\s*l(?:iter)?(?:\s|$)', "0.6L"),
+        (r'(?:^|\s)600\s*ml(?:\s|$)', "0.6L"),
+        (r'(?:^|\s)1\s*l(?:iter)?(?:\s|$)', "1L"),
+        (r'(?:^|\s)1000\s*ml(?:\s|$)', "1L"),
+        (r'(?:^|\s)1\.5\s*l(?:iter)?(?:\s|$)', "1.5L"),
+        (r'(?:^|\s)1500\s*ml(?:\s|$)', "1.5L"),
+        (r'(?:^|\s)6\s*l(?:iter)?(?:\s|$)', "6L"),
+        (r'(?:^|\s)6000\s*ml(?:\s|$)', "6L"),
+        (r'(?:^|\s)0\.24\s*l(?:iter)?(?:\s|sparkling)', "0.24L Sparkling"),
+        (r'(?:^|\s)240\s*ml(?:\s|sparkling)', "0.24L Sparkling"),
+        (r'(?:^|\s)5\s*gallon(?:s)?(?:\s|$)', "5 Gallons"),
+        (r'(?:^|\s)1\s*-\s*liter(?:\s|$)', "1L"),
+        (r'(?:^|\s)1\.5\s*-\s*liter(?:\s|$)', "1.5L"),
+        (r'(?:^|\s)6\s*-\s*liter(?:\s|$)', "6L"),
+        (r'(?:^|\s)0[,.]33\s*l(?:iter)?(?:\s|$)', "0.33L"),
+        (r'(?:^|\s)0[,.]6\s*l(?:iter)?(?:\s|$)', "0.6L"),
+        (r'(?:^|\s)1[,.]5\s*l(?:iter)?(?:\s|$)', "1.5L"),
+        (r'(?:^|\s)0\.33\s*لتر(?:\s|$)', "0.33L"),
+        (r'(?:^|\s)0\.6\s*لتر(?:\s|$)', "0.6L"),
+        (r'(?:^|\s)1\s*لتر(?:\s|$)', "1L"),
+        (r'(?:^|\s)1\.5\s*لتر(?:\s|$)', "1.5L"),
+        (r'(?:^|\s)6\s*لتر(?:\s|$)', "6L"),
+        (r'(?:^|\s)5\s*جالون(?:\s|$)', "5 Gallons"),
+        (r'(?:^|\s)pack\s*of\s*6\s*[xX]\s*1\.5\s*l(?:iter)?(?:\s|$)', "1.5L"),
+        (r'(?:^|\s)pack\s*of\s*12\s*[xX]\s*0\.33\s*l(?:iter)?(?:\s|$)', "0.33L"),
+        (r'(?:^|\s)pack\s*of\s*6\s*[xX]\s*1\s*l(?:iter)?(?:\s|$)', "1L"),
+        (r'(?:^|\s)(\d+(?:\.\d+)?)\s*l(?:iter)?(?:\s|$)', lambda m: f"{m.group(1)}L"),
+        (r'(?:^|\s)(\d+)\s*ml(?:\s|$)', lambda m: f"{float(m.group(1))/1000:.2f}L".replace(".00", "")),
+        (r'(?:^|\s)(\d+)\s*gallon(?:s)?(?:\s|$)', lambda m: f"{m.group(1)} Gallons"),
+    ]
+
+    for pattern, size in size_patterns:
+        match = re.search(pattern, normalized_title)
+        if match:
+            if callable(size):
+                return size(match)
+            else:
+                return size
+
+    if "sparkling" in normalized_title or "فوار" in normalized_title:
+        return "0.24L Sparkling"
+
+    return "Unknown Size"
+
+
+SIZE_TOKENS = [
+    "0.33L", "0.33 L", "0,33 liter", "330ml", "330 ml", "0.6L", "600 ml", "1L", "1 liter",
+    "1000ml", "1.5L", "1,5 l", "1.5 - liter", "1 - liter", "6 - liter", "1500 ml", "6L",
+    "6000 ml", "0.24L sparkling", "240ml sparkling", "5 gallons", "5 gallon", "19 L",
+    "2.25L", "750 ml", "250ml", "3 gallons", "0.330 لتر", "1.5 لتر", "1.50 لتر", "6 لتر",
+    "1 لتر", "0.6 لتر", "5 جالون", "0.24 لتر فوار", "pack of 6 x 1.5 l", "pack of 12 X 0.33 liter",
+    "pack of 6 x 1 liter", "12 زجاجة × 1.5 لتر", "20 زجاجة × 0.330 لتر", "Sparkling", "فوار",
+    "500ML", "", "",
+]
+NOISE = [
+    "Nestlé Pure Life", "Baraka", "Aquafina", "مياه", "كرتونة", "زجاجة", "water", "Natural",
+    "Mineral", "من نستله", "pack", "bottles", "12", "x", "-", "،", "(", ")", "24 pcs",
+]
+
+
+def build_corpus(size, seed=0):
+    rng = random.Random(seed)
+    titles = []
+    csv_path = os.path.join(ROOT, 'static', 'data', 'products.csv')
+    if os.path.exists(csv_path):
+        with open(csv_path, encoding='utf-8-sig') as f:
+            titles.extend(row['Product Title'] for row in csv.DictReader(f))
+    while len(titles) < size:
+        words = rng.sample(NOISE, rng.randint(1, 5))
+        for _ in range(rng.randint(1, 2)):
+            words.insert(rng.randint(0, len(words)), rng.choice(SIZE_TOKENS))
+        titles.append(' '.join(words))
+    return titles[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--titles', type=int, default=50000)
+    args = parser.parse_args()
+
+    titles = build_corpus(args.titles)
+
+    start = time.perf_counter()
+    expected = [legacy_extract_size_from_title(t) for t in titles]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [app.size_extractor.extract(t) for t in titles]
+    compiled_time = time.perf_counter() - start
+
+    mismatches = [(t, e, a) for t, e, a in zip(titles, expected, actual) if e != a]
+    for title, e, a in mismatches[:10]:
+        print(f"MISMATCH {title!r}: legacy={e!r} compiled={a!r}")
+    if mismatches:
+        sys.exit(f"{len(mismatches)} of {len(titles)} titles differ")
+
+    print(f"titles:    {len(titles)} (parity OK)")
+    print(f"legacy:    {len(titles) / legacy_time:,.0f} titles/s")
+    print(f"compiled:  {len(titles) / compiled_time:,.0f} titles/s")
+    print(f"speedup:   {legacy_time / compiled_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Date-range checks for the price history store.
+
+A few observations around midnight are appended to a fresh store. Loading
+and streaming with a date-only end must include every observation of that
+day, and an end with a time must stop at that time. A Parquet export of a
+range without observations must still be a readable file with the history
+columns. Rows keyed by a title normalized before the Arabic spelling folding
+must move to the current key with `rekey_titles`, in the history and the
+catalogue.
+
+Usage:
+    python benchmarks/check_history.py
+"""
+import io
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from catalogue import ProductCatalogue  # noqa: E402
+from exports import parquet_available, stream_export  # noqa: E402
+from history import PriceHistoryStore  # noqa: E402
+from text_normalizer import TextNormalizer  # noqa: E402
+
+# (observed at, price) of one product
+OBSERVATIONS = [
+    ("2026-10-17T23:59:59", 90.0),
+    ("2026-10-18T00:00:00", 91.0),
+    ("2026-10-18T12:30:00", 92.0),
+    ("2026-10-18T23:59:59", 93.0),
+    ("2026-10-19T00:00:00", 94.0),
+]
+
+# (start, end) -> prices expected
+RANGES = {
+    (None, "2026-10-18"): [90.0, 91.0, 92.0, 93.0],
+    ("2026-10-18", "2026-10-18"): [91.0, 92.0, 93.0],
+    ("2026-10-18", "2026-10-18T12:30:00"): [91.0, 92.0],
+    ("2026-10-19", None): [94.0],
+}
+
+
+def build_store(path):
+    store = PriceHistoryStore(path, TextNormalizer())
+    for observed_at, price in OBSERVATIONS:
+        store.append_snapshot(pd.DataFrame({
+            'Product Title': ["Nestle Pure Life 1.5L"], 'Price': [f"EGP {price:.2f}"],
+            'Brand': ["Nestlé Pure Life"], 'Size': ["1.5L"], 'Numeric Price': [price],
+            'Availability Status': ["Available"], 'ASIN': ["B0HISTORY1"],
+        }), observed_at=observed_at)
+    return store
+
+
+def check_ranges(store):
+    for (start, end), expected in RANGES.items():
+        loaded = store.load(start=start, end=end)['numeric_price'].tolist()
+        streamed = [price for chunk in store.iter_chunks(start=start, end=end, chunk_rows=2)
+                    for price in chunk['Numeric Price']]
+        if loaded != expected or streamed != expected:
+            sys.exit(f"start={start} end={end}: loaded {loaded}, streamed {streamed}, expected {expected}")
+
+
+def check_empty_parquet(store):
+    chunks = store.iter_chunks(start="2001-01-01", end="2001-01-02")
+    data = b''.join(stream_export(chunks, 'parquet', list(store.EXPORT_COLUMNS.values()), store.empty_chunk()))
+    empty = pd.read_parquet(io.BytesIO(data))
+    if len(empty) or empty.columns.tolist() != list(store.EXPORT_COLUMNS.values()):
+        sys.exit(f"unexpected empty Parquet export: {empty.columns.tolist()}, {len(empty)} rows")
+
+
+def legacy_normalize(text):
+    """Title normalization before the Arabic spelling folding"""
+    return ' '.join(text.lower().split())
+
+
+def check_rekey(path):
+    arabic = {
+        'Product Title': ["مياة نستله بيور لايف ١٫٥ لتر"], 'Price': ["EGP 12.00"], 'Brand': ["Nestlé Pure Life"],
+        'Size': ["1.5L"], 'Numeric Price': [12.0], 'Availability Status': ["Available"], 'ASIN': [None],
+    }
+    legacy = PriceHistoryStore(path, legacy_normalize)
+    legacy.append_snapshot(pd.DataFrame(arabic), observed_at="2026-10-01T09:00:00")
+    ProductCatalogue(path, legacy.product_key).upsert(pd.DataFrame(arabic), observed_at="2026-10-01T09:00:00")
+
+    store = PriceHistoryStore(path, TextNormalizer())
+    catalogue = ProductCatalogue(path, store.product_key)
+    later = dict(arabic, **{'Price': ["EGP 13.00"], 'Numeric Price': [13.0]})
+    store.append_snapshot(pd.DataFrame(later), observed_at="2026-10-02T09:00:00")
+    catalogue.upsert(pd.DataFrame(later), observed_at="2026-10-02T09:00:00")
+
+    moved = store.rekey_titles(), catalogue.rekey_titles()
+    key = store.product_key(arabic['Product Title'][0])
+    keys = store.load()['product_key'].unique().tolist()
+    prices = catalogue.price_series(key)['Numeric Price'].tolist()
+    if moved != (1, 1) or keys != [key] or len(catalogue) != 1 or prices != [12.0, 13.0]:
+        sys.exit(f"rekey moved {moved}, history keys {keys}, {len(catalogue)} catalogue rows, prices {prices}")
+    if store.rekey_titles() or catalogue.rekey_titles():
+        sys.exit("a second rekey moved keys again")
+
+
+def main():
+    store = build_store(os.path.join(tempfile.mkdtemp(prefix='check_history_'), 'history.sqlite'))
+    check_ranges(store)
+    print(f"{len(RANGES)} date ranges OK, date-only ends include the whole day")
+    if parquet_available():
+        check_empty_parquet(store)
+        print("empty range exports a valid Parquet file")
+    check_rekey(os.path.join(tempfile.mkdtemp(prefix='check_rekey_'), 'history.sqlite'))
+    print("pre-folding title keys move to the current keys")
+
+
+if __name__ == '__main__':
+    main()
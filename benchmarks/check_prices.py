@@ -0,0 +1,83 @@
+"""
+Parity check for the batch price parser.
+
+The original per-row parse (a regex match and float()) is kept here as the
+reference implementation. Python's \\d and float() accept Arabic-Indic
+digits, so prices like "١٢.٥٠ جنيه" parsed before the batch stage. The
+corpus mixes ASCII and Arabic-Indic digits, thousands separators, currency
+text and missing prices. The batch parser must agree with the reference on
+every price. Prices written with the Arabic decimal or thousands separator
+(٫ ٬) are compared with the reference on the folded text, because the
+original regex stopped at those separators and read "١٢٫٥٠" as 12.
+
+Usage:
+    python benchmarks/check_prices.py --prices 100000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from enrichment import PRICE_FOLDING, parse_numeric_prices  # noqa: E402
+
+ARABIC_DIGITS = str.maketrans("0123456789", "٠١٢٣٤٥٦٧٨٩")
+PERSIAN_DIGITS = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
+
+
+def legacy_numeric_price(price):
+    """The original per-row numeric price, kept as the parity reference (NaN for no price)"""
+    if price == "Price not found":
+        return float('nan')
+    price_match = re.search(r'([\d,.]+)', price)
+    if not price_match:
+        return float('nan')
+    try:
+        return float(price_match.group(1).replace(',', ''))
+    except ValueError:
+        return float('nan')
+
+
+def build_prices(size, seed=0):
+    rng = random.Random(seed)
+    templates = ["EGP {}", "{} جنيه", "‏{} ج.م", "{}", "السعر {} جنيه"]
+    prices = []
+    for _ in range(size):
+        value = rng.choice([f"{rng.uniform(3, 400):.2f}", f"{rng.randint(1000, 9999):,}.00", str(rng.randint(5, 99))])
+        digits = rng.random()
+        if digits < 0.3:
+            value = value.translate(ARABIC_DIGITS)
+        elif digits < 0.4:
+            value = value.translate(PERSIAN_DIGITS)
+        if digits < 0.4 and rng.random() < 0.5:
+            value = value.replace('.', '٫').replace(',', '٬')
+        prices.append(rng.choice(templates).format(value))
+    prices += ["Price not found", "EGP", "١٢٫٥٠ ج.م", "١٬٢٩٩٫٠٠ جنيه", "۴۵.۷۵", "٨٩.٩٥ جنيه"]
+    return prices
+
+
+def check_parity(prices):
+    parsed = parse_numeric_prices(pd.Series(prices)).tolist()
+    for price, value in zip(prices, parsed):
+        reference = price.translate(PRICE_FOLDING) if ('٫' in price or '٬' in price) else price
+        expected = legacy_numeric_price(reference)
+        if not (value == expected or (pd.isna(value) and pd.isna(expected))):
+            sys.exit(f"{price!r}: parsed {value}, reference {expected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--prices', type=int, default=100000)
+    args = parser.parse_args()
+
+    prices = build_prices(args.prices)
+    check_parity(prices)
+    print(f"{len(prices):,} prices, parity with the per-row parser OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Checks for the price trends API.
+
+/api/trends must answer with empty series, not an error, when there are no
+rollups: a fresh database, or a brand or date range that matches nothing.
+The daily rollups written while snapshots are appended must equal the ones
+rebuild_rollups computes from the stored observations.
+
+Usage:
+    python benchmarks/check_trends.py
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+from history import PriceHistoryStore  # noqa: E402
+from text_normalizer import TextNormalizer  # noqa: E402
+
+# Queries that match no rollups once the store holds one snapshot
+EMPTY_QUERIES = ['/api/trends?brand=NoSuchBrand', '/api/trends?start=2001-01-01&end=2001-01-31']
+
+# (title, brand, size, price, availability, ASIN) per product, changed from one snapshot to the next
+PRODUCTS = [
+    ("Nestle Pure Life 1.5L", "Nestlé Pure Life", "1.5L", 12.0, "Available", "B0ROLLUP01"),
+    ("Nestle Pure Life 600ml", "Nestlé Pure Life", "600ml", 6.5, "Available", "B0ROLLUP02"),
+    ("Baraka 1.5L", "Baraka", "1.5L", 11.0, "Available", "B0ROLLUP03"),
+    ("Aquafina 1.5L", "Aquafina", "1.5L", 13.0, "Out of Stock", "B0ROLLUP04"),
+    ("Siwa Water 1.5L", "Siwa", "1.5L", 0.0, "Available", ""),
+    ("Water pack", "Other", "Unknown Size", 40.0, "Available", "B0ROLLUP05"),
+]
+SNAPSHOTS = [
+    ("2026-10-14T09:00:00", {}),
+    ("2026-10-14T18:00:00", {0: (10.0, "Available")}),
+    # A snapshot changing nothing, then a day without snapshots
+    ("2026-10-15T09:00:00", {}),
+    ("2026-10-17T09:00:00", {2: (9.5, "Out of Stock"), 4: (14.0, "Available")}),
+    # Baraka 1.5L goes back up the same day and Aquafina moves to 600ml
+    ("2026-10-17T20:00:00", {2: (12.5, "Available"), 3: (6.0, "Available", "600ml")}),
+    ("2026-10-18T09:00:00", {1: (7.0, "Out of Stock")}),
+]
+
+
+def build_store(path):
+    return PriceHistoryStore(path, TextNormalizer())
+
+
+def check_empty_trends(store):
+    app.history_store = store
+    client = app.app.test_client()
+    queries = ['/api/trends']
+    responses = [client.get('/api/trends')]
+    store.append_snapshot(pd.DataFrame({
+        'Product Title': ["Nestle Pure Life 1.5L"], 'Price': ["EGP 12.00"], 'Brand': ["Nestlé Pure Life"],
+        'Size': ["1.5L"], 'Numeric Price': [12.0], 'Availability Status': ["Available"], 'ASIN': ["B0TRENDS01"],
+    }), observed_at="2026-10-18T09:00:00")
+    queries += EMPTY_QUERIES
+    responses += [client.get(query) for query in EMPTY_QUERIES]
+    for query, response in zip(queries, responses):
+        if response.status_code != 200 or response.json['series'] or response.json['events']:
+            sys.exit(f"{query}: status {response.status_code}, {response.get_data(as_text=True)[:200]}")
+    return len(queries)
+
+
+def snapshot_frame(products):
+    return pd.DataFrame(products, columns=['Product Title', 'Brand', 'Size', 'Numeric Price',
+                                           'Availability Status', 'ASIN']).assign(
+        Price=lambda df: 'EGP ' + df['Numeric Price'].map('{:.2f}'.format))
+
+
+def check_rebuild(store):
+    """Append SNAPSHOTS, then compare the rollups before and after a rebuild"""
+    products = [list(product) for product in PRODUCTS]
+    for observed_at, changes in SNAPSHOTS:
+        for position, change in changes.items():
+            products[position][3:5] = change[:2]
+            if len(change) > 2:
+                products[position][2] = change[2]
+        store.append_snapshot(snapshot_frame(products), observed_at=observed_at)
+    appended = store.load_rollups()
+    days = store.rebuild_rollups()
+    rebuilt = store.load_rollups()
+    try:
+        pd.testing.assert_frame_equal(appended, rebuilt)
+    except AssertionError as exc:
+        sys.exit(f"appended rollups differ from the rebuilt ones: {exc}\n{appended}\n{rebuilt}")
+    return days, len(rebuilt)
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='check_trends_')
+    queries = check_empty_trends(build_store(os.path.join(directory, 'empty.sqlite')))
+    print(f"{queries} queries without rollups return empty series")
+    days, rows = check_rebuild(build_store(os.path.join(directory, 'rebuild.sqlite')))
+    print(f"appended rollups match the rebuild: {rows} rows over {days} days")
+    days, rows = check_rebuild(PriceHistoryStore(os.path.join(directory, 'encoded.sqlite'), TextNormalizer(),
+                                                 encoding=app.product_encoding))
+    print(f"appended rollups match the rebuild with the compact encoding: {rows} rows over {days} days")
+
+
+if __name__ == '__main__':
+    main()
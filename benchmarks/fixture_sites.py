@@ -0,0 +1,191 @@
+"""
+Local fixture marketplaces for the multi-site scrape.
+
+Two servers stand in for real sites: an amazon.eg look-alike and a small
+e-grocer whose prices use Arabic-Indic digits. Both list the same products
+at different prices over two result pages and count how many requests they
+handle at once. The script runs scrape_pipeline against both, each site
+under its own fetch limits, and checks that:
+  - every row carries its Source and each site kept its own offers
+  - every price table cell is the lowest price across the two sites
+  - neither server saw more parallel requests than its site allows
+
+Usage:
+    python benchmarks/fixture_sites.py
+    python benchmarks/fixture_sites.py --serve   (keep the servers running)
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (product id, title, amazon.eg price, grocer price); two products per result page
+PRODUCTS = [
+    ("B0FIXTURE1", "Nestle Pure Life Water 1.5L", 89.00, 84.50),
+    ("B0FIXTURE2", "Baraka Natural Water 6L", 67.00, 71.00),
+    ("B0FIXTURE3", "Aquafina Water 600ml", 45.25, 42.00),
+    ("B0FIXTURE4", "Nestle Pure Life Water 330ml", 30.00, 33.75),
+]
+PAGE_SIZE = 2
+ARABIC_DIGITS = str.maketrans("0123456789.", "٠١٢٣٤٥٦٧٨٩٫")
+
+
+def page_products(query):
+    """Products on the requested result page; empty past the last page"""
+    page = int(query.get("page", ["1"])[0])
+    return PRODUCTS[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+
+def amazon_page(query):
+    cards = []
+    for asin, title, price, _ in page_products(query):
+        cards.append(
+            f'<div class="s-result-item" data-component-type="s-search-result" data-asin="{asin}">'
+            f'<h2><a class="a-link-normal s-no-outline" href="/dp/{asin}/ref=sr_1"><span>{title}</span></a></h2>'
+            f'<span class="a-price"><span class="a-offscreen">EGP {price:.2f}</span></span></div>')
+    return f'<html><body>{"".join(cards)}</body></html>'
+
+
+def grocer_page(query):
+    cards = []
+    for asin, title, _, price in page_products(query):
+        product_id = asin.replace("B0FIXTURE", "G")
+        cards.append(
+            f'<li class="product" data-id="{product_id}"><a href="/p/{product_id}">'
+            f'<span class="name">{title}</span></a>'
+            f'<span class="price">{f"{price:.2f}".translate(ARABIC_DIGITS)} ج.م</span></li>')
+    return f'<html><body><ul class="results">{"".join(cards)}</ul></body></html>'
+
+
+class FixtureSite:
+    """
+    A local server answering search requests with render(query), tracking
+    the largest number of requests it handled at once
+    """
+    def __init__(self, render, latency=0.05):
+        self.render = render
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.server = None
+
+    def start(self, port=0):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with site.lock:
+                    site.in_flight += 1
+                    site.requests += 1
+                    site.max_in_flight = max(site.max_in_flight, site.in_flight)
+                try:
+                    time.sleep(site.latency)
+                    body = site.render(parse_qs(urlsplit(self.path).query)).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with site.lock:
+                        site.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+
+def run_check(pages):
+    os.chdir(tempfile.mkdtemp(prefix='fixture_sites_'))
+    os.makedirs(os.path.join('static', 'data'), exist_ok=True)
+    import app
+    from fetcher import FetchEngine
+    from history import PriceHistoryStore
+    from sites import AmazonEgAdapter, SelectorSiteAdapter
+
+    amazon = FixtureSite(amazon_page).start()
+    grocer = FixtureSite(grocer_page).start()
+    app.SITES = [
+        AmazonEgAdapter(base_url=amazon.url, max_concurrency=3, rate=20),
+        SelectorSiteAdapter("grocer.test", grocer.url, "/search?q={query}&page={page}",
+                            card="li.product", title=".name", price=".price", id_attribute="data-id",
+                            max_concurrency=1, rate=5),
+    ]
+    app.fetch_engine = FetchEngine(max_per_host=3, rate_per_host=10, burst=3, jitter=0)
+    for site in app.SITES:
+        app.fetch_engine.limit_host(site.host, site.max_concurrency, site.rate, site.burst)
+    app.history_store = PriceHistoryStore('history.sqlite', app.normalize_text)
+
+    progress = []
+    start = time.perf_counter()
+    result = app.scrape_pipeline('water', None, max_products=100, max_pages=pages,
+                                 progress=lambda term, status, products=0: progress.append((term, status)))
+    elapsed = time.perf_counter() - start
+    app.fetch_engine.close()
+    if result["status"] != "success":
+        sys.exit(f"scrape failed: {result['message']}")
+
+    products = result["df_products"]
+    counts = products['Source'].value_counts().to_dict()
+    expected_rows = min(len(PRODUCTS), pages * PAGE_SIZE)
+    if counts != {"amazon.eg": expected_rows, "grocer.test": expected_rows}:
+        sys.exit(f"unexpected rows per source: {counts}")
+
+    price_table = result["price_stats"]["Price Table"]
+    for _, title, amazon_price, grocer_price in PRODUCTS[:expected_rows]:
+        brand = app.extract_brand_from_title(title)
+        size = app.extract_size_from_title(title)
+        expected = round(min(amazon_price, grocer_price))
+        if price_table.loc[size, brand] != expected:
+            sys.exit(f"{brand} {size}: price table has {price_table.loc[size, brand]}, expected {expected}")
+
+    for name, site, adapter in (("amazon.eg", amazon, app.SITES[0]), ("grocer.test", grocer, app.SITES[1])):
+        if site.max_in_flight > adapter.max_concurrency:
+            sys.exit(f"{name} saw {site.max_in_flight} parallel requests, limit {adapter.max_concurrency}")
+        print(f"{name:>12}: {site.requests} requests, at most {site.max_in_flight} at once "
+              f"(limit {adapter.max_concurrency}), {counts[name]} products")
+    print(f"{'progress':>12}: {sorted(set(term for term, _ in progress))}")
+    print(f"{'elapsed':>12}: {elapsed:.2f}s; price table is the minimum across sources (OK)")
+    print(price_table.to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=2)
+    parser.add_argument('--serve', action='store_true', help="only start the servers and keep them running")
+    args = parser.parse_args()
+
+    if not args.serve:
+        run_check(args.pages)
+        return
+    amazon = FixtureSite(amazon_page).start(8082)
+    grocer = FixtureSite(grocer_page).start(8083)
+    print(f"amazon.eg fixture on {amazon.url}, grocer fixture on {grocer.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Record and replay amazon.eg search pages.
+
+A recording is a directory holding manifest.json and one gzip file per page.
+The manifest maps each search page URL to its status code and body file.
+ReplayFetcher answers fetch_all() from a recording, so the scrape pipeline
+runs against it with no network. synthetic_recording() scales a recording
+up to any number of cards by building pages from the recording's titles.
+"""
+import gzip
+import json
+import os
+import random
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCHMARKS)
+from bench_parsers import TITLES, synthetic_page  # noqa: E402
+from fetcher import FetchResult  # noqa: E402
+from parsers import parse_search_page  # noqa: E402
+
+MANIFEST = 'manifest.json'
+CARDS_PER_PAGE = 48
+
+
+class Recording:
+    """
+    Search page bodies keyed by URL, with the terms and page counts they came from
+    """
+    def __init__(self, pages=None, terms=None):
+        self.pages = pages or {}
+        self.terms = terms or {}
+
+    def add(self, term, page, url, status_code, content):
+        self.pages[url] = (status_code, content)
+        self.terms[term] = max(self.terms.get(term, 0), page)
+
+    def bodies(self):
+        return [content for status_code, content in self.pages.values() if status_code == 200]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for number, (url, (status_code, content)) in enumerate(self.pages.items()):
+            name = f"page_{number:04d}.html.gz"
+            with gzip.open(os.path.join(directory, name), 'wb') as f:
+                f.write(content or b'')
+            entries.append({"url": url, "status_code": status_code, "file": name})
+        with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({"terms": self.terms, "pages": entries}, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        pages = {}
+        for entry in manifest["pages"]:
+            with gzip.open(os.path.join(directory, entry["file"]), 'rb') as f:
+                pages[entry["url"]] = (entry["status_code"], f.read())
+        return cls(pages, manifest["terms"])
+
+
+class ReplayFetcher:
+    """
+    Stand-in for FetchEngine that serves a recording; unknown URLs get a 404
+    """
+    def __init__(self, recording):
+        self.recording = recording
+        self.requests = 0
+
+    def fetch(self, url, cache=None):
+        self.requests += 1
+        status_code, content = self.recording.pages.get(url, (404, b''))
+        return FetchResult(url, status_code, content, None)
+
+    def fetch_all(self, urls, cache=None):
+        return [self.fetch(url, cache) for url in urls]
+
+
+def record(fetch_engine, page_url, terms, pages):
+    """Fetch the first `pages` result pages of every term into a Recording"""
+    recording = Recording()
+    for term in terms:
+        urls = [page_url(term, page) for page in range(1, pages + 1)]
+        for page, result in enumerate(fetch_engine.fetch_all(urls), start=1):
+            if result.error is not None:
+                print(f"Skipping {result.url}: {result.error}")
+                continue
+            recording.add(term, page, result.url, result.status_code, result.content)
+    return recording
+
+
+def recorded_titles(recording, parser_backend='lxml'):
+    """Distinct card titles found in a recording"""
+    titles = []
+    for content in recording.bodies():
+        titles.extend(card["title"] for card in parse_search_page(content, parser_backend))
+    return list(dict.fromkeys(title for title in titles if title)) or TITLES
+
+
+def synthetic_recording(page_url, term, cards, titles=TITLES, duplicate_share=0.2, seed=0):
+    """
+    A recording of one term whose pages hold `cards` result cards in total.
+    Titles are variants of the given titles, about duplicate_share of the
+    cards repeat an earlier title, so dedup has real work to do.
+    """
+    rng = random.Random(seed)
+    distinct = max(1, int(cards * (1 - duplicate_share)))
+    variants = [f"{rng.choice(titles)} #{n}" for n in range(distinct)]
+    recording = Recording()
+    page_count = max(1, -(-cards // CARDS_PER_PAGE))
+    for page in range(1, page_count + 1):
+        page_cards = min(CARDS_PER_PAGE, cards - (page - 1) * CARDS_PER_PAGE)
+        # Early pages draw from the first variants so later pages still bring new titles
+        start = (page - 1) * len(variants) // page_count
+        page_titles = variants[start:start + max(1, len(variants) // page_count)] or variants
+        recording.add(term, page, page_url(term, page), 200,
+                      synthetic_page(page_cards, seed=seed * 100000 + page, titles=page_titles))
+    return recording
@@ -0,0 +1,160 @@
+"""
+Fault-injecting stub server standing in for amazon.eg.
+
+Every path answers with a small deterministic page after a fixed latency.
+Faults can be mixed in at random: 503 responses, 200 captcha pages, slow
+responses that trickle their body, and dropped connections. The server
+also answers 503 once more than `capacity` requests are in flight or the
+request rate goes above `max_rate`, like a host that throttles aggressive
+clients.
+
+Usage:
+    python benchmarks/stub_server.py --port 8081 --p503 0.1 --captcha 0.05
+"""
+import argparse
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAPTCHA_PAGE = (b"<html><body><form action=\"/errors/validateCaptcha\">"
+                b"Type the characters you see in this image</form></body></html>")
+
+
+def page_body(path):
+    """The page a healthy request for path returns"""
+    return f"<html><body><p>{path}</p></body></html>".encode('utf-8')
+
+
+class FaultConfig:
+    """
+    Fault probabilities and throttling limits, adjustable while running
+    """
+    def __init__(self, latency=0.05, p503=0.0, captcha=0.0, slow=0.0, slow_seconds=3.0,
+                 drop=0.0, capacity=None, max_rate=None, seed=None):
+        self.latency = latency
+        self.p503 = p503
+        self.captcha = captcha
+        self.slow = slow
+        self.slow_seconds = slow_seconds
+        self.drop = drop
+        self.capacity = capacity
+        self.max_rate = max_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.recent = deque()
+        self.served = {"ok": 0, "503": 0, "throttled": 0, "captcha": 0, "slow": 0, "drop": 0}
+
+    def admit(self):
+        """Count a new request; returns False when the host is over its limits"""
+        with self.lock:
+            now = time.monotonic()
+            self.in_flight += 1
+            self.recent.append(now)
+            while self.recent and self.recent[0] < now - 1.0:
+                self.recent.popleft()
+            if self.capacity is not None and self.in_flight > self.capacity:
+                return False
+            if self.max_rate is not None and len(self.recent) > self.max_rate:
+                return False
+            return True
+
+    def done(self, outcome):
+        with self.lock:
+            self.in_flight -= 1
+            self.served[outcome] += 1
+
+    def draw(self):
+        """Pick the fault for one admitted request, or "ok" """
+        with self.lock:
+            roll = self.random.random()
+        for outcome, probability in (("503", self.p503), ("captcha", self.captcha),
+                                     ("slow", self.slow), ("drop", self.drop)):
+            if roll < probability:
+                return outcome
+            roll -= probability
+        return "ok"
+
+
+def start_stub_server(config, port=0):
+    """Start the stub server on a background thread and return it"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_page(self, status, body, delay_per_chunk=0.0):
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if not delay_per_chunk:
+                self.wfile.write(body)
+                return
+            for start in range(0, len(body), 8):
+                self.wfile.write(body[start:start + 8])
+                self.wfile.flush()
+                time.sleep(delay_per_chunk)
+
+        def do_GET(self):
+            if not config.admit():
+                time.sleep(config.latency)
+                self.send_page(503, b"<html><body>Service Unavailable</body></html>")
+                config.done("throttled")
+                return
+
+            outcome = config.draw()
+            time.sleep(config.latency)
+            try:
+                if outcome == "503":
+                    self.send_page(503, b"<html><body>Service Unavailable</body></html>")
+                elif outcome == "captcha":
+                    self.send_page(200, CAPTCHA_PAGE)
+                elif outcome == "slow":
+                    body = page_body(self.path)
+                    self.send_page(200, body, config.slow_seconds / max(1, len(body) // 8))
+                elif outcome == "drop":
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                else:
+                    self.send_page(200, page_body(self.path))
+            except OSError:
+                pass
+            finally:
+                config.done(outcome)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--p503', type=float, default=0.0)
+    parser.add_argument('--captcha', type=float, default=0.0)
+    parser.add_argument('--slow', type=float, default=0.0)
+    parser.add_argument('--drop', type=float, default=0.0)
+    parser.add_argument('--capacity', type=int, default=None)
+    parser.add_argument('--max-rate', type=float, default=None)
+    args = parser.parse_args()
+
+    config = FaultConfig(args.latency, args.p503, args.captcha, args.slow, drop=args.drop,
+                         capacity=args.capacity, max_rate=args.max_rate)
+    server = start_stub_server(config, args.port)
+    print(f"stub server on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(config.served)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
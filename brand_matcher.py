@@ -0,0 +1,113 @@
+"""
+Brand matching index built on an Aho-Corasick automaton.
+
+All brand dictionaries are normalized once and loaded into one automaton, so
+a title is scanned a single time to find every brand term it contains. Each
+term carries a rank that reproduces the old lookup order: Arabic mappings
+first, then brand search terms, then the raw brand names.
+"""
+from collections import deque
+
+import pandas as pd
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher; each pattern carries an integer value
+    and a scan returns the smallest value among the patterns found
+    """
+    def __init__(self, patterns):
+        # Node 0 is the root; goto[node] maps a character to the next node
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [None]
+
+        for pattern, value in patterns:
+            node = 0
+            for char in pattern:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            if self.best[node] is None or value < self.best[node]:
+                self.best[node] = value
+
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                inherited = self.best[self.fail[child]]
+                if inherited is not None and (self.best[child] is None or inherited < self.best[child]):
+                    self.best[child] = inherited
+
+    def min_value(self, text):
+        """Return the smallest value of any pattern found in text, or None"""
+        goto = self.goto
+        fail = self.fail
+        best_values = self.best
+        node = 0
+        best = None
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            value = best_values[node]
+            if value is not None and (best is None or value < best):
+                best = value
+                if best == 0:
+                    break
+        return best
+
+
+class BrandMatcher:
+    """
+    Find the water brand in product titles with one scan per title
+    """
+    def __init__(self, arabic_brand_mappings, brand_search_terms, water_brands, normalize,
+                 default="Other"):
+        self.normalize = normalize
+        self.default = default
+
+        # Ranked (normalized term, brand) list in the order the terms are checked
+        ranked_terms = [(arabic_name, brand) for arabic_name, brand in arabic_brand_mappings.items()]
+        for brand, search_terms in brand_search_terms.items():
+            ranked_terms.extend((term, brand) for term in search_terms)
+        ranked_terms.extend((brand, brand) for brand in water_brands)
+
+        self.brands = []
+        patterns = []
+        for rank, (term, brand) in enumerate(ranked_terms):
+            self.brands.append(brand)
+            patterns.append((normalize(term), rank))
+
+        self.automaton = AhoCorasick(patterns)
+
+    def match_normalized(self, normalized_title):
+        """Return the brand for an already normalized title"""
+        rank = self.automaton.min_value(normalized_title)
+        if rank is None:
+            return self.default
+        return self.brands[rank]
+
+    def match(self, title):
+        """Return the brand for a raw product title"""
+        return self.match_normalized(self.normalize(title))
+
+    def match_series(self, titles):
+        """
+        Return a Series of brands for a Series of titles, matching each
+        distinct title only once
+        """
+        titles = pd.Series(titles)
+        unique_titles = titles.dropna().unique()
+        brands = {title: self.match(title) for title in unique_titles}
+        return titles.map(brands).fillna(self.default)
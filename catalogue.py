@@ -0,0 +1,368 @@
+"""
+ASIN-keyed product catalogue.
+
+Products are identified by the same key as the price history: their ASIN
+(or another site's product id), falling back to the normalized title for
+cards that carry none. Every scrape is upserted into the catalogue: the last
+seen price and availability are updated in place and price changes are
+appended to a per-product price series.
+
+The catalogue lives in SQLite next to the price history, so every web worker
+reads the same products and price series and they survive a restart.
+
+The price table and best offers of a scrape come from that scrape's own
+products. They are kept per search scope (keyword and brand filter) as the
+lowest price and best offer of every (brand, size) cell; a new scrape of the
+scope is diffed against the previous one and only the cells it changed are
+recomputed.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import analytics
+from columnar import PRICE_DECIMALS, exact_prices, object_labels
+
+
+class ProductCatalogue:
+    """
+    SQLite store of the last known state of every product, with the price
+    changes of each one
+    """
+    # Catalogue columns and their names when exported next to scraped products
+    EXPORT_COLUMNS = {
+        'product_key': 'Product Key',
+        'asin': 'ASIN',
+        'title': 'Product Title',
+        'price': 'Price',
+        'brand': 'Brand',
+        'size': 'Size',
+        'numeric_price': 'Numeric Price',
+        'availability': 'Availability Status',
+        'url': 'Product URL',
+        'source': 'Source',
+        'first_seen': 'First Seen',
+        'last_seen': 'Last Seen',
+        'price_changes': 'Price Changes',
+    }
+
+    def __init__(self, path, product_key):
+        self.path = path
+        self.product_key = product_key
+        self.lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalogue (
+                    product_key TEXT PRIMARY KEY,
+                    asin TEXT,
+                    title TEXT,
+                    price TEXT,
+                    brand TEXT,
+                    size TEXT,
+                    numeric_price REAL,
+                    availability TEXT,
+                    url TEXT,
+                    source TEXT,
+                    first_seen TEXT NOT NULL,
+                    last_seen TEXT NOT NULL,
+                    price_changes INTEGER NOT NULL DEFAULT 0,
+                    last_price REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalogue_prices (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_key TEXT NOT NULL,
+                    observed_at TEXT NOT NULL,
+                    numeric_price REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_catalogue_prices_product
+                ON catalogue_prices (product_key, id)
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert(self, df, observed_at=None):
+        """
+        Merge a scraped products DataFrame into the catalogue. A priced row
+        whose price differs from the last one recorded for its product adds
+        to that product's price series. Returns the number of price changes.
+        """
+        if df is None or df.empty:
+            return 0
+        observed_at = observed_at or datetime.now().isoformat(timespec='seconds')
+        asins = df['ASIN'] if 'ASIN' in df.columns else [None] * len(df)
+        urls = df['Product URL'] if 'Product URL' in df.columns else [None] * len(df)
+        sources = df['Source'] if 'Source' in df.columns else [None] * len(df)
+
+        # product key -> catalogue row; a product seen twice keeps its last row
+        products = {}
+        for title, price, brand, size, numeric_price, availability, asin, url, source in zip(
+                df['Product Title'], df['Price'], df['Brand'], df['Size'],
+                df['Numeric Price'], df['Availability Status'], asins, urls, sources):
+            key = self.product_key(title, asin)
+            products[key] = [key, asin if isinstance(asin, str) and asin else None, title, price, brand, size,
+                             round(float(numeric_price), PRICE_DECIMALS), availability,
+                             url if isinstance(url, str) else None, source if isinstance(source, str) else None]
+
+        with self.lock, self._connect() as conn:
+            keys = list(products)
+            last_prices = {}
+            # Look up the last recorded prices in chunks to stay under SQLite's variable limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                last_prices.update(conn.execute(
+                    f"SELECT product_key, last_price FROM catalogue WHERE product_key IN ({placeholders})", chunk))
+
+            changes = [(key, observed_at, row[6]) for key, row in products.items()
+                       if row[6] > 0 and last_prices.get(key) != row[6]]
+            changed = {key for key, _, _ in changes}
+            conn.executemany("""
+                INSERT INTO catalogue (product_key, asin, title, price, brand, size, numeric_price, availability,
+                                       url, source, first_seen, last_seen, price_changes, last_price)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (product_key) DO UPDATE SET
+                    asin = coalesce(excluded.asin, asin),
+                    title = excluded.title,
+                    price = excluded.price,
+                    brand = excluded.brand,
+                    size = excluded.size,
+                    numeric_price = excluded.numeric_price,
+                    availability = excluded.availability,
+                    url = coalesce(excluded.url, url),
+                    source = coalesce(excluded.source, source),
+                    last_seen = excluded.last_seen,
+                    price_changes = price_changes + excluded.price_changes,
+                    last_price = coalesce(excluded.last_price, last_price)
+            """, [row + [observed_at, observed_at, int(key in changed), row[6] if key in changed else None]
+                  for key, row in products.items()])
+            conn.executemany(
+                "INSERT INTO catalogue_prices (product_key, observed_at, numeric_price) VALUES (?, ?, ?)", changes)
+        return len(changes)
+
+    def rekey_titles(self):
+        """
+        Move products whose stored key no longer matches the key of their
+        ASIN and title, after a change in title normalization, merging them
+        into the product already stored under the new key. Returns the
+        number of products moved.
+        """
+        with self.lock, self._connect() as conn:
+            remap = {key: self.product_key(title, asin) for key, title, asin in
+                     conn.execute("SELECT product_key, title, asin FROM catalogue")}
+            remap = {old: new for old, new in remap.items() if old != new}
+
+            for old, new in remap.items():
+                # A row under the new key was written after the change, so it holds the newer state
+                conn.execute("""
+                    INSERT INTO catalogue (product_key, asin, title, price, brand, size, numeric_price,
+                                           availability, url, source, first_seen, last_seen,
+                                           price_changes, last_price)
+                    SELECT ?, asin, title, price, brand, size, numeric_price, availability, url, source,
+                           first_seen, last_seen, price_changes, last_price
+                    FROM catalogue WHERE product_key = ?
+                    ON CONFLICT (product_key) DO UPDATE SET
+                        asin = coalesce(asin, excluded.asin),
+                        url = coalesce(url, excluded.url),
+                        source = coalesce(source, excluded.source),
+                        first_seen = min(first_seen, excluded.first_seen),
+                        price_changes = price_changes + excluded.price_changes
+                """, (new, old))
+                conn.execute("DELETE FROM catalogue WHERE product_key = ?", (old,))
+                conn.execute("UPDATE catalogue_prices SET product_key = ? WHERE product_key = ?", (new, old))
+        return len(remap)
+
+    def price_series(self, key):
+        """Price changes of one product as a DataFrame"""
+        with self._connect() as conn:
+            series = pd.read_sql_query(
+                "SELECT observed_at, numeric_price FROM catalogue_prices WHERE product_key = ? ORDER BY id",
+                conn, params=[key])
+        return pd.DataFrame({
+            'Observed At': pd.to_datetime(series['observed_at']),
+            'Numeric Price': series['numeric_price'].astype('float64'),
+        })
+
+    def iter_chunks(self, chunk_rows=5000):
+        """Yield the catalogue, one row per product, as DataFrame chunks with export column names"""
+        query = f"SELECT {', '.join(self.EXPORT_COLUMNS)} FROM catalogue ORDER BY first_seen, product_key"
+        with self._connect() as conn:
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunk_rows):
+                yield chunk.rename(columns=self.EXPORT_COLUMNS)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM catalogue").fetchone()[0]
+
+
+class OfferTables:
+    """
+    Price table and best offers of the last scrape of each search scope,
+    updated from the (brand, size) cells a new scrape changed. The tables
+    are the same as analytics.price_table and analytics.best_offers over
+    the scrape's products.
+    """
+    def __init__(self, sizes=(), empty_brands=(), scopes=32):
+        self.sizes = list(sizes)
+        self.empty_brands = list(empty_brands)
+        self.scopes = scopes
+        self.lock = threading.Lock()
+        # scope -> {"rows": keyed valid rows, "cell_min": {cell: price}, "cell_best": {cell: (price, row key)}}
+        self.states = OrderedDict()
+
+    def keyed_rows(self, df):
+        """
+        Brand, size and exact price of the rows with a known brand and size,
+        indexed by source and ASIN, or title for cards without one
+        """
+        valid = ((df['Brand'] != 'Other') & (df['Size'] != 'Unknown Size')).to_numpy()
+        titles = df['Product Title'].to_numpy(dtype=object)[valid]
+        keys = titles
+        if 'ASIN' in df.columns:
+            asins = df['ASIN'].to_numpy(dtype=object)[valid]
+            keys = np.where(pd.notna(asins) & (asins != ''), asins, titles)
+        if 'Source' in df.columns:
+            keys = object_labels(df['Source'])[valid] + '\x1f' + keys
+        index = pd.Index(keys, dtype=object)
+        return pd.DataFrame({
+            'Brand': pd.Series(object_labels(df['Brand'])[valid], index=index, dtype=object),
+            'Size': pd.Series(object_labels(df['Size'])[valid], index=index, dtype=object),
+            'Price': pd.Series(exact_prices(df['Numeric Price']).to_numpy(dtype='float64')[valid], index=index),
+        })
+
+    def affected_cells(self, previous, current):
+        """Cells of the rows that are new, gone or changed between two keyed scrapes"""
+        positions = previous.index.get_indexer(current.index)
+        matched = np.flatnonzero(positions >= 0)
+        before = positions[matched]
+        same = np.zeros(len(current), dtype=bool)
+        previous_price = previous['Price'].to_numpy()[before]
+        current_price = current['Price'].to_numpy()[matched]
+        same[matched] = ((previous['Brand'].to_numpy()[before] == current['Brand'].to_numpy()[matched])
+                         & (previous['Size'].to_numpy()[before] == current['Size'].to_numpy()[matched])
+                         & ((previous_price == current_price)
+                            | (np.isnan(previous_price) & np.isnan(current_price))))
+        # Previous rows that are gone or changed leave their old cell
+        left = np.ones(len(previous), dtype=bool)
+        left[positions[same]] = False
+        return (set(zip(previous['Brand'].to_numpy()[left], previous['Size'].to_numpy()[left]))
+                | set(zip(current['Brand'].to_numpy()[~same], current['Size'].to_numpy()[~same])))
+
+    def refresh(self, state, current, cells):
+        """Recompute the lowest price and best offer of cells from the current rows"""
+        # One integer code per (brand, size) of the current rows
+        brand_codes, brands = pd.factorize(current['Brand'].to_numpy())
+        size_codes, sizes = pd.factorize(current['Size'].to_numpy())
+        codes = brand_codes * len(sizes) + size_codes
+        brand_index = {brand: i for i, brand in enumerate(brands)}
+        size_index = {size: i for i, size in enumerate(sizes)}
+        cell_codes = {brand_index[brand] * len(sizes) + size_index[size]: (brand, size)
+                      for brand, size in cells if brand in brand_index and size in size_index}
+
+        in_cells = np.isin(codes, list(cell_codes))
+        prices = current['Price'].to_numpy()[in_cells]
+        row_codes = codes[in_cells]
+        lowest = pd.Series(prices).groupby(row_codes).min()
+        priced = prices > 0
+        priced_prices = prices[priced]
+        priced_keys = current.index[in_cells][priced]
+        # idxmin keeps the first row among equal prices, like best_offers
+        best = pd.Series(priced_prices).groupby(row_codes[priced]).idxmin()
+
+        for cell in cells:
+            state['cell_min'].pop(cell, None)
+            state['cell_best'].pop(cell, None)
+        for code, price in lowest.items():
+            state['cell_min'][cell_codes[code]] = price
+        for code, position in best.items():
+            state['cell_best'][cell_codes[code]] = (priced_prices[position], priced_keys[position])
+
+    def update(self, scope, df):
+        """
+        Fold the products of a new scrape of scope into its cells and return
+        its (price table, best offers)
+        """
+        if df is None or df.empty:
+            return pd.DataFrame(), pd.DataFrame()
+        current = self.keyed_rows(df)
+        if not current.index.is_unique:
+            # Rows can not be told apart, so the tables are computed over the whole scrape
+            with self.lock:
+                self.states.pop(scope, None)
+            return (analytics.price_table(df, self.sizes, self.empty_brands),
+                    analytics.best_offers(df))
+
+        with self.lock:
+            state = self.states.pop(scope, None)
+        if state is None:
+            state = {'cell_min': {}, 'cell_best': {}}
+            cells = set(zip(current['Brand'], current['Size']))
+        else:
+            cells = self.affected_cells(state['rows'], current)
+        if cells:
+            self.refresh(state, current, cells)
+        state['rows'] = current
+        with self.lock:
+            self.states[scope] = state
+            while len(self.states) > self.scopes:
+                self.states.popitem(last=False)
+        return self.price_table(state, df), self.best_offers(state, current)
+
+    def price_table(self, state, df):
+        """Size x Brand table of the cell minimums, shaped like analytics.price_table"""
+        if not state['cell_min']:
+            return analytics.price_table(df, self.sizes, self.empty_brands)
+        # Brands without any price have no column; sizes follow self.sizes for the sizes it lists
+        brands = sorted({brand for (brand, size), price in state['cell_min'].items() if not np.isnan(price)})
+        sizes = sorted({size for brand, size in state['cell_min']})
+        listed = [size for size in self.sizes if size in sizes]
+        sizes = listed or sizes
+        brand_columns = {brand: i for i, brand in enumerate(brands)}
+        size_rows = {size: i for i, size in enumerate(sizes)}
+        values = np.full((len(sizes), len(brands)), np.nan)
+        for (brand, size), price in state['cell_min'].items():
+            if brand in brand_columns and size in size_rows:
+                values[size_rows[size], brand_columns[brand]] = price
+        # Like the reindex in analytics.price_table, listed sizes give a str index
+        index = pd.Index(sizes, name='Size') if listed else pd.Index(sizes, name='Size', dtype=object)
+        return pd.DataFrame(values.round(0), index=index,
+                            columns=pd.Index(brands, name='Brand', dtype=object)).astype('Int64')
+
+    def best_offers(self, state, current):
+        """Cheapest brand per size from the cell best offers, shaped like analytics.best_offers"""
+        if not state['cell_best']:
+            return pd.DataFrame()
+        candidates = {}
+        for (brand, size), (price, key) in state['cell_best'].items():
+            candidates.setdefault(size, []).append((price, brand, key))
+        offers = []
+        for size in sorted(candidates):
+            price = min(candidate[0] for candidate in candidates[size])
+            tied = [candidate for candidate in candidates[size] if candidate[0] == price]
+            if len(tied) > 1:
+                # Equal prices go to the row that comes first in the scrape
+                positions = current.index.get_indexer([key for _, _, key in tied])
+                tied = [tied[int(np.argmin(positions))]]
+            offers.append((size, tied[0][1], price))
+        return pd.DataFrame({
+            'Size': pd.Series([size for size, _, _ in offers], dtype=object),
+            'Brand': pd.Series([brand for _, brand, _ in offers], dtype=object),
+            'Best Price': pd.Series([price for _, _, price in offers], dtype='float64'),
+        }).set_axis(pd.Index([size for size, _, _ in offers], name='Size', dtype=object))
@@ -0,0 +1,95 @@
+"""
+Compact columnar product tables.
+
+Scraped products and loaded history repeat a handful of brand, size and
+status strings on every row. ProductEncoding stores those columns as pandas
+categoricals, whose categories start with the known vocabulary (brands,
+standard sizes, availability statuses) and grow with any other value found.
+Prices become float32 and the free-text columns are interned, so a title
+repeated across months of history is held once.
+
+Pickled snapshots and parquet exports keep the encoding as is. CSV has no
+types, so ProductEncoding.read_csv applies it again on load.
+
+float32 keeps about seven significant digits. exact_prices() rounds prices
+back to the piastre wherever they are stored or reported.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+STATUSES = ["Available", "Not Available", "Unknown"]
+PRICE_DECIMALS = 2
+
+# Columns with a small set of repeated values; the vocabulary is open for the last two
+CATEGORICAL_COLUMNS = ["Brand", "Size", "Availability Status", "Stock Availability", "Source"]
+PRICE_COLUMNS = ["Numeric Price", "Price per Litre"]
+INTERNED_COLUMNS = ["Product Title", "Price", "ASIN", "Product URL", "Observed At", "Product Key"]
+
+
+def intern_strings(values):
+    """An object Series holding one shared copy of every distinct string"""
+    return pd.Series([sys.intern(value) if isinstance(value, str) else value for value in values.tolist()],
+                     index=values.index, dtype=object, name=values.name)
+
+
+def object_labels(values):
+    """
+    The labels of a column as an object array. Categoricals are expanded
+    from their codes, which is much faster than converting the values.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = np.append(values.cat.categories.to_numpy(dtype=object), None)
+        # Missing values have code -1, which picks the None appended last
+        return categories[values.cat.codes.to_numpy()]
+    return values.to_numpy(dtype=object)
+
+
+def exact_prices(prices):
+    """Prices as float64, rounded back to the piastre when they were stored as float32"""
+    if prices.dtype == 'float32':
+        return prices.astype('float64').round(PRICE_DECIMALS)
+    return prices
+
+
+class ProductEncoding:
+    """
+    Categorical vocabularies for product tables, and the conversion to and
+    from the compact representation
+    """
+    def __init__(self, brands=(), sizes=(), statuses=STATUSES):
+        self.vocabularies = {
+            "Brand": list(brands) + ["Other"],
+            "Size": list(sizes) + ["Unknown Size"],
+            "Availability Status": list(statuses),
+        }
+
+    def dtype(self, column, values):
+        """The known vocabulary first, then any other values in sorted order"""
+        known = self.vocabularies.get(column, [])
+        extra = sorted(set(values.dropna().unique()) - set(known))
+        return pd.CategoricalDtype(known + extra)
+
+    def encode(self, df, names=None):
+        """
+        Return a compact copy of df. names maps column names of df to the
+        product column names when they differ, as for raw history rows.
+        """
+        df = df.copy()
+        names = names or {}
+        for column in df.columns:
+            name = names.get(column, column)
+            if name in CATEGORICAL_COLUMNS:
+                df[column] = df[column].astype(self.dtype(name, df[column]))
+            elif name in PRICE_COLUMNS:
+                df[column] = df[column].astype('float32')
+            elif name in INTERNED_COLUMNS:
+                df[column] = intern_strings(df[column])
+        return df
+
+    def read_csv(self, path, **kwargs):
+        """Load a products CSV written by the scraper into the compact representation"""
+        df = pd.read_csv(path, encoding='utf-8-sig', dtype={'Product Title': str, 'Price': str, 'ASIN': str},
+                         **kwargs)
+        return self.encode(df)
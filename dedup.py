@@ -0,0 +1,146 @@
+"""
+Duplicate detection for scraped products.
+
+Exact duplicates are found with a dict keyed by the normalized title, which
+maps to the index of the row kept for that product. Optional fuzzy grouping
+uses MinHash signatures of word shingles with LSH banding, so listings of the
+same SKU under slightly different titles collapse without comparing every
+pair of titles.
+"""
+import random
+import zlib
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def title_shingles(normalized_title, size=2):
+    """Return the set of word shingles of a normalized title"""
+    tokens = normalized_title.split()
+    if len(tokens) < size:
+        return {' '.join(tokens)}
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures over string shingles using seeded universal hashes
+    """
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, shingles):
+        hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.params
+        )
+
+
+class DedupIndex:
+    """
+    Map product titles to the row index kept for them
+    """
+    def __init__(self, normalize, fuzzy=False, threshold=0.8, num_perm=64, bands=16, shingle_size=2):
+        self.normalize = normalize
+        self.exact = {}
+
+        self.fuzzy = fuzzy
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        if fuzzy:
+            self.hasher = MinHasher(num_perm)
+            self.bands = bands
+            self.rows_per_band = num_perm // bands
+            self.buckets = {}
+            self.shingles = {}
+
+    def _band_keys(self, signature):
+        rows = self.rows_per_band
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def find(self, title):
+        """Return the row index of a duplicate of this title, or None"""
+        key = self.normalize(title)
+        if key in self.exact:
+            return self.exact[key]
+
+        if not self.fuzzy:
+            return None
+
+        # Only titles sharing an LSH band are compared with the exact Jaccard score
+        shingles = title_shingles(key, self.shingle_size)
+        signature = self.hasher.signature(shingles)
+        best_index = None
+        best_score = self.threshold
+        seen = set()
+        for band_key in self._band_keys(signature):
+            for index in self.buckets.get(band_key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                other = self.shingles[index]
+                score = len(shingles & other) / len(shingles | other)
+                if score >= best_score:
+                    best_index = index
+                    best_score = score
+        return best_index
+
+    def add(self, title, index):
+        """Register a new row for this title"""
+        key = self.normalize(title)
+        self.exact[key] = index
+
+        if self.fuzzy:
+            shingles = title_shingles(key, self.shingle_size)
+            self.shingles[index] = shingles
+            for band_key in self._band_keys(self.hasher.signature(shingles)):
+                self.buckets.setdefault(band_key, []).append(index)
+
+
+# Columns that belong to a row's offer rather than to the product; a cheaper
+# duplicate brings all of them, so the price per litre and availability match
+# the price kept
+OFFER_COLUMNS = ["Price", "Numeric Price", "Availability Status", "Pack Count", "Unit Litres", "Price per Litre"]
+
+
+def drop_duplicate_products(df, dedup_index):
+    """
+    Collapse rows of the same product, in order. Rows with the same ASIN
+    are the same product; otherwise duplicate titles are. The first row for
+    a product is kept and takes the offer columns of the cheapest valid
+    price seen for it.
+    """
+    titles = df['Product Title'].tolist()
+    numeric_prices = df['Numeric Price'].tolist()
+    asins = df['ASIN'].tolist() if 'ASIN' in df.columns else [None] * len(titles)
+
+    keep = []
+    best_rows = []
+    asin_rows = {}
+    for position, (title, asin) in enumerate(zip(titles, asins)):
+        if not isinstance(asin, str) or not asin:
+            asin = None
+        i = asin_rows.get(asin) if asin is not None else None
+        if i is None:
+            i = dedup_index.find(title)
+        if i is not None:
+            if asin is not None:
+                asin_rows.setdefault(asin, i)
+            # If this price is better, its offer replaces the kept one
+            numeric_price = numeric_prices[position]
+            if numeric_price > 0 and numeric_price < numeric_prices[best_rows[i]]:
+                best_rows[i] = position
+        else:
+            dedup_index.add(title, len(keep))
+            if asin is not None:
+                asin_rows[asin] = len(keep)
+            keep.append(position)
+            best_rows.append(position)
+
+    result = df.iloc[keep].reset_index(drop=True)
+    offers = [column for column in OFFER_COLUMNS if column in df.columns]
+    result[offers] = df[offers].iloc[best_rows].reset_index(drop=True)
+    return result
@@ -0,0 +1,82 @@
+"""
+Product detail page enrichment.
+
+Search cards only carry a title and a price. This optional stage collects the
+ASINs of the kept products, fetches their detail pages in batches through the
+shared fetch engine and reads the real stock availability from them. Detail
+pages are cached per ASIN with their own TTL, so repeat sweeps skip products
+that were fetched recently.
+"""
+import re
+from urllib.parse import urljoin
+
+AMAZON_BASE_URL = "https://www.amazon.eg"
+_ASIN_IN_URL = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)')
+
+
+def asin_from_url(url):
+    """Extract the ASIN from an amazon product link, or None"""
+    if not url:
+        return None
+    match = _ASIN_IN_URL.search(url)
+    return match.group(1) if match else None
+
+
+def product_url(link):
+    """Make a card link absolute"""
+    if not link:
+        return None
+    return urljoin(AMAZON_BASE_URL, link)
+
+
+def detail_url(asin):
+    """Canonical detail page URL; also the cache key of the ASIN"""
+    return f"{AMAZON_BASE_URL}/dp/{asin}"
+
+
+class DetailEnricher:
+    """
+    Fetch detail pages for a set of products and add their stock availability
+    """
+    def __init__(self, fetch_engine, parse, cache=None, batch_size=10):
+        self.fetch_engine = fetch_engine
+        self.parse = parse
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def fetch_details(self, asins):
+        """
+        Return {asin: parsed detail dict} for the ASINs whose page could be
+        read; ids of other sites ("site:id") are skipped
+        """
+        asins = list(dict.fromkeys(asin for asin in asins if isinstance(asin, str) and asin and ':' not in asin))
+        details = {}
+        for start in range(0, len(asins), self.batch_size):
+            batch = asins[start:start + self.batch_size]
+            pages = self.fetch_engine.fetch_all([detail_url(asin) for asin in batch], cache=self.cache)
+            for asin, page in zip(batch, pages):
+                if page.error is not None or page.status_code != 200:
+                    continue
+                try:
+                    details[asin] = self.parse(page.content)
+                except Exception as e:
+                    print(f"Error reading detail page {asin}: {str(e)}")
+        return details
+
+    def enrich(self, df):
+        """
+        Return a copy of df with a Stock Availability column, and card prices
+        that were missing filled in from the detail page
+        """
+        df = df.copy()
+        details = self.fetch_details(df['ASIN'].dropna())
+
+        stock = df['ASIN'].map(lambda asin: details.get(asin, {}).get('availability'))
+        df['Stock Availability'] = stock.fillna("Unknown")
+
+        detail_prices = df['ASIN'].map(lambda asin: details.get(asin, {}).get('price'))
+        missing_price = (df['Price'] == "Price not found") & detail_prices.notna() & \
+            ~detail_prices.isin(["Price not found", "Error extracting price"])
+        df.loc[missing_price, 'Price'] = detail_prices[missing_price]
+        return df, int(missing_price.sum())
+
@@ -0,0 +1,113 @@
+"""
+Batch enrichment of raw scraped rows.
+
+Takes a DataFrame of raw (Product Title, Price) rows and fills in the derived
+Brand, Size, Numeric Price and Availability Status columns with vectorized
+pandas operations. With a pack parser it sizes titles the size rules missed
+from their unit volume, and adds the pack count, the unit volume and the
+price per litre. A scrape enriches each page without the unit columns and
+adds them once to the deduplicated products. The same stage re-enriches
+stored CSVs after the brand or size rules change.
+"""
+import numpy as np
+import pandas as pd
+
+PRODUCT_COLUMNS = ["Product Title", "Price", "Brand", "Size", "Numeric Price", "Availability Status"]
+UNIT_COLUMNS = ["Pack Count", "Unit Litres", "Price per Litre"]
+DERIVED_COLUMNS = ["Brand", "Size", "Numeric Price", "Availability Status"] + UNIT_COLUMNS
+
+# Arabic-Indic digits and separators that show up in price texts
+PRICE_FOLDING = {'٫': '.', '٬': ','}
+PRICE_FOLDING.update({chr(0x0660 + digit): str(digit) for digit in range(10)})
+PRICE_FOLDING.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})
+PRICE_FOLDING = str.maketrans(PRICE_FOLDING)
+
+
+def parse_numeric_prices(prices):
+    """
+    Parse price texts like "‏89.95 جنيه", "EGP 1,299.00" or "١٢٫٥٠ ج.م"
+    into floats; unparseable prices become NaN
+    """
+    prices = prices.astype('string')
+    # \d only matches ASCII digits on string columns, so the Arabic forms are listed;
+    # only the numbers that hold them are folded
+    numbers = prices.str.extract(r'([0-9٠-٩۰-۹,.٫٬]+)', expand=False)
+    arabic = ~numbers.str.isascii().fillna(True).astype(bool)
+    if arabic.any():
+        numbers = numbers.mask(arabic, numbers[arabic].str.translate(PRICE_FOLDING))
+    numbers = numbers.str.replace(',', '', regex=False)
+    numeric = pd.to_numeric(numbers, errors='coerce').astype('float64')
+    return numeric.mask(prices == "Price not found")
+
+
+class ProductEnricher:
+    """
+    Derive brand, size, numeric price and availability for many rows at once
+    """
+    def __init__(self, brand_matcher, size_extractor, price_thresholds, pack_parser=None):
+        self.brand_matcher = brand_matcher
+        self.size_extractor = size_extractor
+        self.price_thresholds = price_thresholds
+        self.pack_parser = pack_parser
+
+    def availability(self, numeric_prices, sizes):
+        """
+        Flag products priced above the NPL threshold for their size as
+        "Not Available"; rows without a usable price are "Unknown"
+        """
+        thresholds = sizes.map(self.price_thresholds).astype('float64')
+        over_threshold = (thresholds > 0) & (numeric_prices > thresholds)
+        status = np.where(over_threshold, "Not Available", "Available")
+        status = np.where(numeric_prices.isna(), "Unknown", status)
+        return pd.Series(status, index=numeric_prices.index, dtype=object)
+
+    def enrich(self, df, units=True):
+        """
+        Return a copy of df with all derived columns filled in; without
+        units, the pack count, unit volume and price per litre are left out
+        """
+        df = df.copy()
+        titles = df['Product Title']
+
+        df['Brand'] = self.brand_matcher.match_series(titles)
+        sizes = self.size_extractor.extract_series(titles)
+        unknown = sizes == "Unknown Size"
+        if self.pack_parser is not None and unknown.any():
+            # Packs like "20 زجاجة × 0.330 لتر" are sized by their unit volume
+            unit_litres = self.pack_parser.unit_litres(titles[unknown])
+            unit_sizes = self.pack_parser.size_labels(unit_litres).reindex(sizes.index)
+            sizes = sizes.mask(unknown & unit_sizes.notna(), unit_sizes)
+        df['Size'] = sizes
+
+        numeric_prices = parse_numeric_prices(df['Price'])
+        df['Availability Status'] = self.availability(numeric_prices, df['Size'])
+        df['Numeric Price'] = numeric_prices.fillna(0.0)
+
+        columns = list(PRODUCT_COLUMNS)
+        if units and self.pack_parser is not None:
+            df = self.unit_prices(df)
+            columns += UNIT_COLUMNS
+        extra_columns = [column for column in df.columns if column not in columns]
+        return df[columns + extra_columns]
+
+    def unit_prices(self, df):
+        """
+        Return a copy of df with the pack count, unit volume and price per
+        litre of every row, keeping its brand and size. The unit columns
+        follow Availability Status.
+        """
+        packs = self.pack_parser.parse(df['Product Title'])
+        units = self.pack_parser.unit_columns(packs, df['Size'], df['Numeric Price'])
+        df = df.drop(columns=[column for column in UNIT_COLUMNS if column in df.columns])
+        position = df.columns.get_loc('Availability Status') + 1
+        return pd.concat([df.iloc[:, :position], units, df.iloc[:, position:]], axis=1)
+
+    def reenrich_csv(self, path, output_path=None):
+        """
+        Recompute the derived columns of a stored products CSV with the
+        current rules and write it back (or to output_path)
+        """
+        df = pd.read_csv(path, encoding='utf-8-sig', dtype={'Product Title': str, 'Price': str})
+        df = self.enrich(df.drop(columns=[c for c in DERIVED_COLUMNS if c in df.columns]))
+        df.to_csv(output_path or path, index=False, encoding='utf-8-sig')
+        return df
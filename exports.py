@@ -0,0 +1,153 @@
+"""
+Streaming exports.
+
+Exports are produced chunk by chunk from an iterator of DataFrames, so a
+download of the whole price history never has to sit in memory at once.
+CSV, gzip-compressed CSV and Parquet (when pyarrow is installed) are
+supported, and brand/size/date filters are applied before serialization.
+"""
+import io
+import zlib
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parquet_available():
+    return pq is not None
+
+
+def filter_products(df, brand=None, size=None, start=None, end=None, time_column='Observed At'):
+    """
+    Filter a products chunk by brand, size and an inclusive date range; the
+    date range only applies when the chunk has a timestamp column
+    """
+    mask = None
+
+    def combine(condition):
+        return condition if mask is None else mask & condition
+
+    if brand:
+        mask = combine(df['Brand'] == brand)
+    if size:
+        mask = combine(df['Size'] == size)
+    if time_column in df.columns:
+        if start:
+            mask = combine(df[time_column] >= start)
+        if end:
+            mask = combine(df[time_column] <= end)
+    return df if mask is None else df[mask]
+
+
+def iter_frame_chunks(df, chunk_rows=5000):
+    """Split a DataFrame into row chunks"""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def iter_csv(chunks, columns=None, index=False):
+    """
+    Yield CSV text for an iterator of DataFrame chunks, writing the header once
+    """
+    header_written = False
+    for chunk in chunks:
+        if columns is not None:
+            chunk = chunk.reindex(columns=columns)
+        yield chunk.to_csv(header=not header_written, index=index)
+        header_written = True
+    if not header_written and columns is not None:
+        yield ','.join(columns) + '\n'
+
+
+def iter_gzip(text_chunks, encoding='utf-8'):
+    """Gzip-compress a stream of text chunks"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for text in text_chunks:
+        data = compressor.compress(text.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes can be taken after each write"""
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_parquet(chunks, empty=None):
+    """
+    Yield a Parquet file one row group per chunk; requires pyarrow. Without
+    any chunks the file holds the zero-row empty DataFrame, so it is still a
+    valid file with the export's columns.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    sink = _DrainableSink()
+    writer = None
+    if empty is None:
+        empty = pd.DataFrame()
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            table = table.cast(writer.schema)
+        writer.write_table(table)
+        data = sink.drain()
+        if data:
+            yield data
+    if writer is None:
+        table = pa.Table.from_pandas(empty, preserve_index=False)
+        # Columns without values to infer a type from are written as text
+        table = table.cast(pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                      for field in table.schema], metadata=table.schema.metadata))
+        writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(chunks, export_format, columns=None, empty=None):
+    """
+    Return a generator of response body chunks in the requested format;
+    empty is a zero-row DataFrame typed like the chunks, for exports with none
+    """
+    if export_format == "csv":
+        return iter_csv(chunks, columns)
+    if export_format == "csv.gz":
+        return iter_gzip(iter_csv(chunks, columns))
+    if export_format == "parquet":
+        if empty is None and columns is not None:
+            empty = pd.DataFrame(columns=columns)
+        return iter_parquet(chunks, empty)
+    raise ValueError(f"Unknown export format: {export_format}")
@@ -0,0 +1,335 @@
+"""
+Concurrent fetch engine for the Amazon scraper.
+
+Search pages are fetched on a bounded thread pool that shares one pooled
+keep-alive session. Each host gets an adaptive limiter, starting from the
+engine defaults or from limits set for that host: concurrency and
+request rate grow additively while the host answers 200 and are halved when
+it throttles (503/429, captcha pages or timeouts). Failed requests are
+retried with jittered exponential backoff, every request has a hard
+deadline, and the engine keeps metrics on throughput, retries and throttling.
+"""
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import propagate, span
+
+# Result of a single fetch; error holds the exception when the request failed
+FetchResult = namedtuple('FetchResult', ['url', 'status_code', 'content', 'error', 'attempts'],
+                         defaults=[1])
+
+# Statuses that mean "slow down" and are worth retrying
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 504}
+
+# Markers of the robot check page amazon serves with a 200 status
+CAPTCHA_MARKERS = (b'/errors/validateCaptcha', b'Type the characters you see in this image',
+                   b'api-services-support@amazon.com')
+
+
+class FetchTimeout(Exception):
+    """The response did not complete within the hard deadline"""
+
+
+class BlockedError(Exception):
+    """The host answered with a throttling status or a captcha page"""
+
+
+def is_captcha(content):
+    """Whether a 200 response is actually a robot check page"""
+    head = content[:20000] if content else b''
+    return any(marker in head for marker in CAPTCHA_MARKERS)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to space out requests to one host
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limiter for one host: concurrency and rate grow by a small step for
+    every successful response and are halved when the host throttles, at
+    most once per cooldown so one burst of errors counts as one signal
+    """
+    def __init__(self, max_concurrency=3, rate=1.0, burst=1, min_rate=None, max_rate=None,
+                 rate_step=None, decrease=0.5, cooldown=2.0):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        # By default the rate moves between a tenth and twice the configured rate
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.max_rate = max_rate if max_rate is not None else rate * 2
+        self.rate_step = rate_step if rate_step is not None else rate / 20
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.bucket = TokenBucket(rate, burst)
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Wait for a concurrency slot and a rate token"""
+        with self.condition:
+            while self.in_flight >= max(1, int(self.limit)):
+                self.condition.wait()
+            self.in_flight += 1
+        self.bucket.acquire()
+
+    def release(self, throttled):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.last_decrease = now
+                    self.limit = max(1.0, self.limit * self.decrease)
+                    with self.bucket.lock:
+                        self.bucket.rate = max(self.min_rate, self.bucket.rate * self.decrease)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                with self.bucket.lock:
+                    self.bucket.rate = min(self.max_rate, self.bucket.rate + self.rate_step)
+            self.condition.notify_all()
+
+    def state(self):
+        return {"concurrency": round(self.limit, 2), "rate": round(self.bucket.rate, 3),
+                "in_flight": self.in_flight}
+
+
+class FetchMetrics:
+    """
+    Thread-safe counters for the fetch engine and a sliding window of
+    completed requests for the achieved requests per second
+    """
+    def __init__(self, window=60.0):
+        self.window = window
+        self.lock = threading.Lock()
+        self.completed = deque()
+        self.counters = {
+            "requests": 0, "retries": 0, "throttled": 0, "captchas": 0,
+            "timeouts": 0, "errors": 0, "cache_hits": 0, "bytes": 0,
+        }
+        self.statuses = {}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def record_response(self, status_code, size):
+        with self.lock:
+            now = time.monotonic()
+            self.counters["requests"] += 1
+            self.counters["bytes"] += size
+            self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+            self.completed.append(now)
+            while self.completed and self.completed[0] < now - self.window:
+                self.completed.popleft()
+
+    def requests_per_second(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.completed and self.completed[0] < now - self.window:
+                self.completed.popleft()
+            if not self.completed:
+                return 0.0
+            span = max(now - self.completed[0], 1.0)
+            return round(len(self.completed) / span, 3)
+
+    def snapshot(self):
+        rate = self.requests_per_second()
+        with self.lock:
+            return dict(self.counters, statuses=dict(self.statuses), requests_per_second=rate)
+
+
+class FetchEngine:
+    """
+    Fetch many URLs in parallel while staying polite to each host
+    """
+    def __init__(self, headers=None, max_per_host=3, rate_per_host=1.0, burst=1,
+                 jitter=0.5, timeout=(5, 15), deadline=30, retries=3, backoff=1.0,
+                 max_backoff=30.0, max_workers=8, cache=None):
+        self.headers = headers or {}
+        self.cache = cache
+        self.max_per_host = max_per_host
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.jitter = jitter
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metrics = FetchMetrics()
+
+        # One session for all workers so connections are pooled and kept alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch')
+        self._hosts_lock = threading.Lock()
+        self._limiters = {}
+        self._host_limits = {}
+
+    def limit_host(self, host, max_concurrency=None, rate=None, burst=None):
+        """Give one host its own starting limits; None keeps the engine default"""
+        limits = (max_concurrency or self.max_per_host, rate or self.rate_per_host, burst or self.burst)
+        with self._hosts_lock:
+            self._host_limits[host] = limits
+            self._limiters.pop(host, None)
+
+    def _limiter(self, url):
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            if host not in self._limiters:
+                limits = self._host_limits.get(host, (self.max_per_host, self.rate_per_host, self.burst))
+                self._limiters[host] = AdaptiveLimiter(*limits)
+            return self._limiters[host]
+
+    def _get(self, url, headers):
+        """
+        One GET with connect/read timeouts and a hard deadline on the whole
+        response, so a server trickling bytes can't hold a worker forever.
+        Returns (response, body).
+        """
+        started = time.monotonic()
+        response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        try:
+            chunks = []
+            for chunk in response.iter_content(65536):
+                chunks.append(chunk)
+                if self.deadline and time.monotonic() - started > self.deadline:
+                    raise FetchTimeout(f"{url} took longer than {self.deadline}s")
+        finally:
+            response.close()
+        return response, b''.join(chunks)
+
+    def _backoff_delay(self, attempt, response=None):
+        """Full-jitter exponential backoff, honouring a short Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def fetch(self, url, cache=None):
+        """
+        Fetch a single URL, returning a FetchResult instead of raising.
+        cache overrides the engine's default response cache for this request.
+        """
+        cache = cache if cache is not None else self.cache
+
+        # Fresh cache entries skip the network and the politeness delay
+        cached = None
+        headers = self.headers
+        if cache is not None:
+            with span("fetch.cache"):
+                cached, fresh = cache.lookup(url)
+            if fresh:
+                self.metrics.count("cache_hits")
+                return FetchResult(url, cached.status_code, cached.content, None)
+            headers = dict(self.headers, **cache.conditional_headers(cached))
+
+        limiter = self._limiter(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            content = None
+            error = None
+            throttled = False
+            with span("fetch.wait"):
+                limiter.acquire()
+                # Small random delay so requests don't line up exactly on the bucket ticks
+                if self.jitter:
+                    time.sleep(random.uniform(0, self.jitter))
+            try:
+                with span("fetch.network"):
+                    response, content = self._get(url, headers)
+            except (requests.Timeout, FetchTimeout) as e:
+                error = e
+                throttled = True
+                self.metrics.count("timeouts")
+            except Exception as e:
+                error = e
+            else:
+                self.metrics.record_response(response.status_code, len(content))
+                if response.status_code in THROTTLE_STATUSES:
+                    throttled = True
+                    error = BlockedError(f"{url} answered {response.status_code}")
+                elif response.status_code == 200 and is_captcha(content):
+                    throttled = True
+                    self.metrics.count("captchas")
+                    error = BlockedError(f"{url} answered with a captcha page")
+                elif response.status_code in RETRY_STATUSES:
+                    error = BlockedError(f"{url} answered {response.status_code}")
+            finally:
+                limiter.release(throttled)
+            if throttled:
+                self.metrics.count("throttled")
+
+            if error is None:
+                break
+            if attempt > self.retries:
+                self.metrics.count("errors")
+                status_code = response.status_code if response is not None else None
+                return FetchResult(url, status_code, content, error, attempt)
+            self.metrics.count("retries")
+            with span("fetch.backoff"):
+                time.sleep(self._backoff_delay(attempt - 1, response))
+
+        if cache is not None:
+            if response.status_code == 304 and cached is not None:
+                cache.refresh(url)
+                return FetchResult(url, cached.status_code, cached.content, None, attempt)
+            if response.status_code == 200:
+                cache.store(url, response.status_code, content, response.headers)
+        return FetchResult(url, response.status_code, content, None, attempt)
+
+    def fetch_all(self, urls, cache=None):
+        """
+        Fetch all URLs concurrently and return the results in the same order.
+        Each fetch runs in a copy of the caller's context so its timing spans
+        land in the caller's scrape trace.
+        """
+        fetches = [propagate(self.fetch) for _ in urls]
+        return list(self.executor.map(lambda fetch, url: fetch(url, cache), fetches, urls))
+
+    def stats(self):
+        """Metrics plus the current adaptive limits of every host"""
+        stats = self.metrics.snapshot()
+        with self._hosts_lock:
+            stats["hosts"] = {host: limiter.state() for host, limiter in self._limiters.items()}
+        return stats
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,436 @@
+"""
+Append-only price history.
+
+Every scrape is appended to a SQLite store instead of overwriting the CSV
+exports. Only rows whose price or availability changed since the last time
+the product was seen are written, so the store grows with the number of
+changes rather than with the size of the catalogue. A sweep scheduler scrapes
+every brand on an interval and feeds the results into the store; a lock
+file makes sure only one process of a multi-worker server runs it.
+
+Each snapshot also updates a daily rollup per (brand, size) holding the
+lowest and median price and the availability counts of every product's last
+known state at the end of the day, so trend queries read a few rows per day
+instead of scanning the observations.
+
+Loaded observations come back in the compact columnar encoding when the
+store is given one.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+import analytics
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only
+    fcntl = None
+from columnar import PRICE_DECIMALS
+
+
+def inclusive_end(end):
+    """
+    Upper bound for observed_at <= end. A date without a time includes the
+    whole day: "2026-10-18" becomes "2026-10-18T23:59:59.999999".
+    """
+    if end and 'T' not in end and ' ' not in end:
+        return end + 'T23:59:59.999999'
+    return end
+
+
+class PriceHistoryStore:
+    """
+    SQLite store of price observations indexed by (brand, size, time)
+    """
+    def __init__(self, path, normalize, encoding=None):
+        self.path = path
+        self.normalize = normalize
+        self.encoding = encoding
+        self.lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS observations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    observed_at TEXT NOT NULL,
+                    product_key TEXT NOT NULL,
+                    title TEXT,
+                    brand TEXT,
+                    size TEXT,
+                    price TEXT,
+                    numeric_price REAL,
+                    availability TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_observations_brand_size_time
+                ON observations (brand, size, observed_at)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_observations_product_time
+                ON observations (product_key, observed_at)
+            """)
+            # Last known state of each product, used to detect changes
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS latest (
+                    product_key TEXT PRIMARY KEY,
+                    numeric_price REAL,
+                    availability TEXT,
+                    observed_at TEXT,
+                    brand TEXT,
+                    size TEXT
+                )
+            """)
+            # Stores created before the rollups read the last known state lack its brand and size
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(latest)")]
+            if 'brand' not in columns:
+                conn.execute("ALTER TABLE latest ADD COLUMN brand TEXT")
+                conn.execute("ALTER TABLE latest ADD COLUMN size TEXT")
+                conn.execute("""
+                    UPDATE latest SET (brand, size) = (
+                        SELECT brand, size FROM observations
+                        WHERE observations.product_key = latest.product_key
+                        ORDER BY observed_at DESC, id DESC LIMIT 1
+                    )
+                """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_latest_brand_size
+                ON latest (brand, size)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_rollups (
+                    day TEXT NOT NULL,
+                    brand TEXT NOT NULL,
+                    size TEXT NOT NULL,
+                    min_price REAL,
+                    median_price REAL,
+                    products INTEGER NOT NULL,
+                    available INTEGER NOT NULL,
+                    snapshots INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (day, brand, size)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_daily_rollups_brand_size_day
+                ON daily_rollups (brand, size, day)
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def product_key(self, title, asin=None):
+        """The ASIN when the card had one, else the normalized title"""
+        if isinstance(asin, str) and asin:
+            return asin
+        return self.normalize(title)
+
+    def append_snapshot(self, df, observed_at=None):
+        """
+        Append the rows of a scraped products DataFrame whose price or
+        availability changed. Returns the number of rows written.
+        """
+        if df is None or df.empty:
+            return 0
+        observed_at = observed_at or datetime.now().isoformat(timespec='seconds')
+
+        asins = df['ASIN'] if 'ASIN' in df.columns else [None] * len(df)
+        rows = []
+        for title, price, brand, size, numeric_price, availability, asin in zip(
+                df['Product Title'], df['Price'], df['Brand'], df['Size'],
+                df['Numeric Price'], df['Availability Status'], asins):
+            rows.append((observed_at, self.product_key(title, asin), title, brand, size,
+                         price, round(float(numeric_price), PRICE_DECIMALS), availability))
+
+        with self.lock, self._connect() as conn:
+            keys = list({row[1] for row in rows})
+            previous = {}
+            # Look up the previous state in chunks to stay under SQLite's variable limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for key, numeric_price, availability, brand, size in conn.execute(
+                        f"SELECT product_key, numeric_price, availability, brand, size FROM latest "
+                        f"WHERE product_key IN ({placeholders})", chunk):
+                    previous[key] = (numeric_price, availability, brand, size)
+
+            changed = []
+            # (brand, size) groups a changed product left or joined
+            groups = set()
+            for row in rows:
+                key, brand, size, numeric_price, availability = row[1], row[3], row[4], row[6], row[7]
+                state = previous.get(key)
+                if state is None or state[:2] != (numeric_price, availability):
+                    changed.append(row)
+                    if state is not None:
+                        groups.add(state[2:])
+                    groups.add((brand, size))
+                    previous[key] = (numeric_price, availability, brand, size)
+            if not changed:
+                return 0
+
+            conn.executemany(
+                "INSERT INTO observations (observed_at, product_key, title, brand, size, price, "
+                "numeric_price, availability) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", changed)
+            conn.executemany(
+                "INSERT OR REPLACE INTO latest (product_key, numeric_price, availability, observed_at, brand, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(row[1], row[6], row[7], row[0], row[3], row[4]) for row in changed])
+
+            day = observed_at[:10]
+            # The first snapshot of a day rolls up every product, later ones only the groups they touched
+            if conn.execute("SELECT 1 FROM daily_rollups WHERE day = ? LIMIT 1", (day,)).fetchone():
+                self._write_rollups(conn, day, self._latest_state(conn, groups), groups)
+            else:
+                self._write_rollups(conn, day, self._latest_state(conn))
+        return len(changed)
+
+    def _latest_state(self, conn, groups=None):
+        """
+        Last known state of the products in the given (brand, size) groups,
+        or of every product, with the columns daily_rollup reads
+        """
+        query = "SELECT brand, size, numeric_price, availability FROM latest"
+        if groups is None:
+            rows = conn.execute(query).fetchall()
+        else:
+            groups = list(groups)
+            rows = []
+            for start in range(0, len(groups), 250):
+                chunk = groups[start:start + 250]
+                placeholders = ','.join(['(?, ?)'] * len(chunk))
+                rows += conn.execute(f"{query} WHERE (brand, size) IN (VALUES {placeholders})",
+                                     [value for group in chunk for value in group]).fetchall()
+        return pd.DataFrame(rows, columns=['Brand', 'Size', 'Numeric Price', 'Availability Status'])
+
+    def _write_rollups(self, conn, day, state, groups=None):
+        """
+        Replace the day's rollup rows with those of the given product state,
+        the last known state of every product at the end of the day. With
+        groups, only the rows of those (brand, size) groups are replaced and
+        state holds just their products. Appending snapshots and rebuilding
+        both go through here, so they give the same rows.
+        """
+        if groups is None:
+            conn.execute("DELETE FROM daily_rollups WHERE day = ?", (day,))
+        else:
+            conn.executemany("DELETE FROM daily_rollups WHERE day = ? AND brand = ? AND size = ?",
+                             [(day, brand, size) for brand, size in groups])
+        rollup = analytics.daily_rollup(state)
+        conn.executemany("""
+            INSERT INTO daily_rollups (day, brand, size, min_price, median_price, products, available)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(day, brand, size,
+               None if pd.isna(min_price) else float(min_price),
+               None if pd.isna(median_price) else float(median_price),
+               int(products), int(available))
+              for brand, size, min_price, median_price, products, available in zip(
+                  rollup['Brand'], rollup['Size'], rollup['min_price'], rollup['median_price'],
+                  rollup['products'], rollup['available'])])
+
+    def load_rollups(self, brand=None, size=None, start=None, end=None):
+        """Return the daily rollups as a DataFrame, optionally filtered"""
+        query = "SELECT day, brand, size, min_price, median_price, products, available FROM daily_rollups WHERE 1=1"
+        params = []
+        if brand:
+            query += " AND brand = ?"
+            params.append(brand)
+        if size:
+            query += " AND size = ?"
+            params.append(size)
+        if start:
+            query += " AND day >= ?"
+            params.append(start[:10])
+        if end:
+            query += " AND day <= ?"
+            params.append(end[:10])
+        query += " ORDER BY day, brand, size"
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def rebuild_rollups(self):
+        """
+        Recompute the daily rollups from the observations. Observations only
+        record changes, so each product's last known state is carried
+        forward from day to day. Returns the number of days rebuilt.
+        """
+        observations = self.load().rename(columns=self.EXPORT_COLUMNS)
+        if observations.empty:
+            return 0
+        observations['Day'] = observations['Observed At'].str[:10]
+
+        state = {}
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM daily_rollups")
+            for day, day_rows in observations.groupby('Day', sort=True):
+                # product key -> row of its latest observation so far
+                state.update(zip(day_rows['product_key'], day_rows.index))
+                self._write_rollups(conn, day, observations.loc[list(state.values())])
+        return observations['Day'].nunique()
+
+    def rekey_titles(self):
+        """
+        Move the observations of products keyed by a title normalized with
+        an older normalizer to the key the current one gives, so a product
+        without an ASIN keeps one price history when normalization changes.
+        ASIN keys never normalize to their title, so they are left alone.
+        Returns the number of keys moved.
+        """
+        with self.lock, self._connect() as conn:
+            remap = {}
+            for key, title in conn.execute("SELECT DISTINCT product_key, title FROM observations"):
+                current = self.normalize(title)
+                if key != current and self.normalize(key) == current:
+                    remap[key] = current
+
+            for old, new in remap.items():
+                conn.execute("UPDATE observations SET product_key = ? WHERE product_key = ?", (new, old))
+                # Keep whichever last known state is newer
+                conn.execute("""
+                    INSERT INTO latest (product_key, numeric_price, availability, observed_at, brand, size)
+                    SELECT ?, numeric_price, availability, observed_at, brand, size FROM latest WHERE product_key = ?
+                    ON CONFLICT (product_key) DO UPDATE SET
+                        numeric_price = excluded.numeric_price,
+                        availability = excluded.availability,
+                        observed_at = excluded.observed_at,
+                        brand = excluded.brand,
+                        size = excluded.size
+                    WHERE excluded.observed_at > latest.observed_at
+                """, (new, old))
+                conn.execute("DELETE FROM latest WHERE product_key = ?", (old,))
+        return len(remap)
+
+    def load(self, brand=None, size=None, start=None, end=None):
+        """Return the stored observations as a DataFrame, optionally filtered"""
+        query = "SELECT * FROM observations WHERE 1=1"
+        params = []
+        if brand:
+            query += " AND brand = ?"
+            params.append(brand)
+        if size:
+            query += " AND size = ?"
+            params.append(size)
+        if start:
+            query += " AND observed_at >= ?"
+            params.append(start)
+        if end:
+            query += " AND observed_at <= ?"
+            params.append(inclusive_end(end))
+        query += " ORDER BY observed_at, id"
+        with self._connect() as conn:
+            return self._encode(pd.read_sql_query(query, conn, params=params))
+
+    def _encode(self, df):
+        """Apply the compact encoding to loaded observations, when the store has one"""
+        if self.encoding is None:
+            return df
+        return self.encoding.encode(df, names=self.ENCODED_COLUMNS)
+
+    # Column names used when observations are exported next to scraped products
+    EXPORT_COLUMNS = {
+        'observed_at': 'Observed At',
+        'title': 'Product Title',
+        'price': 'Price',
+        'brand': 'Brand',
+        'size': 'Size',
+        'numeric_price': 'Numeric Price',
+        'availability': 'Availability Status',
+    }
+    ENCODED_COLUMNS = dict(EXPORT_COLUMNS, product_key='Product Key')
+
+    def empty_chunk(self):
+        """A chunk without observations, typed like the chunks iter_chunks yields"""
+        empty = pd.DataFrame({column: pd.Series(dtype='float64' if column == 'numeric_price' else object)
+                              for column in self.EXPORT_COLUMNS})
+        return self._encode(empty).rename(columns=self.EXPORT_COLUMNS)
+
+    def iter_chunks(self, brand=None, size=None, start=None, end=None, chunk_rows=5000):
+        """
+        Yield filtered observations as DataFrame chunks with export column
+        names, reading from SQLite one chunk at a time
+        """
+        query = f"SELECT {', '.join(self.EXPORT_COLUMNS)} FROM observations WHERE 1=1"
+        params = []
+        if brand:
+            query += " AND brand = ?"
+            params.append(brand)
+        if size:
+            query += " AND size = ?"
+            params.append(size)
+        if start:
+            query += " AND observed_at >= ?"
+            params.append(start)
+        if end:
+            query += " AND observed_at <= ?"
+            params.append(inclusive_end(end))
+        query += " ORDER BY observed_at, id"
+        with self._connect() as conn:
+            for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunk_rows):
+                yield self._encode(chunk).rename(columns=self.EXPORT_COLUMNS)
+
+
+class SweepScheduler:
+    """
+    Run a sweep function on a fixed interval in a background thread. With a
+    lock path, only the process holding an exclusive lock on that file runs
+    it; the others try again every retry seconds, in case the holder exits.
+    """
+    def __init__(self, sweep, interval, lock_path=None, retry=60):
+        self.sweep = sweep
+        self.interval = interval
+        self.lock_path = lock_path
+        self.retry = retry
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock_file = None
+        self.next_attempt = 0
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        """Start the sweep thread if this process may run it; returns True when it runs here"""
+        with self.start_lock:
+            if self.thread is not None:
+                return True
+            if time.monotonic() < self.next_attempt or not self._claim():
+                return False
+            self.thread = threading.Thread(target=self._loop, name='sweep', daemon=True)
+            self.thread.start()
+            return True
+
+    def _claim(self):
+        """Take the lock file without waiting; it stays held for the life of the process"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            self.next_attempt = time.monotonic() + self.retry
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error during scheduled sweep: {str(e)}")
+            # Wait for the rest of the interval, waking early if stopped
+            self.stop_event.wait(max(0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,141 @@
+"""
+Persistent HTTP response cache for search pages.
+
+Responses are stored in a SQLite file keyed by the request URL, with the body
+zlib-compressed. Entries younger than the TTL are served without touching the
+network; older ones are revalidated with If-None-Match / If-Modified-Since
+when the server sent an ETag or Last-Modified header. The total stored size
+is bounded by evicting the least recently used entries.
+"""
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'status_code', 'content', 'etag', 'last_modified', 'fetched_at'])
+
+
+class HttpCache:
+    """
+    On-disk, size-bounded LRU cache of HTTP responses with a TTL
+    """
+    def __init__(self, path, ttl=900, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    status_code INTEGER,
+                    body BLOB,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL,
+                    accessed_at REAL,
+                    size INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def lookup(self, url):
+        """
+        Return (entry, fresh) for a cached URL, or (None, False) on a miss.
+        Fresh entries count as hits; stale or missing ones count as misses.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status_code, body, etag, last_modified, fetched_at FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+
+        if row is None:
+            self._count("misses")
+            return None, False
+
+        status_code, body, etag, last_modified, fetched_at = row
+        entry = CacheEntry(url, status_code, zlib.decompress(body), etag, last_modified, fetched_at)
+        fresh = now - fetched_at < self.ttl
+        self._count("hits" if fresh else "misses")
+        return entry, fresh
+
+    def conditional_headers(self, entry):
+        """Return the revalidation headers for a stale entry"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def refresh(self, url):
+        """Mark a stale entry as fresh again after a 304 Not Modified"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+        self._count("revalidated")
+
+    def store(self, url, status_code, content, headers=None):
+        """Store a response body and its validators, then enforce the size bound"""
+        headers = headers or {}
+        body = zlib.compress(content)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, status_code, body, headers.get('ETag'), headers.get('Last-Modified'), now, now, len(body))
+            )
+        self._count("stores")
+        self._evict()
+
+    def _evict(self):
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = 0
+            for url, size in conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                total -= size
+                evicted += 1
+        self._count("evictions", evicted)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Return hit/miss counters and the current number of stored entries"""
+        with self.lock:
+            stats = dict(self.counters)
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        stats["entries"] = entries
+        stats["size_bytes"] = size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(100 * (stats["hits"] + stats["revalidated"]) / lookups, 1) if lookups else 0
+        return stats
@@ -0,0 +1,196 @@
+"""
+Stage timing for the scrape pipeline.
+
+Code marks its phases with `with span("parse"):`. Every span is observed in
+an in-memory histogram per stage, and while a scrape trace is active it is
+also added to that scrape's own breakdown. The trace lives in a context
+variable, so fetch worker threads started with the caller's context report
+into the scrape that started them. Histograms and any registered collectors
+are rendered in the Prometheus text format for the /metrics endpoint.
+"""
+import contextvars
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_active_trace = contextvars.ContextVar('scrape_trace', default=None)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram of durations
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, count of observations <= bound) pairs, ending with +Inf"""
+        running = 0
+        pairs = []
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            pairs.append((bound, running))
+        pairs.append((float('inf'), self.count))
+        return pairs
+
+
+class ScrapeTrace:
+    """
+    Per-stage totals of one scrape, in the order stages first ran
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def add(self, stage, seconds):
+        with self.lock:
+            total, calls = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, calls + 1)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def breakdown(self):
+        """Stage rows for display; share is relative to the scrape's wall time"""
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        with self.lock:
+            stages = list(self.stages.items())
+        return [
+            {"stage": stage, "seconds": round(total, 4), "calls": calls,
+             "share": round(100 * total / elapsed, 1) if elapsed else 0.0}
+            for stage, (total, calls) in stages
+        ]
+
+
+class MetricsRegistry:
+    """
+    Stage histograms plus collectors that report other components' metrics
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.collectors = []
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        trace = _active_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    @contextmanager
+    def trace(self):
+        """Collect the spans of one scrape into a ScrapeTrace"""
+        scrape_trace = ScrapeTrace()
+        token = _active_trace.set(scrape_trace)
+        try:
+            yield scrape_trace
+        finally:
+            scrape_trace.finish()
+            _active_trace.reset(token)
+
+    def register(self, collector):
+        """
+        Add a callable returning (name, type, help, [(labels dict, value), ...])
+        tuples, evaluated each time /metrics is rendered
+        """
+        self.collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP scrape_stage_seconds Time spent in each scrape pipeline stage",
+            "# TYPE scrape_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'scrape_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+                lines.append(f'scrape_stage_seconds_sum{{stage="{stage}"}} {histogram.total}')
+                lines.append(f'scrape_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        for collector in self.collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    """Render a labels dict as {key="value",...} with Prometheus escaping"""
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+# Shared registry; modules time their phases with instrumentation.span(...)
+metrics = MetricsRegistry()
+span = metrics.span
+
+
+def propagate(function):
+    """
+    Wrap function so it runs in a copy of the caller's context, carrying the
+    active scrape trace into a worker thread
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+@contextmanager
+def profiled(enabled, limit=40):
+    """
+    Optionally run a block under cProfile. Yields a dict whose "text" is set
+    to the top functions by cumulative time once the block ends.
+    """
+    report = {"text": None}
+    if not enabled:
+        yield report
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+        report["text"] = output.getvalue()
@@ -0,0 +1,210 @@
+"""
+Background scrape jobs.
+
+The /scrape route enqueues a job and returns straight away; a small worker
+pool runs the scrapes. Each job keeps its own per-search-term progress and
+its own result, and identical requests that are still queued or running are
+coalesced into the same job. Successful results are handed to a publish
+callback, which stores them where every web worker can read them.
+
+Job records are kept in SQLite, next to the snapshots, and written on every
+status and progress change, so any web worker can answer a poll for a job
+another worker runs, and finished jobs survive a restart. A queued or
+running job whose record has not changed for a long time is reported as
+interrupted: the worker that ran it is gone.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Job:
+    """
+    A single scrape request and its progress
+    """
+    def __init__(self, keyword, brand_filter, max_products, max_pages=1, fetch_details=False, profile=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.keyword = keyword
+        self.brand_filter = brand_filter
+        self.max_products = max_products
+        self.max_pages = max_pages
+        self.fetch_details = fetch_details
+        self.profile = profile
+        self.status = "queued"
+        self.terms = OrderedDict()
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def key(self):
+        return (self.keyword, self.brand_filter, self.max_products, self.max_pages, self.fetch_details,
+                self.profile)
+
+    def update_term(self, search_term, status, products=0):
+        """Progress callback: record the state of one search term"""
+        with self.lock:
+            self.terms[search_term] = {"status": status, "products": products}
+
+    def to_dict(self):
+        with self.lock:
+            terms = [dict(term=term, **state) for term, state in self.terms.items()]
+        done = sum(1 for term in terms if term["status"] not in ("queued", "fetching"))
+        data = {
+            "id": self.id,
+            "keyword": self.keyword,
+            "brand_filter": self.brand_filter,
+            "max_products": self.max_products,
+            "max_pages": self.max_pages,
+            "fetch_details": self.fetch_details,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "terms": terms,
+            "progress": round(100 * done / len(terms)) if terms else 0,
+            "error": self.error,
+        }
+        if self.result is not None:
+            data["products"] = self.result.get("products")
+            data["elapsed"] = self.result.get("elapsed")
+            data["has_profile"] = bool(self.result.get("profile"))
+            data["version"] = self.result.get("version")
+        return data
+
+
+class JobStore:
+    """
+    SQLite table of job records, shared by every web worker
+    """
+    def __init__(self, path, keep=50, stale_after=30 * 60):
+        self.path = path
+        self.keep = keep
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    status TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    profile TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, job):
+        """Write the current state of a job and drop finished jobs beyond the retention limit"""
+        with self.lock, self._connect() as conn:
+            # Read the job under the lock, so a slower writer never overwrites newer progress
+            record = job.to_dict()
+            profile = job.result.get("profile") if job.result is not None else None
+            conn.execute("""
+                INSERT INTO jobs (id, status, record, profile, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    status = excluded.status,
+                    record = excluded.record,
+                    profile = excluded.profile,
+                    updated_at = excluded.updated_at
+            """, (job.id, record["status"], json.dumps(record), profile, time.time()))
+            conn.execute("DELETE FROM jobs WHERE status NOT IN ('queued', 'running') "
+                         "AND seq <= (SELECT MAX(seq) FROM jobs) - ?", (self.keep,))
+
+    def get(self, job_id):
+        """The record of a job as Job.to_dict() returns it, or None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT record, updated_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[0])
+        if record["status"] in ("queued", "running") and time.time() - row[1] > self.stale_after:
+            record.update(status="failed", error="The scrape was interrupted before it finished")
+        return record
+
+    def profile(self, job_id):
+        """The cProfile report of a job, or None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT profile FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+
+class JobManager:
+    """
+    Run scrape jobs on a worker pool and record their progress in a job store
+    """
+    def __init__(self, run, store, max_workers=2, publish=None):
+        self.run = run
+        self.store = store
+        self.publish = publish
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape')
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def submit(self, keyword, brand_filter, max_products, max_pages=1, fetch_details=False, profile=False):
+        """
+        Enqueue a scrape, or return the in-flight job for the same request.
+        Returns (job, created).
+        """
+        job = Job(keyword, brand_filter, max_products, max_pages, fetch_details, profile)
+        with self.lock:
+            existing = self.in_flight.get(job.key)
+            if existing is not None:
+                return existing, False
+            self.in_flight[job.key] = job
+        self.store.save(job)
+        self.executor.submit(self._execute, job)
+        return job, True
+
+    def _progress(self, job):
+        def progress(search_term, status, products=0):
+            job.update_term(search_term, status, products)
+            self.store.save(job)
+        return progress
+
+    def _execute(self, job):
+        job.status = "running"
+        self.store.save(job)
+        try:
+            result = self.run(job.keyword, job.brand_filter, job.max_products,
+                              progress=self._progress(job), max_pages=job.max_pages,
+                              fetch_details=job.fetch_details, profile=job.profile)
+            if result["status"] == "success" and self.publish is not None:
+                self.publish(job.keyword, result)
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        job.result = result
+        if result["status"] == "success":
+            job.status = "finished"
+        else:
+            job.status = "failed"
+            job.error = result.get("message")
+        job.finished_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.store.save(job)
+        with self.lock:
+            self.in_flight.pop(job.key, None)
+
+    def get(self, job_id):
+        """The record of a job run by any worker, or None"""
+        return self.store.get(job_id)
+
+    def profile(self, job_id):
+        return self.store.profile(job_id)
@@ -0,0 +1,151 @@
+"""
+Search result page parsers.
+
+Both backends return the same list of card dicts (title, price, link, asin)
+for the result cards of an amazon.eg search page. The lxml backend extracts
+the cards with XPath directly from the C-level tree; the BeautifulSoup
+backend is the original tree walk and is used when lxml is unavailable.
+"""
+from bs4 import BeautifulSoup, UnicodeDammit
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# Possible classes of the product link, in the order they are tried
+LINK_CLASSES = [
+    "a-link-normal s-no-outline",
+    "a-link-normal s-underline-text s-underline-link-text s-link-style a-text-normal",
+    "a-link-normal s-link-style a-text-normal",
+    "a-link-normal a-text-normal"
+]
+
+# Possible classes of the title span when the card has no h2
+TITLE_CLASSES = [
+    "a-size-base-plus a-color-base a-text-normal",
+    "a-size-medium a-color-base a-text-normal",
+    "a-size-base a-color-base"
+]
+
+
+def _card(title_element_text, price_element_text, link, asin):
+    return {
+        "title": title_element_text.strip() if title_element_text is not None else "Title not found",
+        "price": price_element_text.strip() if price_element_text is not None else "Price not found",
+        "link": link,
+        "asin": asin or None,
+    }
+
+
+class SoupCardParser:
+    """
+    Parse result cards by walking a BeautifulSoup tree
+    """
+    name = "soup"
+
+    def parse(self, content):
+        soup = BeautifulSoup(content, "html.parser")
+        cards = []
+        for product in soup.select("div.s-result-item[data-component-type='s-search-result']"):
+            # Extract product URL - try multiple possible selectors
+            a_tag = None
+            for class_name in LINK_CLASSES:
+                a_tag = product.find("a", class_=class_name)
+                if a_tag:
+                    break
+
+            # If still not found, try just finding any a tag with title in h2
+            h2 = product.find("h2")
+            if not a_tag and h2:
+                a_tag = h2.find("a")
+
+            # Try h2 first as it often contains the product title
+            title_element = h2
+            if not title_element:
+                for class_name in TITLE_CLASSES:
+                    title_element = product.find("span", class_=class_name)
+                    if title_element:
+                        break
+
+            price_element = product.find("span", class_="a-offscreen")
+            if not price_element:
+                price_element = product.find("span", class_="a-price-whole")
+
+            cards.append(_card(
+                title_element.text if title_element else None,
+                price_element.text if price_element else None,
+                a_tag.get("href") if a_tag else None,
+                product.get("data-asin")
+            ))
+        return cards
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlCardParser:
+    """
+    Parse result cards with XPath over an lxml tree
+    """
+    name = "lxml"
+
+    CARDS = f"//div[{_has_class('s-result-item')} and @data-component-type='s-search-result']"
+    FIRST_H2 = "(.//h2)[1]"
+    FIRST_LINK = "(.//a)[1]"
+    LINKS = ["(.//a[@class='%s'])[1]" % class_name for class_name in LINK_CLASSES]
+    TITLES = ["(.//span[@class='%s'])[1]" % class_name for class_name in TITLE_CLASSES]
+    PRICES = [f"(.//span[{_has_class('a-offscreen')}])[1]",
+              f"(.//span[{_has_class('a-price-whole')}])[1]"]
+
+    @staticmethod
+    def _first(element, paths):
+        for path in paths:
+            found = element.xpath(path)
+            if found:
+                return found[0]
+        return None
+
+    def parse(self, content):
+        if not content:
+            return []
+        # Decode ourselves; libxml2 assumes latin-1 for bytes without a charset
+        if isinstance(content, bytes):
+            try:
+                content = content.decode('utf-8')
+            except UnicodeDecodeError:
+                content = UnicodeDammit(content).unicode_markup
+        tree = lxml_html.fromstring(content)
+        cards = []
+        for product in tree.xpath(self.CARDS):
+            h2 = self._first(product, [self.FIRST_H2])
+
+            a_tag = self._first(product, self.LINKS)
+            if a_tag is None and h2 is not None:
+                a_tag = self._first(h2, [self.FIRST_LINK])
+
+            title_element = h2 if h2 is not None else self._first(product, self.TITLES)
+            price_element = self._first(product, self.PRICES)
+
+            cards.append(_card(
+                title_element.text_content() if title_element is not None else None,
+                price_element.text_content() if price_element is not None else None,
+                a_tag.get("href") if a_tag is not None else None,
+                product.get("data-asin")
+            ))
+        return cards
+
+
+PARSERS = {"soup": SoupCardParser()}
+if lxml_html is not None:
+    PARSERS["lxml"] = LxmlCardParser()
+
+
+def parse_search_page(content, backend="lxml"):
+    """
+    Return the result cards of a search page, using the soup backend when
+    the requested one is not available
+    """
+    parser = PARSERS.get(backend, PARSERS["soup"])
+    return parser.parse(content)
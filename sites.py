@@ -0,0 +1,129 @@
+"""
+Marketplace adapters.
+
+Each site the scraper searches is described by a SiteAdapter: how to build
+its search URLs, how to read the result cards of a page and how to read a
+card's price. The amazon.eg adapter wraps the existing search page parsers.
+SelectorSiteAdapter describes other e-grocers with CSS selectors, so adding
+a site is configuration rather than code. An adapter can also carry its own
+fetch limits, which the fetch engine applies to the site's host.
+"""
+from urllib.parse import quote_plus, urljoin, urlsplit
+
+from bs4 import BeautifulSoup
+
+from detail_pages import AMAZON_BASE_URL, asin_from_url
+from enrichment import PRICE_FOLDING
+from parsers import parse_search_page
+
+
+class SiteAdapter:
+    """
+    URL building, card extraction and price parsing for one marketplace
+    """
+    name = None
+
+    def __init__(self, base_url, max_concurrency=None, rate=None, burst=None):
+        self.base_url = base_url.rstrip('/')
+        self.host = urlsplit(self.base_url).netloc
+        # Fetch limits for this site's host; None keeps the engine defaults
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+
+    def search_url(self, search_term, page=1):
+        raise NotImplementedError
+
+    def parse_cards(self, content):
+        """Result cards of a search page as dicts with title, price, link and id"""
+        raise NotImplementedError
+
+    def parse_price(self, price_text):
+        """
+        Card price text in the form the enrichment stage reads (ASCII digits,
+        "." decimals), or "Price not found"
+        """
+        if not price_text or not price_text.strip():
+            return "Price not found"
+        return price_text.translate(PRICE_FOLDING).strip()
+
+    def product_url(self, link):
+        """Make a card link absolute"""
+        if not link:
+            return None
+        return urljoin(self.base_url + '/', link)
+
+    def product_id(self, card):
+        """
+        Id stored in the ASIN column. Other sites' ids are prefixed with the
+        site name so they never collide with ASINs or with each other.
+        """
+        card_id = card.get("id") or (urlsplit(card["link"]).path if card.get("link") else None)
+        return f"{self.name}:{card_id}" if card_id else None
+
+    def read_rows(self, content, max_products):
+        """(title, price, id, URL, source) rows of the first max_products cards of a page"""
+        return [(card["title"], self.parse_price(card["price"]), self.product_id(card),
+                 self.product_url(card["link"]), self.name)
+                for card in self.parse_cards(content)[:max_products]]
+
+
+class AmazonEgAdapter(SiteAdapter):
+    """
+    amazon.eg search pages, read with the search page parsers
+    """
+    name = "amazon.eg"
+
+    def __init__(self, base_url=AMAZON_BASE_URL, parser_backend="lxml", **limits):
+        super().__init__(base_url, **limits)
+        self.parser_backend = parser_backend
+
+    def search_url(self, search_term, page=1):
+        url = f"{self.base_url}/s?k={quote_plus(search_term)}"
+        if page > 1:
+            return f"{url}&page={page}&ref=sr_pg_{page}"
+        return f"{url}&ref=nb_sb_noss_1"
+
+    def parse_cards(self, content):
+        return parse_search_page(content, self.parser_backend)
+
+    def product_id(self, card):
+        return card["asin"] or asin_from_url(card["link"])
+
+
+class SelectorSiteAdapter(SiteAdapter):
+    """
+    A site described by CSS selectors. search_path is formatted with the
+    quoted search term as {query} and the page number as {page}; card
+    selects the result cards and the other selectors apply inside a card.
+    """
+    def __init__(self, name, base_url, search_path, card, title, price, link='a[href]', id_attribute=None,
+                 **limits):
+        super().__init__(base_url, **limits)
+        self.name = name
+        self.search_path = search_path
+        self.card = card
+        self.title = title
+        self.price = price
+        self.link = link
+        self.id_attribute = id_attribute
+
+    def search_url(self, search_term, page=1):
+        return self.base_url + self.search_path.format(query=quote_plus(search_term), page=page)
+
+    def parse_cards(self, content):
+        if not content:
+            return []
+        soup = BeautifulSoup(content, "html.parser")
+        cards = []
+        for product in soup.select(self.card):
+            title = product.select_one(self.title)
+            price = product.select_one(self.price)
+            link = product.select_one(self.link)
+            cards.append({
+                "title": title.get_text(" ", strip=True) if title else "Title not found",
+                "price": price.get_text(" ", strip=True) if price else "Price not found",
+                "link": link.get("href") if link else None,
+                "id": product.get(self.id_attribute) if self.id_attribute else None,
+            })
+        return cards
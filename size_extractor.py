@@ -0,0 +1,150 @@
+"""
+Compiled size extraction engine.
+
+All size patterns are compiled once into a single alternation. Every pattern
+starts at the beginning of the title or after a space, so the title is only
+tried at those token starts. At each start the alternation returns the first
+pattern (in priority order) that matches there, and the lowest pattern index
+over all starts is the same pattern the old one-search-per-pattern loop would
+have picked.
+"""
+import re
+
+import pandas as pd
+
+# Size patterns in priority order, without the shared (?:^|\s) prefix.
+# A label is either the size name or a function of the named group value.
+SIZE_PATTERNS = [
+    # Standard sizes
+    (r'0\.33\s*l(?:iter)?(?:\s|$)', "0.33L"),
+    (r'330\s*ml(?:\s|$)', "0.33L"),
+    (r'0\.6\s*l(?:iter)?(?:\s|$)', "0.6L"),
+    (r'600\s*ml(?:\s|$)', "0.6L"),
+    (r'1\s*l(?:iter)?(?:\s|$)', "1L"),
+    (r'1000\s*ml(?:\s|$)', "1L"),
+    (r'1\.5\s*l(?:iter)?(?:\s|$)', "1.5L"),
+    (r'1500\s*ml(?:\s|$)', "1.5L"),
+    (r'6\s*l(?:iter)?(?:\s|$)', "6L"),
+    (r'6000\s*ml(?:\s|$)', "6L"),
+    (r'0\.24\s*l(?:iter)?(?:\s|sparkling)', "0.24L Sparkling"),
+    (r'240\s*ml(?:\s|sparkling)', "0.24L Sparkling"),
+    (r'5\s*gallon(?:s)?(?:\s|$)', "5 Gallons"),
+
+    # Alternative formats
+    (r'1\s*-\s*liter(?:\s|$)', "1L"),
+    (r'1\.5\s*-\s*liter(?:\s|$)', "1.5L"),
+    (r'6\s*-\s*liter(?:\s|$)', "6L"),
+
+    # Arabic numbers with L
+    (r'0[,.]33\s*l(?:iter)?(?:\s|$)', "0.33L"),
+    (r'0[,.]6\s*l(?:iter)?(?:\s|$)', "0.6L"),
+    (r'1[,.]5\s*l(?:iter)?(?:\s|$)', "1.5L"),
+
+    # Common Arabic patterns (using English numbers)
+    (r'0\.33\s*لتر(?:\s|$)', "0.33L"),
+    (r'0\.6\s*لتر(?:\s|$)', "0.6L"),
+    (r'1\s*لتر(?:\s|$)', "1L"),
+    (r'1\.5\s*لتر(?:\s|$)', "1.5L"),
+    (r'6\s*لتر(?:\s|$)', "6L"),
+    (r'5\s*جالون(?:\s|$)', "5 Gallons"),
+
+    # Specific packs that indicate size
+    (r'pack\s*of\s*6\s*[xX]\s*1\.5\s*l(?:iter)?(?:\s|$)', "1.5L"),
+    (r'pack\s*of\s*12\s*[xX]\s*0\.33\s*l(?:iter)?(?:\s|$)', "0.33L"),
+    (r'pack\s*of\s*6\s*[xX]\s*1\s*l(?:iter)?(?:\s|$)', "1L"),
+
+    # More general patterns for bottle sizes
+    (r'(?P<liters>\d+(?:\.\d+)?)\s*l(?:iter)?(?:\s|$)', lambda value: f"{value}L"),
+    (r'(?P<ml>\d+)\s*ml(?:\s|$)', lambda value: f"{float(value)/1000:.2f}L".replace(".00", "")),
+    (r'(?P<gallons>\d+)\s*gallon(?:s)?(?:\s|$)', lambda value: f"{value} Gallons"),
+]
+
+_GROUP_NAME = re.compile(r'\(\?P<(\w+)>')
+_WHITESPACE = re.compile(r'\s')
+_DIGIT = re.compile(r'\d')
+
+
+class SizeExtractor:
+    """
+    Extract a standard size label from product titles in a single pass
+    """
+    def __init__(self, arabic_size_mappings, normalize, patterns=SIZE_PATTERNS):
+        self.normalize = normalize
+
+        # Normalize the Arabic size keys once instead of on every title
+        self.arabic_sizes = [(normalize(arabic_size), size)
+                             for arabic_size, size in arabic_size_mappings.items()]
+
+        alternatives = []
+        self.labels = []
+        for index, (body, label) in enumerate(patterns):
+            value_group = None
+            names = _GROUP_NAME.findall(body)
+            if names:
+                value_group = names[0]
+            alternatives.append(f"(?P<p{index}>{body})")
+            self.labels.append((label, value_group))
+
+        self.pattern = re.compile(r'(?:^|\s)(?:' + '|'.join(alternatives) + ')')
+        self.group_index = {f"p{index}": index for index in range(len(patterns))}
+
+    def _best_match(self, text):
+        """Return (pattern index, match) for the highest priority pattern found"""
+        best_index = None
+        best_match = None
+        starts = [0] + [m.start() for m in _WHITESPACE.finditer(text)]
+        for start in starts:
+            match = self.pattern.match(text, start)
+            if match is None:
+                continue
+            index = self.group_index[match.lastgroup]
+            if best_index is None or index < best_index:
+                best_index = index
+                best_match = match
+                if index == 0:
+                    break
+        return best_index, best_match
+
+    def extract_normalized(self, normalized_title):
+        """Extract the size from an already normalized title"""
+        # First check Arabic size mappings
+        for arabic_size, size in self.arabic_sizes:
+            if arabic_size in normalized_title:
+                return size
+
+        # Every pattern needs a digit, so skip the regex entirely without one
+        if _DIGIT.search(normalized_title):
+            index, match = self._best_match(normalized_title)
+            if match is not None:
+                label, value_group = self.labels[index]
+                if callable(label):
+                    return label(match.group(value_group))
+                return label
+
+        # Additional check for sparkling water
+        if "sparkling" in normalized_title or "فوار" in normalized_title:
+            return "0.24L Sparkling"
+
+        return "Unknown Size"
+
+    def extract(self, title):
+        """Extract the size from a raw product title"""
+        return self.extract_normalized(self.normalize(title))
+
+    def extract_many(self, titles):
+        """Extract sizes for a list of titles, parsing each distinct title once"""
+        sizes = {}
+        for title in titles:
+            if title not in sizes:
+                sizes[title] = self.extract(title)
+        return [sizes[title] for title in titles]
+
+    def extract_series(self, titles):
+        """
+        Return a Series of sizes for a Series of titles, extracting each
+        distinct title only once
+        """
+        titles = pd.Series(titles)
+        unique_titles = titles.dropna().unique()
+        sizes = {title: self.extract(title) for title in unique_titles}
+        return titles.map(sizes).fillna("Unknown Size")
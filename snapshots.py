@@ -0,0 +1,130 @@
+"""
+Shared store of scrape results.
+
+Every finished scrape is written as an immutable snapshot to a SQLite
+database in WAL mode, keyed by (keyword, brand filter, time). All web
+workers read the dashboard and the downloads from this store instead of
+from their own memory, so any worker can answer any request and two scrapes
+finishing together never overwrite each other's result.
+
+WAL readers never wait for the writer. Decoded snapshots are immutable, so
+each worker keeps the few it served last and only checks the id of the
+newest row before reusing one.
+"""
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+# Result fields stored in a snapshot; timings and profile reports stay with the job
+SNAPSHOT_FIELDS = ("version", "products", "df_products", "price_stats", "dashboard_view",
+                   "last_scrape_time", "filtered_brand")
+
+
+class SnapshotStore:
+    """
+    SQLite store of immutable scrape snapshots
+    """
+    def __init__(self, path, keep=20, cached=4):
+        self.path = path
+        self.keep = keep
+        self.cached = cached
+        self.lock = threading.Lock()
+        self.decoded = OrderedDict()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    version TEXT NOT NULL UNIQUE,
+                    keyword TEXT NOT NULL,
+                    brand_filter TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    products INTEGER NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_snapshots_keyword_brand
+                ON snapshots (keyword, brand_filter, id)
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, keyword, result):
+        """
+        Store the result of a successful scrape and drop snapshots beyond the
+        retention limit. Returns the snapshot version.
+        """
+        snapshot = {field: result.get(field) for field in SNAPSHOT_FIELDS}
+        snapshot["keyword"] = keyword
+        payload = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO snapshots (version, keyword, brand_filter, created_at, products, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (snapshot["version"], keyword, snapshot["filtered_brand"] or '',
+                 datetime.now().isoformat(timespec='seconds'), snapshot["products"] or 0, payload))
+            conn.execute("DELETE FROM snapshots WHERE id <= (SELECT MAX(id) FROM snapshots) - ?", (self.keep,))
+        return snapshot["version"]
+
+    def latest(self, keyword=None, brand_filter=None):
+        """
+        The newest snapshot, optionally for one keyword and brand filter
+        (None matches any; '' is the unfiltered search), or None
+        """
+        query = "SELECT version FROM snapshots"
+        conditions, params = [], []
+        if keyword is not None:
+            conditions.append("keyword = ?")
+            params.append(keyword)
+        if brand_filter is not None:
+            conditions.append("brand_filter = ?")
+            params.append(brand_filter)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._connect() as conn:
+            row = conn.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        return self.get(row[0]) if row else None
+
+    def get(self, version):
+        """The snapshot with this version, or None once it has been pruned"""
+        with self.lock:
+            snapshot = self.decoded.get(version)
+            if snapshot is not None:
+                self.decoded.move_to_end(version)
+                return snapshot
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM snapshots WHERE version = ?", (version,)).fetchone()
+        if row is None:
+            return None
+        snapshot = pickle.loads(row[0])
+
+        with self.lock:
+            self.decoded[version] = snapshot
+            while len(self.decoded) > self.cached:
+                self.decoded.popitem(last=False)
+        return snapshot
+
+    def list(self, limit=20):
+        """Metadata of the newest snapshots, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT version, keyword, brand_filter, created_at, products FROM snapshots "
+                "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [
+            {"version": version, "keyword": keyword, "brand_filter": brand_filter or None,
+             "created_at": created_at, "products": products}
+            for version, keyword, brand_filter, created_at, products in rows
+        ]
@@ -0,0 +1,66 @@
+"""
+Memoized text normalization.
+
+Titles and dictionary terms are normalized for comparison by removing
+diacritics, folding case and collapsing whitespace. The same strings come
+back again and again (dedup, brand and size extraction, brand filtering,
+repeat scrapes), so results are kept in a bounded LRU memo. Pure-ASCII text
+skips Unicode decomposition entirely.
+
+Arabic spellings that differ only in form are folded to one before
+comparing, so more titles share a key: alef variants become a bare alef,
+ta marbuta becomes ha, alef maksura becomes ya, tatweel is dropped, and
+Arabic-Indic digits become ASCII digits.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+# Arabic forms folded before diacritics are removed
+ARABIC_FOLDING = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ـ': None,
+    '٫': '.',
+}
+ARABIC_FOLDING.update({chr(0x0660 + digit): str(digit) for digit in range(10)})  # ٠-٩
+ARABIC_FOLDING.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})  # ۰-۹ (Persian forms)
+
+# Combining marks of the Basic Multilingual Plane as one character class; a
+# compiled regex scan is several times faster than str.translate on Arabic text
+_BMP_MARKS = re.compile('[' + ''.join(re.escape(chr(cp)) for cp in range(0x10000)
+                                      if unicodedata.category(chr(cp)) == 'Mn') + ']')
+
+
+class TextNormalizer:
+    """
+    Callable text normalizer with a bounded LRU memo of its results
+    """
+    def __init__(self, max_entries=100000, folding=ARABIC_FOLDING):
+        self.folding = {char: replacement or '' for char, replacement in folding.items()}
+        self.folding_pattern = re.compile('[' + ''.join(re.escape(char) for char in folding) + ']')
+        self.normalize = lru_cache(maxsize=max_entries)(self._normalize)
+
+    def __call__(self, text):
+        return self.normalize(text)
+
+    def _normalize(self, text):
+        if text.isascii():
+            return ' '.join(text.lower().split())
+        # Fold Arabic forms, then remove diacritics
+        folding = self.folding
+        text = unicodedata.normalize('NFD', self.folding_pattern.sub(lambda match: folding[match[0]], text))
+        if max(text) <= '\uffff':
+            text = _BMP_MARKS.sub('', text)
+        else:
+            text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+        # Lowercase and collapse whitespace (str.split uses the same whitespace as \s)
+        return ' '.join(text.lower().split())
+
+    def stats(self):
+        info = self.normalize.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "entries": info.currsize, "max_entries": info.maxsize}
+
+    def clear(self):
+        self.normalize.cache_clear()
@@ -0,0 +1,148 @@
+"""
+Pack parsing and unit prices.
+
+Many listings are packs: "12 زجاجة × 1.5 لتر", "20 زجاجة × 0.330 لتر",
+"6 pieces x 500 ml". PackParser reads the pack count and the volume of one
+bottle from a whole column of titles with pandas string operations, each
+distinct title once. The total volume gives the price in EGP per litre, which
+compares a 12 pack with a 6 pack or a single bottle of the same size.
+
+The patterns match case-insensitively and accept Arabic-Indic digits, the
+Arabic decimal separator and the × and * signs as they are, so titles are
+not rewritten before matching; only the matched numbers are folded. A title
+without a pack count is one bottle. A title without a volume falls back to
+the litres of its extracted size.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+GALLON_LITRES = 3.785
+
+# Volume units and their size in litres, matched longest first
+VOLUME_UNITS = {
+    'ml': 0.001, 'مل': 0.001, 'ملل': 0.001, 'ملي': 0.001, 'مللي': 0.001, 'مليلتر': 0.001, 'ملليلتر': 0.001,
+    'l': 1.0, 'ltr': 1.0, 'liter': 1.0, 'liters': 1.0, 'litre': 1.0, 'litres': 1.0, 'لتر': 1.0, 'ليتر': 1.0,
+    'gallon': GALLON_LITRES, 'gallons': GALLON_LITRES, 'جالون': GALLON_LITRES,
+}
+
+# Words that follow a pack count: "12 قطعة", "20زجاجة", "6 bottles"
+PACK_NOUNS = ['قطع', 'قطعة', 'قطعه', 'زجاجة', 'زجاجه', 'زجاجات', 'عبوة', 'عبوه', 'عبوات', 'علبة', 'علب',
+              'bottle', 'bottles', 'pieces', 'pcs', 'pack', 'cans']
+
+# Arabic-Indic digits and decimal separator of matched numbers
+NUMBER_FOLDING = {'٫': '.'}
+NUMBER_FOLDING.update({chr(0x0660 + digit): str(digit) for digit in range(10)})  # ٠-٩
+NUMBER_FOLDING.update({chr(0x06F0 + digit): str(digit) for digit in range(10)})  # ۰-۹
+NUMBER_FOLDING = str.maketrans(NUMBER_FOLDING)
+
+
+def _alternation(words):
+    return '|'.join(sorted(words, key=len, reverse=True))
+
+
+# \d matches Arabic-Indic digits too
+_AMOUNT = r'\d+(?:[.٫]\d+)?'
+_TIMES = r'[x×*]'
+_UNITS = _alternation(VOLUME_UNITS)
+_NOUNS = _alternation(PACK_NOUNS)
+# A unit or noun must not run on into another word
+_WORD_END = r'(?![a-zء-ي])'
+
+VOLUME_PATTERN = re.compile(rf'(?<![\d.])(?P<amount>{_AMOUNT})\s*(?P<unit>{_UNITS}){_WORD_END}', re.IGNORECASE)
+# Pack count patterns in priority order; the first two are only tried on titles with a times sign
+TIMES_PATTERN = re.compile(rf'{_TIMES}\s*\d', re.IGNORECASE)
+COUNT_PATTERNS = [(re.compile(pattern, re.IGNORECASE), needs_times) for pattern, needs_times in [
+    (rf'(?<![\d.])(\d+)\s*(?:(?:{_NOUNS})\s*)?{_TIMES}\s*\d', True),   # 12 زجاجة × 1.5 لتر, 2 x 6l
+    (rf'{_AMOUNT}\s*(?:{_UNITS})\s*{_TIMES}\s*(\d+)(?![\d.])', True),  # 1.5l x 6
+    (rf'(?<![\d.])(\d+)\s*-?\s*(?:{_NOUNS}){_WORD_END}', False),        # 12 قطعة, 20زجاجة, 6-pack
+    (r'(?:pack of|set of|مجموعة من|عبوة من|كرتونة من)\s*(\d+)', False),  # pack of 12, مجموعة من 20
+]]
+
+
+def parse_numbers(values):
+    """Matched number texts as floats, NaN where nothing matched"""
+    return pd.to_numeric(values.str.translate(NUMBER_FOLDING), errors='coerce')
+
+
+def volume_litres(titles):
+    """Litres of the first volume each title names, NaN where it names none"""
+    litres = np.full(len(titles), np.nan)
+    for position, title in enumerate(titles):
+        match = VOLUME_PATTERN.search(title) if isinstance(title, str) else None
+        if match:
+            litres[position] = float(match['amount'].translate(NUMBER_FOLDING)) * VOLUME_UNITS[match['unit'].lower()]
+    return litres
+
+
+def price_per_litre(numeric_prices, pack_counts, unit_litres):
+    """EGP per litre of total pack volume; NaN without a price or a volume"""
+    litres = pack_counts * unit_litres
+    per_litre = numeric_prices.where(numeric_prices > 0) / litres.where(litres > 0)
+    return per_litre.astype('float64').round(2)
+
+
+class PackParser:
+    """
+    Read pack count and unit volume from many titles at once, and map unit
+    volumes to standard size labels
+    """
+    def __init__(self, size_litres, tolerance=0.02):
+        self.size_litres = dict(size_litres)
+        self.tolerance = tolerance
+
+    def parse(self, titles):
+        """
+        DataFrame of Pack Count (1 when the title names none) and Unit
+        Litres (NaN when it names no volume), indexed like titles
+        """
+        titles = pd.Series(titles)
+        unique_titles = pd.Series(titles.dropna().unique(), dtype=object)
+
+        unit_litres = volume_litres(unique_titles)
+
+        counts = pd.Series(np.nan, index=unique_titles.index)
+        has_times = unique_titles.str.contains(TIMES_PATTERN)
+        for pattern, needs_times in COUNT_PATTERNS:
+            missing = counts.isna() & has_times if needs_times else counts.isna()
+            if missing.any():
+                counts[missing] = parse_numbers(unique_titles[missing].str.extract(pattern, expand=False))
+        counts = counts.where(counts > 0).fillna(1).astype('int64')
+
+        # Spread the per-title results back over the (possibly repeated) titles
+        positions = pd.Index(unique_titles).get_indexer(titles)
+        found = positions >= 0
+        pack_counts = np.ones(len(titles), dtype='int64')
+        pack_counts[found] = counts.to_numpy()[positions[found]]
+        litres = np.full(len(titles), np.nan)
+        litres[found] = unit_litres[positions[found]]
+        return pd.DataFrame({'Pack Count': pack_counts, 'Unit Litres': litres}, index=titles.index)
+
+    def unit_litres(self, titles):
+        """
+        Unit Litres of each title, indexed like titles; only the volume is
+        read, so it is cheap enough to run on every scraped page
+        """
+        titles = pd.Series(titles)
+        return pd.Series(volume_litres(titles), index=titles.index)
+
+    def size_labels(self, unit_litres):
+        """Standard size label of each unit volume, NaN when none is within tolerance"""
+        labels = np.full(len(unit_litres), np.nan, dtype=object)
+        values = unit_litres.to_numpy(dtype='float64')
+        for label, litres in self.size_litres.items():
+            labels[np.isclose(values, litres, rtol=self.tolerance, atol=0)] = label
+        return pd.Series(labels, index=unit_litres.index, dtype=object)
+
+    def unit_columns(self, packs, sizes, numeric_prices):
+        """
+        Pack Count, Unit Litres and Price per Litre for parsed packs; a missing
+        unit volume is taken from the litres of the row's size
+        """
+        unit_litres = packs['Unit Litres'].fillna(sizes.map(self.size_litres).astype('float64'))
+        return pd.DataFrame({
+            'Pack Count': packs['Pack Count'],
+            'Unit Litres': unit_litres,
+            'Price per Litre': price_per_litre(numeric_prices, packs['Pack Count'], unit_litres),
+        }, index=packs.index)
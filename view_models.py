@@ -0,0 +1,144 @@
+"""
+Dashboard view model and rendered fragment cache.
+
+At scrape time the price table, best offers, product listing and statistics
+are turned into plain lists and dicts, so templates never walk DataFrames.
+The rendered dashboard fragment is cached per scrape version and reused until
+a new scrape lands.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# price_stats entries that are tables rather than single statistics
+TABLE_STATS = ('Price Table', 'Best Offers', 'Unit Price Table', 'Unit Best Offers')
+
+
+def availability_class(percentage_text):
+    """Map an availability like "85.5%" to its dashboard CSS class"""
+    try:
+        percentage = float(str(percentage_text).rstrip('%'))
+    except ValueError:
+        percentage = 0
+    if percentage > 80:
+        return "availability-high"
+    if percentage > 50:
+        return "availability-medium"
+    return "availability-low"
+
+
+def format_price(value):
+    """Format a price cell as a whole number string, or None when empty"""
+    if value is None or pd.isna(value) or value == '':
+        return None
+    return str(int(round(float(value))))
+
+
+def format_unit_price(value):
+    """Format a price per litre cell with two decimals, or None when empty"""
+    if value is None or pd.isna(value) or value == '':
+        return None
+    return f"{float(value):.2f}"
+
+
+def table_view(price_table, format_value):
+    """Brands and formatted rows of a Size x Brand table, or None when it is empty"""
+    if price_table is None or len(price_table) == 0:
+        return None
+    brands = [str(brand) for brand in price_table.columns]
+    rows = []
+    for size, values in zip(price_table.index, price_table.itertuples(index=False, name=None)):
+        rows.append({
+            "size": size,
+            "prices": [format_value(value) for value in values],
+        })
+    return {"brands": brands, "rows": rows}
+
+
+def offers_view(best_offers, format_value):
+    """Best offers as a list of size, brand and formatted price"""
+    if best_offers is None or len(best_offers) == 0:
+        return []
+    return [
+        {"size": size, "brand": brand, "price": format_value(price)}
+        for size, brand, price in zip(best_offers['Size'], best_offers['Brand'], best_offers['Best Price'])
+    ]
+
+
+def build_dashboard_view(df_products, price_stats):
+    """
+    Convert a scrape result into the plain data the dashboard renders
+    """
+    view = {"stats": None, "price_table": None, "best_offers": [], "unit_price_table": None,
+            "unit_best_offers": [], "products": [], "show_stock": False, "show_source": False,
+            "timings": [], "elapsed": None}
+
+    if price_stats:
+        stats = {key: value for key, value in price_stats.items() if key not in TABLE_STATS}
+        stats['NPL Availability Class'] = availability_class(stats.get('NPL Availability', '0%'))
+        stats['Baraka Availability Class'] = availability_class(stats.get('Baraka Availability', '0%'))
+        view["stats"] = stats
+
+        view["price_table"] = table_view(price_stats.get('Price Table'), format_price)
+        view["best_offers"] = offers_view(price_stats.get('Best Offers'), format_price)
+        view["unit_price_table"] = table_view(price_stats.get('Unit Price Table'), format_unit_price)
+        view["unit_best_offers"] = offers_view(price_stats.get('Unit Best Offers'), format_unit_price)
+        if view["unit_price_table"]:
+            # Each per-litre row also names the best value of its size
+            best_values = {offer["size"]: offer for offer in view["unit_best_offers"]}
+            for row in view["unit_price_table"]["rows"]:
+                row["best"] = best_values.get(row["size"])
+
+    if df_products is not None and len(df_products) > 0:
+        # Stock availability is only there when detail pages were fetched
+        if 'Stock Availability' in df_products.columns:
+            stock = df_products['Stock Availability']
+            view["show_stock"] = True
+        else:
+            stock = [None] * len(df_products)
+        # The source is only worth a column when more than one site was searched
+        if 'Source' in df_products.columns:
+            sources = df_products['Source']
+            view["show_source"] = sources.nunique() > 1
+        else:
+            sources = [None] * len(df_products)
+        view["products"] = [
+            {"brand": brand, "size": size, "price": price, "title": title, "availability": availability,
+             "stock": stock_text, "source": source}
+            for title, price, brand, size, availability, stock_text, source in zip(
+                df_products['Product Title'], df_products['Price'], df_products['Brand'],
+                df_products['Size'], df_products['Availability Status'], stock, sources)
+        ]
+
+    return view
+
+
+def dashboard_etag(*parts):
+    """Build a strong ETag from JSON-serializable parts of the page state"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+class RenderCache:
+    """
+    Small thread-safe cache of rendered HTML fragments keyed by scrape version
+    """
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.fragments = OrderedDict()
+
+    def get_or_render(self, key, render):
+        with self.lock:
+            if key in self.fragments:
+                self.fragments.move_to_end(key)
+                return self.fragments[key]
+        fragment = render()
+        with self.lock:
+            self.fragments[key] = fragment
+            while len(self.fragments) > self.maxsize:
+                self.fragments.popitem(last=False)
+        return fragment